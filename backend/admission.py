@@ -0,0 +1,101 @@
+# Admission control and load shedding for the API.
+#
+# Requests are grouped into classes (e.g. cheap interactive lookups and expensive analytics scans).
+# Each class may run at most `limit` requests at once and keep at most `queue` more waiting, and
+# all classes together share `total` running slots. When a slot frees up, waiting requests of the
+# class with the lowest priority number are admitted first, so lookups overtake queued scans.
+# A request that finds its queue full is rejected at once (429), one that waits longer than
+# `max_wait` seconds is rejected as well (503); both carry a Retry-After hint.
+#
+# The controller runs on the server's event loop and is only used from there, so it needs no locks.
+
+import asyncio
+import math
+
+
+class RequestClass:
+    def __init__(self, priority, limit, queue, max_wait):
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+
+
+class Rejected(Exception):
+    def __init__(self, status_code, message, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, total, classes):
+        self.total = total
+        self.classes = classes
+        self._running = {name: 0 for name in classes}
+        self._waiting = {name: [] for name in classes}  # FIFO of futures
+        self._counters = {name: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0} for name in classes}
+
+    def _has_slot(self, name):
+        return self._running[name] < self.classes[name].limit and sum(self._running.values()) < self.total
+
+    def _retry_after(self, name):
+        return max(1, math.ceil(self.classes[name].max_wait))
+
+    # Hand free slots to waiting requests, highest priority class first
+    def _dispatch(self):
+        for name in sorted(self.classes, key=lambda n: self.classes[n].priority):
+            waiting = self._waiting[name]
+            while waiting and self._has_slot(name):
+                future = waiting.pop(0)
+                if not future.done():
+                    self._running[name] += 1
+                    future.set_result(True)
+
+    async def acquire(self, name):
+        """Wait for a running slot of the class, or raise Rejected."""
+        counters = self._counters[name]
+        # Waiting requests of this class go first, and so do waiting requests of higher priority
+        higher_waiting = any(self._waiting[other] for other in self.classes
+                             if self.classes[other].priority < self.classes[name].priority)
+        if not self._waiting[name] and not higher_waiting and self._has_slot(name):
+            self._running[name] += 1
+            counters["admitted"] += 1
+            return
+
+        if len(self._waiting[name]) >= self.classes[name].queue:
+            counters["shed"] += 1
+            raise Rejected(429, f"Too many {name} requests, try again later", self._retry_after(name))
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[name].append(future)
+        counters["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.classes[name].max_wait)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Admitted just as the wait ran out
+                counters["admitted"] += 1
+                return
+            future.cancel()
+            self._waiting[name].remove(future)
+            counters["timed_out"] += 1
+            raise Rejected(503, f"Server busy, {name} request waited too long", self._retry_after(name))
+        except asyncio.CancelledError:
+            # Client went away while waiting; give back the slot if it was granted meanwhile
+            if future.done() and not future.cancelled():
+                self.release(name)
+            elif future in self._waiting[name]:
+                self._waiting[name].remove(future)
+            raise
+        counters["admitted"] += 1
+
+    def release(self, name):
+        self._running[name] -= 1
+        self._dispatch()
+
+    def stats(self):
+        return {
+            name: {"running": self._running[name], "queue_depth": len(self._waiting[name]), **self._counters[name]}
+            for name in self.classes
+        }
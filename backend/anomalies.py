@@ -0,0 +1,259 @@
+# Streaming anomaly detection on expense amounts.
+#
+# For every category and calendar month the count, mean and variance of the amounts are kept as
+# Welford running statistics, so spending is compared with its seasonal norm (a December Shopping
+# spend with other December Shopping spends). Each category also keeps an exponentially weighted
+# mean and variance (EWMA) that follows its recent level. Both are loaded once from aggregate
+# queries (plus the archived years) and then updated by db_helper's write listener, so scoring an
+# expense is a dictionary lookup and never re-reads the history.
+#
+# An expense is an anomaly when it lies at least THRESHOLD standard deviations above its seasonal
+# mean, and its category / month has at least MIN_SAMPLES expenses to compare with.
+#
+# The load also reads the sequence number of the last change it contains (see change_feed.py), so
+# a write that races the load is not counted twice. Writes are scored only once the statistics are
+# loaded: the write path never waits for the load of the full history, it starts it in the
+# background (warm) instead.
+
+import math
+import threading
+
+import archive
+import categories
+import change_feed
+import db_helper
+import shared_cache
+
+THRESHOLD = 3.0
+MIN_SAMPLES = 10
+EWMA_ALPHA = 0.05
+MAX_RESULTS = 1000
+MAX_RANGE_DAYS = 366  # longest date range find_anomalies reads, like db_helper.MAX_BATCH_DATES
+RESULT_FIELDS = ("expense_date", "amount", "category", "notes", "z_score", "seasonal_mean", "seasonal_std")
+
+_lock = threading.Lock()
+_seasonal = None  # (category key, month) -> _Welford
+_recent = None    # category key -> _Ewma
+_sequence = 0     # sequence number of the last change the statistics contain
+_loading = None   # thread loading the statistics in the background (see warm)
+
+
+class _Welford:
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count=0, total=0.0, total_squares=0.0):
+        # Start from aggregate sums (COUNT, SUM, SUM of squares), as loaded from the database
+        self.count = count
+        self.mean = total / count if count else 0.0
+        self.m2 = max(total_squares - total * self.mean, 0.0) if count else 0.0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / (self.count - 1)
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+        self.count -= 1
+
+    # Chan et al.'s parallel combination, for the live and archived parts of the same month
+    def merge(self, other):
+        count = self.count + other.count
+        if not count:
+            return
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class _Ewma:
+    __slots__ = ("mean", "variance")
+
+    def __init__(self, mean, variance):
+        self.mean = mean
+        self.variance = variance
+
+    def add(self, x):
+        delta = x - self.mean
+        increment = EWMA_ALPHA * delta
+        self.mean += increment
+        self.variance = (1 - EWMA_ALPHA) * (self.variance + delta * increment)
+
+
+def _key(category):
+    return category.strip().lower()
+
+
+def _load():
+    seasonal = {}
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute(
+            "SELECT s.last_sequence, e.category_id, MONTH(e.expense_date) AS month, COUNT(e.id) AS count, "
+            "SUM(e.amount) AS total, SUM(e.amount * e.amount) AS total_squares "
+            f"FROM {change_feed.LAST_SEQUENCE_JOIN} GROUP BY s.last_sequence, e.category_id, MONTH(e.expense_date)"
+        )
+        rows = cursor.fetchall()
+    parts = [(categories.name_of(row['category_id']), row['month'], row['count'], row['total'], row['total_squares'])
+             for row in rows if row['category_id'] is not None]
+    for year in archive.archived_years():
+        parts.extend(archive.amount_moments(year))
+
+    for category, month, count, total, total_squares in parts:
+        stats = seasonal.setdefault((_key(category), int(month)), _Welford())
+        stats.merge(_Welford(int(count), float(total), float(total_squares)))
+
+    # The recent level starts at the long-run level of the category and follows later inserts
+    overall = {}
+    for (key, _), stats in seasonal.items():
+        overall.setdefault(key, _Welford()).merge(stats)
+    recent = {key: _Ewma(stats.mean, stats.std ** 2) for key, stats in overall.items()}
+    return seasonal, recent, rows[0]['last_sequence']
+
+
+def _state():
+    global _seasonal, _recent, _sequence
+    if _seasonal is None:
+        with _lock:
+            if _seasonal is None:
+                _seasonal, _recent, _sequence = _load()
+    return _seasonal, _recent
+
+
+def loaded():
+    return _seasonal is not None
+
+
+def warm():
+    """Load the statistics in a background thread, unless they are loaded or loading already."""
+    global _loading
+    with _lock:
+        if _seasonal is not None or (_loading is not None and _loading.is_alive()):
+            return
+        _loading = threading.Thread(target=_state, name="anomalies-load", daemon=True)
+        _loading.start()
+
+
+# Write listener: apply committed inserts and deletes to the statistics.
+# Deleted amounts are taken out of the seasonal statistics; the EWMA only follows new expenses.
+# Changes the load already saw are skipped.
+def record_changes(changes):
+    if any(change["op"] == "move" for change in changes):
+        # Rows moved to or from the archive, see db_helper.add_write_listener
+        invalidate()
+        return
+    with _lock:
+        if _seasonal is None:
+            return
+        for change in changes:
+            if change["sequence"] <= _sequence:
+                continue
+            key = _key(change["category"])
+            stats = _seasonal.setdefault((key, change["expense_date"].month), _Welford())
+            if change["op"] == "insert":
+                stats.add(change["amount"])
+                recent = _recent.setdefault(key, _Ewma(change["amount"], 0.0))
+                recent.add(change["amount"])
+            else:
+                stats.remove(change["amount"])
+
+
+# Drop the state, it is reloaded on the next request
+def invalidate():
+    global _seasonal, _recent
+    with _lock:
+        _seasonal, _recent = None, None
+
+
+def _z(amount, mean, std):
+    return (amount - mean) / std if std > 0 else None
+
+
+def score(category, expense_date, amount, threshold=THRESHOLD):
+    """
+    How unusual an expense of `amount` is for its category and month.
+
+    Returns:
+        dict: the seasonal mean / std / sample count and z-score, the recent (EWMA) mean and z-score,
+              and "anomaly": True if the seasonal z-score is at least `threshold`.
+    """
+    seasonal, recent = _state()
+    key = _key(category)
+    with _lock:
+        stats = seasonal.get((key, db_helper._to_date(expense_date).month), _Welford())
+        count, mean, std = stats.count, stats.mean, stats.std
+        level = recent.get(key)
+        recent_mean, recent_std = (level.mean, math.sqrt(level.variance)) if level else (None, 0.0)
+
+    z_score = _z(amount, mean, std) if count >= MIN_SAMPLES else None
+    return {
+        "z_score": z_score,
+        "seasonal_mean": mean if count else None,
+        "seasonal_std": std if count > 1 else None,
+        "samples": count,
+        "recent_mean": recent_mean,
+        "recent_z_score": _z(amount, recent_mean, recent_std) if level else None,
+        "anomaly": z_score is not None and z_score >= threshold,
+    }
+
+
+CATEGORY_BETWEEN_QUERY = (
+    "SELECT {columns} FROM expenses WHERE category_id = %s AND expense_date >= %s AND expense_date <= %s "
+    "ORDER BY expense_date, id"
+)
+
+
+def find_anomalies(start_date, end_date, category="all", threshold=THRESHOLD, limit=100):
+    """
+    Expenses in the inclusive date range that are anomalies, most unusual first.
+
+    Only the rows of the range (of the category) are read; they are scored against the running
+    statistics. The range may be at most MAX_RANGE_DAYS long.
+    """
+    if start_date > end_date:
+        raise ValueError("start_date must not be after end_date")
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"The date range must be at most {MAX_RANGE_DAYS} days long")
+    if not 1 <= limit <= MAX_RESULTS:
+        raise ValueError(f"limit must be between 1 and {MAX_RESULTS}")
+    category_id = categories.require(category, allow_all=True)
+
+    columns = ("expense_date", "amount", "category", "notes")
+    archived = archive.rows_between(start_date, end_date)
+    if category_id is None:
+        rows = db_helper._read_expenses(db_helper.EXPENSES_BETWEEN_QUERY, (start_date, end_date), columns)
+    else:
+        rows = db_helper._read_expenses(CATEGORY_BETWEEN_QUERY, (category_id, start_date, end_date), columns)
+        key = _key(categories.name_of(category_id))
+        archived = [row for row in archived if _key(row["category"]) == key]
+    rows.extend(db_helper._as_rows(archived, columns))
+
+    anomalies = []
+    for row in rows:
+        result = score(row["category"], row["expense_date"], row["amount"], threshold)
+        if result["anomaly"]:
+            anomalies.append({
+                "expense_date": db_helper._to_date(row["expense_date"]),
+                "amount": row["amount"],
+                "category": row["category"],
+                "notes": row["notes"],
+                "z_score": result["z_score"],
+                "seasonal_mean": result["seasonal_mean"],
+                "seasonal_std": result["seasonal_std"],
+            })
+    anomalies.sort(key=lambda anomaly: anomaly["z_score"], reverse=True)
+    return anomalies[:limit]
+
+
+db_helper.add_write_listener(record_changes)
+shared_cache.register(invalidate)
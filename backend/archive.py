@@ -0,0 +1,315 @@
+# Cold-year archive of the expenses table.
+#
+# Closed years are moved out of the database into one compressed Parquet file per year. The read
+# functions in db_helper merge the archived rows with the live ones, so callers do not notice
+# whether a year is archived. Archive files are memory-mapped and only the needed columns are read.
+#
+# Usage (from the backend directory):
+#   python archive.py archive --year 2021       # archive one closed year
+#   python archive.py archive --before 2024     # archive every closed year before 2024
+#   python archive.py restore --year 2021       # move an archived year back into the database
+#   python archive.py list
+
+import argparse
+import calendar
+import os
+import threading
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("expense_date", pa.date32()),
+    ("amount", pa.float64()),
+    ("category", pa.string()),
+    ("notes", pa.string()),
+])
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+
+# year -> (file modification time, pyarrow.Table)
+_tables = {}
+_lock = threading.Lock()
+
+
+def archive_dir():
+    return os.getenv("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+
+
+def _path(year):
+    return os.path.join(archive_dir(), f"expenses_{year}.parquet")
+
+
+def archived_years():
+    if not os.path.isdir(archive_dir()):
+        return set()
+    years = set()
+    for name in os.listdir(archive_dir()):
+        if name.startswith("expenses_") and name.endswith(".parquet"):
+            years.add(int(name[len("expenses_"):-len(".parquet")]))
+    return years
+
+
+# Archived years that overlap the inclusive date range [start_date, end_date]
+def archived_years_between(start_date, end_date):
+    start_year, end_year = _to_date(start_date).year, _to_date(end_date).year
+    return sorted(year for year in archived_years() if start_year <= year <= end_year)
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# Memory-mapped table of one archived year, re-read only when the file changes.
+def load_year(year):
+    path = _path(year)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return SCHEMA.empty_table()
+
+    cached = _tables.get(year)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        table = pq.read_table(path, memory_map=True, schema=SCHEMA)
+        _tables[year] = (mtime, table)
+    return table
+
+
+def _filter_categories(table, categories):
+    if not categories:
+        return table
+    return table.filter(pc.is_in(pc.utf8_lower(table["category"]), value_set=pa.array(categories)))
+
+
+# Month name -> total amount for an archived year.
+# - categories: lower-case category names to include, or None for all categories.
+def monthly_totals(year, categories=None):
+    table = _filter_categories(load_year(year), categories)
+    if table.num_rows == 0:
+        return {}
+    months = pa.table({"month": pc.month(table["expense_date"]), "amount": table["amount"]})
+    grouped = months.group_by("month").aggregate([("amount", "sum")])
+    return {
+        calendar.month_name[month]: total
+        for month, total in zip(grouped["month"].to_pylist(), grouped["amount_sum"].to_pylist())
+    }
+
+
+def _between(table, start_date, end_date):
+    start = pa.scalar(_to_date(start_date), pa.date32())
+    end = pa.scalar(_to_date(end_date), pa.date32())
+    dates = table["expense_date"]
+    return table.filter(pc.and_(pc.greater_equal(dates, start), pc.less_equal(dates, end)))
+
+
+# Category -> total amount of the archived rows in the inclusive date range
+def category_totals(start_date, end_date):
+    totals = {}
+    for year in archived_years_between(start_date, end_date):
+        table = _between(load_year(year), start_date, end_date)
+        if table.num_rows == 0:
+            continue
+        grouped = table.group_by("category").aggregate([("amount", "sum")])
+        for category, total in zip(grouped["category"].to_pylist(), grouped["amount_sum"].to_pylist()):
+            totals[category] = totals.get(category, 0) + total
+    return totals
+
+
+# (lower-case trimmed note, total, count) of the archived rows in the inclusive date range
+# - categories: lower-case category names to include, or None for all categories.
+def note_totals(start_date, end_date, categories=None):
+    groups = []
+    for year in archived_years_between(start_date, end_date):
+        table = _filter_categories(_between(load_year(year), start_date, end_date), categories)
+        if table.num_rows == 0:
+            continue
+        notes = pa.table({"note": pc.utf8_trim_whitespace(pc.utf8_lower(table["notes"])), "amount": table["amount"]})
+        grouped = notes.group_by("note").aggregate([("amount", "sum"), ("amount", "count")])
+        groups.extend(zip(grouped["note"].to_pylist(), grouped["amount_sum"].to_pylist(),
+                          grouped["amount_count"].to_pylist()))
+    return groups
+
+
+# Archived rows of the given year and months whose notes contain the (case-insensitive) term
+def note_matches(wildcard_note, year, months):
+    table = load_year(year)
+    if table.num_rows == 0:
+        return []
+    mask = pc.and_(
+        pc.match_substring(pc.utf8_lower(table["notes"]), wildcard_note.lower()),
+        pc.is_in(pc.month(table["expense_date"]), value_set=pa.array(months, pa.int64()))
+    )
+    return table.filter(mask).to_pylist()
+
+
+# (expense_date, category, total) per day and category of an archived year
+def daily_totals(year):
+    table = load_year(year)
+    if table.num_rows == 0:
+        return []
+    grouped = table.group_by(["expense_date", "category"]).aggregate([("amount", "sum")])
+    return list(zip(grouped["expense_date"].to_pylist(), grouped["category"].to_pylist(),
+                    grouped["amount_sum"].to_pylist()))
+
+
+# (category, month, count, sum, sum of squares) of the amounts of an archived year
+def amount_moments(year):
+    table = load_year(year)
+    if table.num_rows == 0:
+        return []
+    moments = pa.table({
+        "category": table["category"],
+        "month": pc.month(table["expense_date"]),
+        "amount": table["amount"],
+        "square": pc.multiply(table["amount"], table["amount"]),
+    })
+    grouped = moments.group_by(["category", "month"]).aggregate(
+        [("amount", "count"), ("amount", "sum"), ("square", "sum")]
+    )
+    return list(zip(grouped["category"].to_pylist(), grouped["month"].to_pylist(),
+                    grouped["amount_count"].to_pylist(), grouped["amount_sum"].to_pylist(),
+                    grouped["square_sum"].to_pylist()))
+
+
+# Archived rows in the inclusive date range, ordered by date
+def rows_between(start_date, end_date):
+    rows = []
+    for year in archived_years_between(start_date, end_date):
+        rows.extend(_between(load_year(year), start_date, end_date).to_pylist())
+    return rows
+
+
+def _write(year, table):
+    os.makedirs(archive_dir(), exist_ok=True)
+    tmp_path = _path(year) + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, _path(year))
+
+
+# Move all rows of a closed year from the database into its archive file.
+# Rows are deleted month by month, and only up to the highest archived id, so rows inserted while
+# the archive is written are left in the database for the next run. Rows already in the file (a
+# run that died before its deletes finished) are not archived a second time.
+def archive_year(year):
+    import db_helper
+
+    if year >= date.today().year:
+        raise ValueError(f"Only closed years can be archived, {year} is still open")
+
+    start, end = db_helper.year_bounds(year)
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute(
+            "SELECT id, expense_date, amount, category_id, notes FROM expenses "
+            "WHERE expense_date >= %s AND expense_date < %s ORDER BY expense_date, id",
+            (start, end)
+        )
+        # Archive files store category names, so they do not depend on the ids of one database
+        rows = db_helper._named(cursor.fetchall())
+    if not rows:
+        return 0
+
+    archived = load_year(year)
+    archived_ids = set(archived["id"].to_pylist())
+    new_rows = [row for row in rows if row["id"] not in archived_ids]
+    if new_rows:
+        table = pa.concat_tables([archived, pa.Table.from_pylist(new_rows, schema=SCHEMA)]).sort_by(
+            [("expense_date", "ascending"), ("id", "ascending")]
+        )
+        _write(year, table)
+
+        # Verify the file before anything is deleted from the database
+        if pq.read_metadata(_path(year)).num_rows != table.num_rows:
+            raise RuntimeError(f"Archive file for {year} is incomplete, nothing was deleted")
+
+    max_id = max(row["id"] for row in rows)
+    for month in range(1, 13):
+        month_start, month_end = db_helper.year_bounds(year, month, month)
+        with db_helper.get_db_cursor(commit=True) as cursor:
+            cursor.execute(
+                "DELETE FROM expenses WHERE expense_date >= %s AND expense_date < %s AND id <= %s",
+                (month_start, month_end, max_id)
+            )
+        # Results read while these rows were both in the file and in the database are stale now
+        db_helper._notify(_moves(row for row in rows if month_start <= _to_date(row["expense_date"]) < month_end))
+    return len(rows)
+
+
+# Move an archived year back into the database and remove its archive file.
+# The rows keep their ids, so a rerun after a crash inserts none of them twice. The file is renamed
+# away before the insert commits, so the rows are never read from both the file and the database.
+def restore_year(year):
+    import categories
+    import db_helper
+
+    path = _path(year)
+    restoring = path + ".restoring"
+    if os.path.exists(restoring) and not os.path.exists(path):
+        # A restore that died before removing the file
+        os.replace(restoring, path)
+    table = load_year(year)
+    rows = [(r["id"], r["expense_date"], r["amount"], categories.require(r["category"]), r["notes"])
+            for r in table.to_pylist()]
+    try:
+        with db_helper.get_db_cursor(commit=True) as cursor:
+            cursor.executemany(
+                "INSERT IGNORE INTO expenses (id, expense_date, amount, category_id, notes) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows
+            )
+            os.replace(path, restoring)
+    except Exception:
+        if os.path.exists(restoring):
+            os.replace(restoring, path)
+        raise
+    os.remove(restoring)
+    _tables.pop(year, None)
+    db_helper._notify(_moves(table.to_pylist()))
+    return len(rows)
+
+
+# Write listener changes for rows moved between the database and the archive (see
+# db_helper.add_write_listener): totals over both stay the same, state read during the move may not
+def _moves(rows):
+    import db_helper
+
+    return [db_helper._change("move", row["expense_date"], row["amount"], row["category"], row["notes"])
+            for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed years of expenses to Parquet")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    archive_parser = subparsers.add_parser("archive")
+    group = archive_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--year", type=int)
+    group.add_argument("--before", type=int, help="Archive every year before this one")
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("--year", type=int, required=True)
+    subparsers.add_parser("list")
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        if args.year:
+            years = [args.year]
+        else:
+            import db_helper
+            with db_helper.get_db_cursor(primary=True) as cursor:
+                cursor.execute("SELECT MIN(expense_date) AS first_date FROM expenses")
+                first_date = cursor.fetchone()["first_date"]
+            years = range(_to_date(first_date).year, args.before) if first_date else []
+        for year in years:
+            print(f"{year}: archived {archive_year(year)} rows")
+    elif args.command == "restore":
+        print(f"{args.year}: restored {restore_year(args.year)} rows")
+    else:
+        for year in sorted(archived_years()):
+            metadata = pq.read_metadata(_path(year))
+            print(f"{year}: {metadata.num_rows} rows, {os.path.getsize(_path(year))} bytes")
@@ -1,7 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
+import csv
+import json
+import io
+import os
 from datetime import datetime, date
 import db_helper
-from typing import List
+import rolling_analytics
+import anomalies
+import columnar
+import top_notes
+import budgets
+import recurring
+import categories
+import single_flight
+import shared_cache
+import change_feed
+import ingest_buffer
+import admission
+import profiling
+import tracing
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, validator
 
 class Expense(BaseModel):
@@ -15,6 +37,15 @@ class MonthlyExpenseCategoryRequest(BaseModel):
     year: int
     category: str
 
+class ReportedSpan(BaseModel):
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    name: str
+    start: float
+    duration_ms: float
+    attributes: Dict[str, Any] = {}
+
 class NoteRequest(BaseModel):
     wildcard_note: str
     year: int
@@ -54,33 +85,207 @@ class UpdateRequest(BaseModel):
     updates: List[ExpenseUpdate]
     additions: List[ExpenseAddition]
 
+# Define request model for moving totals
+class RollingRequest(BaseModel):
+    end_date: date
+    days: int = 30
+    windows: List[int] = [7, 30, 90]
+    category: str = "all"
+
+class TopNotesRequest(BaseModel):
+    start_date: date
+    end_date: date
+    category: str = "all"
+    limit: int = 20
+
+class MonthRequest(BaseModel):
+    year: int
+    month: int
+
+class RecurringRule(BaseModel):
+    category: str
+    amount: float
+    notes: str
+    frequency: str
+    start_date: date
+    end_date: Optional[date] = None
+    interval_days: Optional[int] = None
+
+# Either a list of dates or an inclusive date range
+class BatchRequest(BaseModel):
+    dates: Optional[List[date]] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+class Category(BaseModel):
+    name: str
 
-app=FastAPI()
+class Budget(BaseModel):
+    category: str
+    monthly_limit: float
+    alert_threshold: float = 0.8
+
+
+# Load the category registry (and the anomaly statistics, in the background), start the write-behind buffer
+# (if enabled) and flush whatever it holds on shutdown
+@asynccontextmanager
+async def lifespan(app):
+    categories.reload()
+    anomalies.warm()
+    if ingest_buffer.enabled():
+        ingest_buffer.start()
+    yield
+    ingest_buffer.stop()
+
+
+app=FastAPI(lifespan=lifespan)
+# Endpoints and response validation are spans of their request's trace (see tracing.py), and sync
+# endpoints join the profile of a profiled request (see profiling.py)
+app.router.route_class = tracing.TracedRoute
+
+# Admission control (see admission.py): interactive lookups and edits are admitted before analytics
+# scans, exports and batch jobs, which may only use a few of the shared slots at a time
+admission_control = admission.AdmissionController(
+    total=int(os.getenv("ADMISSION_TOTAL", "16")),
+    classes={
+        "interactive": admission.RequestClass(
+            priority=0,
+            limit=int(os.getenv("ADMISSION_INTERACTIVE_LIMIT", "16")),
+            queue=int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "64")),
+            max_wait=float(os.getenv("ADMISSION_INTERACTIVE_WAIT", "2")),
+        ),
+        "analytics": admission.RequestClass(
+            priority=1,
+            limit=int(os.getenv("ADMISSION_ANALYTICS_LIMIT", "4")),
+            queue=int(os.getenv("ADMISSION_ANALYTICS_QUEUE", "16")),
+            max_wait=float(os.getenv("ADMISSION_ANALYTICS_WAIT", "5")),
+        ),
+    },
+)
+
+ANALYTICS_PATHS = ("/analytics/", "/expenses/note", "/expenses/export", "/expenses/category/period", "/recurring/run")
+UNLIMITED_PATHS = ("/healthz", "/readyz", "/metrics", "/traces", "/docs", "/redoc", "/openapi.json")
+
+
+# Admission class of a request, or None for requests that are never queued
+def request_class(path):
+    if path.startswith(UNLIMITED_PATHS):
+        return None
+    if path.startswith(ANALYTICS_PATHS):
+        return "analytics"
+    return "interactive"
+
+
+# Opt-in profiling of single requests (see profiling.py), innermost so it sees just the request
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not profiling.requested(request.headers):
+        return await call_next(request)
+    return await profiling.profile_request(request, call_next)
+
+# In the multi-worker serving mode, drop in-memory state that writes of other workers made stale
+@app.middleware("http")
+async def sync_shared_state(request: Request, call_next):
+    shared_cache.sync()
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def admit_request(request: Request, call_next):
+    name = request_class(request.url.path)
+    if name is None:
+        return await call_next(request)
+    try:
+        await admission_control.acquire(name)
+    except admission.Rejected as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": str(e)},
+                            headers={"Retry-After": str(e.retry_after)})
+    try:
+        return await call_next(request)
+    finally:
+        admission_control.release(name)
+
+
+# Request tracing (see tracing.py), outermost so the "http" span includes admission queueing.
+# Diagnostic endpoints (health, metrics, the trace viewer itself) are not traced.
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    if request_class(request.url.path) is None:
+        return await call_next(request)
+    with tracing.span("http", traceparent=request.headers.get("traceparent"),
+                      method=request.method, path=request.url.path) as attributes:
+        response = await call_next(request)
+        if attributes is not None:
+            route = request.scope.get("route")
+            attributes.update(route=getattr(route, "path", None), status_code=response.status_code)
+            response.headers["X-Trace-Id"] = tracing.current_trace_id()
+    return response
+
+# The rows of a list or analytics endpoint as column arrays (?format=columnar or ?format=arrow)
+def columnar_response(rows, fields, format):
+    try:
+        return columnar.response(columnar.columns_of(rows, fields), format)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
 @app.get("/expenses/{expense_date}", response_model=List[Expense])
-def get_expenses(expense_date: str):
+def get_expenses(expense_date: str, format: columnar.Format = "rows"):
     try:
         expense_date_obj = datetime.strptime(expense_date, "%Y-%m-%d").date()
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD."}, 400
 
-    expenses = db_helper.fetch_expenses_for_date(expense_date_obj)
+    expenses = db_helper.fetch_expenses_for_date(expense_date_obj, columns=db_helper.API_COLUMNS)
 
     if expenses is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expenses for the given date from the database")
 
+    if format != "rows":
+        return columnar_response(expenses, db_helper.API_COLUMNS, format)
     return expenses
 
+# Expenses of many dates (e.g. a month view) in one query, grouped by date
+@app.post("/expenses/batch", response_model=Dict[date, List[Expense]])
+def get_expenses_batch(request: BatchRequest):
+    try:
+        return db_helper.fetch_expenses_for_dates(request.dates, request.start_date, request.end_date,
+                                                  columns=db_helper.API_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Anomaly scores of new expenses given as (category, expense_date, amount), taken before they are
+# written (see anomalies.py); raises ValueError for unknown categories. While the statistics are
+# not loaded (right after the start, or after another worker's write), the scores are None and the
+# statistics are loaded in the background, so the write never waits for that.
+def score_expenses(expenses):
+    for category, _, _ in expenses:
+        categories.require(category)
+    if not anomalies.loaded():
+        anomalies.warm()
+        return [None] * len(expenses)
+    return [anomalies.score(category, expense_date, amount) for category, expense_date, amount in expenses]
+
 @app.post("/expenses/addorudpate/")
 def add_or_update_expense(expenses: List[Expense]):
+    try:
+        scores = score_expenses([(expense.category, expense.expense_date, expense.amount) for expense in expenses])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if ingest_buffer.is_running():
+        try:
+            sequence = ingest_buffer.submit([expense.model_dump() for expense in expenses])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"message": "Expenses accepted", "sequence": sequence, "scores": scores}
+
     for expense in expenses:
         db_helper.insert_expense(expense_date=expense.expense_date, amount=expense.amount, category=expense.category,
                                  notes=expense.notes)
 
-    return {"message": "Expenses updated successfully"}
+    return {"message": "Expenses updated successfully", "scores": scores}
 
 @app.post("/analytics/expenses/monthly")
-def fetch_monthly_expenses(request: MonthlyExpenseCategoryRequest):
+def fetch_monthly_expenses(request: MonthlyExpenseCategoryRequest, format: columnar.Format = "rows"):
     try:
         # Call the db_helper function with year and category parameters
         expenses = db_helper.fetch_monthly_expenses(request.year, request.category)
@@ -91,6 +296,9 @@ def fetch_monthly_expenses(request: MonthlyExpenseCategoryRequest):
                 detail="No monthly expenses found for the specified year and category"
             )
 
+        if format != "rows":
+            return columnar_response(expenses, ("month", "total_amount"), format)
+
         # Construct response as a list of tuples (month_name, total_amount)
         response_expenses = []
         for expense in expenses:
@@ -101,6 +309,10 @@ def fetch_monthly_expenses(request: MonthlyExpenseCategoryRequest):
 
         return response_expenses
 
+    except HTTPException:
+        # The 404 and 406 above, as they are
+        raise
+
     except ValueError as e:
         # Handle invalid category errors raised by db_helper function
         raise HTTPException(status_code=400, detail=str(e))
@@ -109,25 +321,23 @@ def fetch_monthly_expenses(request: MonthlyExpenseCategoryRequest):
         # Handle unexpected errors
         raise HTTPException(status_code=500, detail="Failed to retrieve monthly expenses")
 
-@app.post("/expenses/note")
-def fetch_expenses_by_note(request: NoteRequest):
-    expenses = db_helper.fetch_expenses_for_particular_note(request.wildcard_note, request.year, request.months)
+@app.post("/expenses/note", response_model=List[Expense])
+def fetch_expenses_by_note(request: NoteRequest, format: columnar.Format = "rows"):
+    try:
+        expenses = db_helper.fetch_expenses_for_particular_note(request.wildcard_note, request.year, request.months,
+                                                                columns=db_helper.API_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if expenses is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expenses by the specified note from the database")
 
-    response_expenses = []
-    for expense in expenses:
-        response_expenses.append({
-            "expense_date": expense['expense_date'],
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "notes": expense['notes']
-        })
-
-    return response_expenses
+    if format != "rows":
+        return columnar_response(expenses, db_helper.API_COLUMNS, format)
+    # The rows are serialized by the response model as they are
+    return expenses
 
 @app.post("/analytics/getexpensesbydaterange/")
-def get_analytics(date_range: DateRange):
+def get_analytics(date_range: DateRange, format: columnar.Format = "rows"):
     data = db_helper.fetch_expense_summary(date_range.start_date, date_range.end_date)
     if data is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expense summary for the provided date range from the database")
@@ -145,64 +355,67 @@ def get_analytics(date_range: DateRange):
             "Percentage": percentage
         }
 
+    if format != "rows":
+        return columnar_response([(category, values["Total"], values["Percentage"])
+                                  for category, values in breakdown.items()],
+                                 ("category", "Total", "Percentage"), format)
     return breakdown
 
+@app.post("/expenses/export")
+def export_expenses(date_range: DateRange):
+    rows = db_helper.export_expenses(date_range.start_date, date_range.end_date)
+    if rows is None:
+        raise HTTPException(status_code=500, detail="Failed to export expenses for the provided date range")
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(db_helper.API_COLUMNS)
+    writer.writerows(rows)
+
+    return Response(
+        content=output.getvalue(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=expenses_{date_range.start_date}_{date_range.end_date}.csv"}
+    )
+
 @app.delete("/expenses/{expense_date}")
 def delete_expenses(expense_date: date):
     db_helper.delete_expenses_for_date(expense_date)
     return {"message": "Expenses deleted successfully"}
 
 @app.post("/expenses/category/date", response_model=List[Expense])
-def fetch_expenses_by_category_and_date(request: CategoryDateRequest):
+def fetch_expenses_by_category_and_date(request: CategoryDateRequest, format: columnar.Format = "rows"):
     try:
         # Call the db_helper function with the request parameters
         expenses = db_helper.fetch_expenses_for_particular_category_date(
             category=request.category,
-            expense_date=request.expense_date
+            expense_date=request.expense_date,
+            columns=db_helper.API_COLUMNS
         )
 
-        # Initialize an empty list to hold Expense objects
-        response_expenses = []
-
-        # Loop through each expense and append to response_expenses
-        for expense in expenses:
-            response_expenses.append(Expense(
-                expense_date=expense['expense_date'],
-                amount=expense['amount'],
-                category=expense['category'],
-                notes=expense['notes']
-            ))
-
-        # Return the list of Expense objects
-        return response_expenses
+        if format != "rows":
+            return columnar_response(expenses, db_helper.API_COLUMNS, format)
+        # The rows are serialized by the response model as they are
+        return expenses
     except ValueError as e:
         # Handle invalid category errors raised by db_helper function
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/expenses/category/period", response_model=List[Expense])
-def fetch_expenses_by_category_and_period(request: CategoryPeriodRequest):
+def fetch_expenses_by_category_and_period(request: CategoryPeriodRequest, format: columnar.Format = "rows"):
     try:
         # Call the db_helper function with the request parameters
         expenses = db_helper.fetch_expenses_by_category_and_day(
             category=request.category,
-            period_of_week=request.period_of_week
+            period_of_week=request.period_of_week,
+            columns=db_helper.API_COLUMNS
         )
 
-        # Initialize an empty list to hold Expense objects
-        response_expenses = []
-
-        # Loop through each expense and append to response_expenses
-        for expense in expenses:
-            response_expenses.append(Expense(
-                expense_date=expense['expense_date'],
-                amount=expense['amount'],
-                category=expense['category'],
-                notes=expense['notes']
-            ))
-
-        # Return the list of Expense objects
-        return response_expenses
+        if format != "rows":
+            return columnar_response(expenses, db_helper.API_COLUMNS, format)
+        # The rows are serialized by the response model as they are
+        return expenses
     except ValueError as e:
         # Handle invalid category or period errors raised by db_helper function
         raise HTTPException(status_code=400, detail=str(e))
@@ -211,6 +424,15 @@ def fetch_expenses_by_category_and_period(request: CategoryPeriodRequest):
 @app.post("/expenses/update")
 def handle_updates(request: UpdateRequest):
     try:
+        # Anomaly scores of the new values, in the order of updates (without deletions) and additions
+        scores = score_expenses([
+            (update.new_category, update.new_expense_date, update.new_amount)
+            for update in request.updates if update.new_amount != 0
+        ] + [
+            (addition.category, addition.expense_date, addition.amount)
+            for addition in request.additions
+        ])
+
         # Process deletions
         for update in request.updates:
             if update.new_amount == 0:  # Marked for deletion
@@ -245,10 +467,241 @@ def handle_updates(request: UpdateRequest):
                 check_duplicate=True
             )
 
-        return {"message": "Operation completed successfully"}
+        return {"message": "Operation completed successfully", "scores": scores}
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# Daily totals of a year as one array (index 0 is January 1st), for calendar heatmaps
+@app.get("/analytics/calendar")
+def get_calendar(year: int):
+    if not 1 <= year <= 9999:
+        raise HTTPException(status_code=400, detail="Invalid year")
+    return {"year": year, "start_date": date(year, 1, 1), "totals": db_helper.fetch_daily_totals(year)}
+
+# Expenses far above their category's seasonal norm, most unusual first
+@app.get("/analytics/anomalies")
+def get_anomalies(start_date: date, end_date: date, category: str = "all", threshold: float = anomalies.THRESHOLD,
+                  limit: int = 100, format: columnar.Format = "rows"):
+    try:
+        results = anomalies.find_anomalies(start_date, end_date, category, threshold, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format != "rows":
+        return columnar_response(results, anomalies.RESULT_FIELDS, format)
+    return results
+
+# Biggest recurring notes of a date range, by total amount and by count
+@app.post("/analytics/top-notes")
+def get_top_notes(request: TopNotesRequest):
+    try:
+        return top_notes.top_notes(request.start_date, request.end_date, request.category, request.limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/analytics/rolling")
+def get_rolling_totals(request: RollingRequest):
+    try:
+        return rolling_analytics.moving_totals(request.end_date, request.days, request.windows, request.category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/analytics/deltas")
+def get_month_deltas(request: MonthRequest):
+    try:
+        return rolling_analytics.month_deltas(request.year, request.month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/budgets")
+def get_budgets():
+    return budgets.fetch_budgets()
+
+
+@app.post("/budgets")
+def set_budget(budget: Budget):
+    try:
+        budgets.set_budget(budget.category, budget.monthly_limit, budget.alert_threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Budget saved successfully"}
+
+
+@app.delete("/budgets/{category}")
+def delete_budget(category: str):
+    if not budgets.delete_budget(category):
+        raise HTTPException(status_code=404, detail=f"No budget for category '{category}'")
+    return {"message": "Budget deleted successfully"}
+
+
+@app.get("/budgets/status")
+def get_budget_status(year: Optional[int] = None, month: Optional[int] = None):
+    today = date.today()
+    year = today.year if year is None else year
+    month = today.month if month is None else month
+    if not 1 <= year <= 9999:
+        raise HTTPException(status_code=400, detail="Invalid year")
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be between 1 and 12")
+    return budgets.fetch_budget_status(year, month)
+
+
+@app.get("/budgets/alerts")
+def get_budget_alerts(limit: int = 50):
+    return budgets.fetch_budget_alerts(limit)
+
+
+@app.get("/recurring")
+def get_recurring_rules():
+    return recurring.fetch_rules()
+
+
+@app.post("/recurring")
+def create_recurring_rule(rule: RecurringRule):
+    try:
+        rule_id = recurring.create_rule(rule.category, rule.amount, rule.notes, rule.frequency,
+                                        rule.start_date, rule.end_date, rule.interval_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Recurring expense created successfully", "id": rule_id}
+
+
+@app.delete("/recurring/{rule_id}")
+def delete_recurring_rule(rule_id: int):
+    if not recurring.delete_rule(rule_id):
+        raise HTTPException(status_code=404, detail=f"No recurring expense with id {rule_id}")
+    return {"message": "Recurring expense deleted successfully"}
+
+
+@app.post("/recurring/run")
+def run_recurring(until: Optional[date] = None):
+    created = recurring.materialize(until)
+    return {"message": f"{created} recurring expenses created", "created": created}
+
+@app.get("/metrics")
+def fetch_metrics():
+    return {
+        "statements": db_helper.statement_stats(),
+        "coalescing": single_flight.stats(),
+        "replicas": db_helper.replica_status(),
+        "write_behind": ingest_buffer.stats(),
+        "admission": admission_control.stats(),
+        "pool": db_helper.pool_status(),
+        "shared_cache": shared_cache.stats(),
+        "profiling": profiling.stats(),
+    }
+
+
+# Where the time goes: database round trip (cached probe), pool usage, cache hit rates & queue depths
+def health_report():
+    statements = db_helper.statement_stats()
+    coalescing = single_flight.stats()
+    write_behind = ingest_buffer.stats()
+    database = db_helper.probe()
+    replicas = db_helper.replica_status()
+    return {
+        "status": "ok" if database["ok"] and all(replicas.values()) else "degraded",
+        "database": database,
+        "pool": db_helper.pool_status(),
+        "replicas": replicas,
+        "cache_hit_ratio": {
+            "prepared_statements": statements["cache_hit_ratio"],
+            "coalescing": coalescing["coalesced"] / coalescing["calls"] if coalescing["calls"] else None,
+        },
+        "queue_depth": {
+            **{name: stats["queue_depth"] for name, stats in admission_control.stats().items()},
+            "write_behind": write_behind["pending"],
+        },
+    }
+
+# Spans of the frontend (its HTTP calls, DataFrame building, rendering) for the trace viewer
+@app.post("/traces")
+def report_spans(spans: List[ReportedSpan]):
+    try:
+        tracing.record_reported([span.model_dump() for span in spans])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"recorded": len(spans)}
+
+# Trace viewer: the most recent traces, and the spans & per-phase latency of one trace
+@app.get("/traces")
+def get_traces(limit: int = 20):
+    return tracing.recent(limit)
+
+@app.get("/traces/{trace_id}")
+def get_trace(trace_id: str):
+    trace = tracing.summary(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Unknown trace (it may have left the buffer)")
+    return trace
+
+# Liveness: the process answers; the report says whether its dependencies do
+@app.get("/healthz")
+def healthz():
+    return health_report()
+
+# Readiness: 503 while the database or a replica is unreachable, so load balancers route elsewhere
+@app.get("/readyz")
+def readyz(response: Response):
+    report = health_report()
+    if report["status"] != "ok":
+        response.status_code = 503
+    return report
+
+# Changes of the expenses table after sequence number `since`, for incremental sync
+@app.get("/changes")
+def get_changes(since: int = 0, limit: int = change_feed.MAX_CHANGES):
+    try:
+        return change_feed.changes_since(since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# The same changes as server-sent events (the event id is the sequence number, so a reconnecting
+# client resumes from its Last-Event-ID). The change log is polled, so writes made by other server
+# processes are streamed as well.
+CHANGE_POLL_SECONDS = 0.5
+CHANGE_HEARTBEAT_SECONDS = 15
+
+@app.get("/changes/stream")
+async def stream_changes(request: Request, since: Optional[int] = None):
+    last_event_id = request.headers.get("last-event-id")
+    position = since if since is not None else int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    if position < 0:
+        raise HTTPException(status_code=400, detail="since must not be negative")
+
+    async def events():
+        nonlocal position
+        idle = 0.0
+        while not await request.is_disconnected():
+            batch = await run_in_threadpool(change_feed.changes_since, position)
+            for change in batch["changes"]:
+                yield f"id: {change['sequence']}\nevent: change\ndata: {json.dumps(change, default=str)}\n\n"
+            position = batch["last_sequence"]
+            if batch["changes"]:
+                idle = 0.0
+                continue
+            if idle >= CHANGE_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(CHANGE_POLL_SECONDS)
+            idle += CHANGE_POLL_SECONDS
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/categories", response_model=List[str])
+def fetch_categories():
+    return categories.names()
+
+
+@app.post("/categories")
+def add_category(category: Category):
+    try:
+        category_id = categories.add(category.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Category added successfully", "id": category_id}
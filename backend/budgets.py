@@ -0,0 +1,204 @@
+# Monthly budgets per category.
+#
+# Month-to-date spending is not computed from the expenses table on every status check. Instead
+# budget_month_totals holds a running total per (category, month) that db_helper updates in the
+# same transaction as every insert, update and delete (see apply_changes), so a status check is a
+# primary-key lookup and threshold crossings are detected the moment a write pushes a total over.
+#
+# Usage (from the backend directory):
+#   python budgets.py rebuild    # recompute the running totals from the expenses table
+
+import argparse
+from datetime import date
+
+import categories
+import db_helper
+import single_flight
+from logging_setup import setup_logger, log_function_call
+
+logger = setup_logger(name='budgets', log_file='backend_server_logs.log')
+log = log_function_call(logger)
+
+def month_start(expense_date):
+    expense_date = db_helper._to_date(expense_date)
+    return date(expense_date.year, expense_date.month, 1)
+
+
+# Alert level reached when a running total moves from `before` to `after`, if any
+def _crossed_level(before, after, monthly_limit, alert_threshold):
+    if before < monthly_limit <= after:
+        return "exceeded"
+    if before < monthly_limit * alert_threshold <= after:
+        return "warning"
+    return None
+
+
+def apply_changes(cursor, changes):
+    """
+    Apply the changes of a write to the running totals, inside the write's transaction.
+
+    Args:
+        cursor: cursor of the transaction that performed the write.
+        changes (List[dict]): changes as described in db_helper.add_write_listener.
+
+    Returns:
+        List[dict]: the budget alerts raised by this write.
+    """
+    deltas = {}
+    for change in changes:
+        key = (change["category"].lower(), month_start(change["expense_date"]))
+        amount = change["amount"] if change["op"] == "insert" else -change["amount"]
+        deltas[key] = deltas.get(key, 0) + amount
+
+    alerts = []
+    for (category, month), delta in deltas.items():
+        if delta == 0:
+            continue
+        cursor.execute(
+            "INSERT INTO budget_month_totals (category, month_start, spent) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE spent = spent + VALUES(spent)",
+            (category, month, delta)
+        )
+        cursor.execute(
+            """
+            SELECT t.spent, b.monthly_limit, b.alert_threshold
+            FROM budget_month_totals t JOIN budgets b ON b.category = t.category
+            WHERE t.category = %s AND t.month_start = %s
+            """,
+            (category, month)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            continue
+
+        level = _crossed_level(row["spent"] - delta, row["spent"], row["monthly_limit"], row["alert_threshold"])
+        if level:
+            alert = {"category": category, "month_start": month, "level": level,
+                     "spent": row["spent"], "monthly_limit": row["monthly_limit"]}
+            cursor.execute(
+                "INSERT INTO budget_alerts (category, month_start, level, spent, monthly_limit) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (category, month, level, row["spent"], row["monthly_limit"])
+            )
+            logger.warning(f"Budget {level} for '{category}' in {month:%Y-%m}: "
+                           f"{row['spent']:.2f} of {row['monthly_limit']:.2f}")
+            alerts.append(alert)
+    return alerts
+
+
+@log
+def rebuild_month_totals():
+    """Recompute every running total from the expenses table (after bulk loads or restores)."""
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute(
+            """
+            SELECT YEAR(expense_date) AS year, MONTH(expense_date) AS month,
+                   category_id, SUM(amount) AS spent
+            FROM expenses
+            GROUP BY YEAR(expense_date), MONTH(expense_date), category_id
+            """
+        )
+        rows = [(categories.name_of(row["category_id"]).lower(), date(row["year"], row["month"], 1), row["spent"])
+                for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM budget_month_totals")
+        cursor.executemany(
+            "INSERT INTO budget_month_totals (category, month_start, spent) VALUES (%s, %s, %s)",
+            rows
+        )
+    return len(rows)
+
+
+@log
+def set_budget(category: str, monthly_limit: float, alert_threshold: float = 0.8):
+    category_lower = categories.canonical(category).lower()
+    if monthly_limit <= 0:
+        raise ValueError("monthly_limit must be greater than 0")
+    if not 0 < alert_threshold <= 1:
+        raise ValueError("alert_threshold must be between 0 and 1")
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute(
+            "INSERT INTO budgets (category, monthly_limit, alert_threshold) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE monthly_limit = VALUES(monthly_limit), "
+            "alert_threshold = VALUES(alert_threshold)",
+            (category_lower, monthly_limit, alert_threshold)
+        )
+    # Like an expense write: status calls still running may have read the old limit
+    single_flight.record_write([])
+
+
+@log
+def delete_budget(category: str):
+    """Returns False if there was no budget for the category."""
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM budgets WHERE category = %s", (category.strip().lower(),))
+        deleted = cursor.rowcount > 0
+    single_flight.record_write([])
+    return deleted
+
+
+@log
+def fetch_budgets():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("SELECT category, monthly_limit, alert_threshold FROM budgets ORDER BY category")
+        return cursor.fetchall()
+
+
+@log
+@single_flight.coalesce
+def fetch_budget_status(year: int, month: int):
+    """
+    Spending against every budget for the given month.
+
+    Returns:
+        List[dict]: category, monthly_limit, spent, remaining, percent_used and status
+        ('ok', 'warning' or 'exceeded') per budget.
+    """
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT b.category, b.monthly_limit, b.alert_threshold, COALESCE(t.spent, 0) AS spent
+            FROM budgets b
+            LEFT JOIN budget_month_totals t ON t.category = b.category AND t.month_start = %s
+            ORDER BY b.category
+            """,
+            (date(year, month, 1),)
+        )
+        rows = cursor.fetchall()
+
+    status = []
+    for row in rows:
+        spent, monthly_limit = row["spent"], row["monthly_limit"]
+        if spent >= monthly_limit:
+            level = "exceeded"
+        elif spent >= monthly_limit * row["alert_threshold"]:
+            level = "warning"
+        else:
+            level = "ok"
+        status.append({
+            "category": row["category"].title(),
+            "monthly_limit": monthly_limit,
+            "spent": spent,
+            "remaining": monthly_limit - spent,
+            "percent_used": spent / monthly_limit * 100,
+            "status": level,
+        })
+    return status
+
+
+@log
+def fetch_budget_alerts(limit: int = 50):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT category, month_start, level, spent, monthly_limit, created_at "
+            "FROM budget_alerts ORDER BY id DESC LIMIT %s",
+            (limit,)
+        )
+        return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the running budget totals")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    print(f"Rebuilt {rebuild_month_totals()} month totals")
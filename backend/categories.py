@@ -0,0 +1,124 @@
+# Category registry.
+#
+# Expenses reference the categories table by a small integer id instead of repeating the name in
+# every row. The registry below is loaded from that table once per process and shared by every
+# module, so validation is a dictionary lookup, filters and GROUP BYs run on the integer ids, and a
+# new category is added with add() (POST /categories) rather than by editing lists in the code.
+
+import threading
+import time
+
+import db_helper
+import shared_cache
+from logging_setup import setup_logger, log_function_call
+
+logger = setup_logger(name='categories', log_file='backend_server_logs.log')
+log = log_function_call(logger)
+
+_lock = threading.Lock()
+_registry = None  # (lower-case name -> id, id -> display name)
+_loaded_at = 0.0
+
+# An unknown name reloads the registry (at most this often), to pick up categories that another
+# server process has added
+RELOAD_INTERVAL = 5.0
+
+
+def _load():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT id, name FROM categories ORDER BY id")
+        rows = cursor.fetchall()
+    return {row["name"].lower(): row["id"] for row in rows}, {row["id"]: row["name"] for row in rows}
+
+
+def _state():
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _set(_load())
+    return _registry
+
+
+def _set(registry):
+    global _registry, _loaded_at
+    _registry, _loaded_at = registry, time.monotonic()
+
+
+def reload():
+    with _lock:
+        _set(_load())
+
+
+# Drop the registry, it is reloaded on its next use
+def invalidate():
+    global _registry
+    with _lock:
+        _registry = None
+
+
+def names():
+    """Display names of all categories, in id order."""
+    return list(_state()[1].values())
+
+
+def allowed():
+    """Lower-case names of all categories."""
+    return set(_state()[0])
+
+
+def id_of(category):
+    """Id of the category (case-insensitive), or None if there is no such category."""
+    return _state()[0].get(category.strip().lower())
+
+
+def name_of(category_id):
+    return _state()[1][category_id]
+
+
+def id_names():
+    """Category id -> display name, for converting many rows at once."""
+    return _state()[1]
+
+
+def require(category, allow_all=False):
+    """
+    Id of the category, raising ValueError for unknown names.
+
+    With allow_all=True, 'all' is accepted as well and returns None.
+    """
+    if allow_all and category.strip().lower() == "all":
+        return None
+    category_id = id_of(category)
+    if category_id is None and time.monotonic() - _loaded_at > RELOAD_INTERVAL:
+        reload()
+        category_id = id_of(category)
+    if category_id is None:
+        suffix = " or 'all'" if allow_all else ""
+        raise ValueError(f"Invalid category: '{category}'. Must be one of: {', '.join(names())}{suffix}")
+    return category_id
+
+
+def canonical(category):
+    """Display name of the category, raising ValueError for unknown names."""
+    return name_of(require(category))
+
+
+@log
+def add(name: str):
+    """Register a new category and return its id."""
+    name = name.strip()
+    if not name or name.lower() == "all":
+        raise ValueError("Category name must not be empty or 'all'")
+    if id_of(name) is not None:
+        raise ValueError(f"Category '{name}' already exists")
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("INSERT INTO categories (name) VALUES (%s)", (name,))
+        category_id = cursor.lastrowid
+    reload()
+    # Other server processes reload their registry too
+    shared_cache.record_write([])
+    return category_id
+
+
+shared_cache.register(invalidate)
@@ -0,0 +1,65 @@
+# Change feed of the expenses table, for incremental sync.
+#
+# Every insert, update and delete appends one row per affected expense to expense_changes, in the
+# same transaction as the write itself (see record), so the log never disagrees with the table.
+# Sequence numbers come from the single change_sequence row, which each writing transaction
+# increments and keeps locked until it commits. Sequence numbers are therefore gap-free and in
+# commit order: a client that has applied every change up to N never misses a change by asking
+# for the ones after N (GET /changes?since=N, or the server-sent-events stream).
+#
+# record() also stores each change's sequence number in its dict, so the write listeners learn it:
+# in-memory state loaded together with the last sequence number (LAST_SEQUENCE_JOIN) skips the
+# changes it already contains.
+
+from datetime import datetime
+
+import db_helper
+
+MAX_CHANGES = 1000
+
+# FROM clause joining the single change_sequence row to the expenses: an aggregate over expenses
+# that also selects s.last_sequence (and groups by it) gets the sequence number of the last change
+# its rows contain, as both come from the same statement. There is one row, with NULL expense
+# columns, even when the table is empty.
+LAST_SEQUENCE_JOIN = "change_sequence s LEFT JOIN expenses e ON 1 = 1 WHERE s.id = 1"
+
+
+def record(cursor, changes):
+    """Append the changes of a write to the change log, inside the write's transaction."""
+    if not changes:
+        return
+    cursor.execute(
+        "UPDATE change_sequence SET last_sequence = last_sequence + %s WHERE id = 1", (len(changes),)
+    )
+    cursor.execute("SELECT last_sequence FROM change_sequence WHERE id = 1")
+    first = cursor.fetchone()["last_sequence"] - len(changes) + 1
+    for i, change in enumerate(changes):
+        change["sequence"] = first + i
+    changed_at = datetime.now().replace(microsecond=0)
+    db_helper.insert_many(
+        cursor, "expense_changes", ("sequence", "op", "expense_date", "amount", "category", "notes", "changed_at"),
+        [(first + i, change["op"], change["expense_date"], change["amount"], change["category"], change["notes"],
+          changed_at) for i, change in enumerate(changes)]
+    )
+
+
+def changes_since(since=0, limit=MAX_CHANGES):
+    """
+    Changes with a sequence number above `since`, oldest first.
+
+    Returns:
+        dict: {"changes": [...], "last_sequence": sequence of the last change returned (or `since`)}.
+    """
+    if since < 0:
+        raise ValueError("since must not be negative")
+    if not 1 <= limit <= MAX_CHANGES:
+        raise ValueError(f"limit must be between 1 and {MAX_CHANGES}")
+    # From the primary: a client that has just written (or has been told a sequence number by another
+    # client) must find that change, which a lagging replica may not have yet
+    rows = db_helper.run_prepared(
+        "SELECT sequence, op, expense_date, amount, category, notes, changed_at FROM expense_changes "
+        "WHERE sequence > %s ORDER BY sequence LIMIT %s",
+        (since, limit), primary=True
+    )
+    changes = [{**row, "expense_date": db_helper._to_date(row["expense_date"])} for row in rows]
+    return {"changes": changes, "last_sequence": changes[-1]["sequence"] if changes else since}
@@ -0,0 +1,63 @@
+# Column-oriented responses for analytics consumers.
+#
+# The list and analytics endpoints return a list of row objects by default, which a DataFrame
+# consumer (the Streamlit tabs) has to take apart again field by field. With ?format=columnar
+# they return one array per field instead:
+#     {"columns": {"expense_date": [...], "amount": [...], ...}}
+# which pandas.DataFrame() takes as it is. With ?format=arrow the same table is sent as an Arrow
+# IPC stream, which pyarrow reads straight into a DataFrame; it needs pyarrow on the server.
+
+import json
+from datetime import date
+from decimal import Decimal
+from typing import Literal
+
+from fastapi import Response
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow responses are optional
+    pyarrow = None
+
+Format = Literal["rows", "columnar", "arrow"]
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def columns_of(rows, fields):
+    """
+    One list per field of `rows`: tuples in field order (such as ExpenseRows), or dicts.
+
+    Returns:
+        dict: field -> list of values, in the order of `fields`.
+    """
+    if not rows:
+        return {field: [] for field in fields}
+    if isinstance(rows[0], tuple):
+        return dict(zip(fields, map(list, zip(*rows))))
+    return {field: [row[field] for row in rows] for field in fields}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def response(columns, format):
+    """Response of the column lists in the requested format ("columnar" or "arrow")."""
+    if format == "arrow":
+        if pyarrow is None:
+            raise ValueError("Arrow responses need pyarrow installed on the server")
+        table = pyarrow.table(columns)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
+    if format == "columnar":
+        return Response(content=json.dumps({"columns": columns}, default=_json_default),
+                        media_type="application/json")
+    raise ValueError(f"Unknown format: {format}")
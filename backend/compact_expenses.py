@@ -0,0 +1,288 @@
+# Offline deduplication of the expenses table.
+#
+# Only some write paths check for duplicates (insert_expense and /expenses/addorudpate/ do not), so
+# the table can hold exact duplicates: rows with the same date, amount, category and notes. They
+# inflate every total. This job keeps the oldest row (lowest id) of every such group and deletes
+# the others.
+#
+# One pass over the table in (expense_date, id) order: duplicates always share their date, so the
+# rows are read SCAN_BATCH at a time by date and grouped by a hash of their key one date at a time,
+# which keeps memory bounded by the largest day. Duplicates are deleted in transactions of at most
+# DELETE_CHUNK rows, so the table is never locked for long. Every delete transaction re-reads its
+# rows (locking them) and only deletes those that still equal a kept row; it also updates the
+# budget running totals and the change feed like any other delete (db_helper._apply_changes).
+#
+# Every deleted row is appended to the audit file (JSON lines, with the id of the row that was
+# kept) before its delete transaction commits, and a {"chunk": n, "status": "committed"} line
+# follows once it has. The counters are saved to the state file after every chunk, and the last
+# date whose duplicates are all deleted after every flush of deletes, so an interrupted run
+# continues where it stopped. A run that stopped between a commit and saving the state finds the
+# chunk's audit lines without their status line when it continues: it checks which of the rows are
+# gone, counts them and adds the status line ("committed" or "rolled_back"), so neither the audit
+# nor the summary miss a delete. Running again is always safe, as a date without duplicates is a
+# no-op. Archived years (see archive.py) are not touched.
+#
+# Stop the server or run this at a quiet time; a running server's in-memory analytics state only
+# learns about the deletes through the shared cache of the multi-worker mode (SHARED_CACHE_DIR).
+#
+# Usage (from the backend directory):
+#   python compact_expenses.py --dry-run      # count and audit the duplicates, delete nothing
+#   python compact_expenses.py                # delete them (continues an interrupted run)
+#   python compact_expenses.py --restart      # start over from the first date
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime
+
+import categories
+import db_helper
+from logging_setup import setup_logger
+
+logger = setup_logger(name='compact_expenses', log_file='backend_server_logs.log')
+
+SCAN_BATCH = 50_000
+DELETE_CHUNK = 1_000
+STATE_FILE = "compaction_state.json"
+AUDIT_FILE = "compaction_audit.jsonl"
+
+SCAN_QUERY = (
+    "SELECT id, expense_date, amount, category_id, notes FROM expenses "
+    "WHERE expense_date > %s ORDER BY expense_date, id LIMIT %s"
+)
+DATE_QUERY = "SELECT id, expense_date, amount, category_id, notes FROM expenses WHERE expense_date = %s ORDER BY id"
+
+
+def _key(row):
+    return (db_helper._to_date(row["expense_date"]), float(row["amount"]), row["category_id"], row["notes"])
+
+
+def _load_state(path, restart):
+    if not restart and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        logger.info(f"Continuing compaction after {state['last_date']}")
+        return state
+    return {"run": os.urandom(8).hex(), "last_date": None, "scanned": 0, "groups": 0, "chunks": 0, "deleted": 0,
+            "amount_removed": 0.0, "by_category": {}, "started_at": datetime.now().isoformat(timespec="seconds")}
+
+
+def _save_state(path, state):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary, path)
+
+
+# Rows after `after`, in (expense_date, id) order, one complete date at a time
+def _dates(after):
+    while True:
+        with db_helper.get_db_cursor(primary=True) as cursor:
+            cursor.execute(SCAN_QUERY, (after, SCAN_BATCH))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            last = db_helper._to_date(rows[-1]["expense_date"])
+            if len(rows) == SCAN_BATCH:
+                if db_helper._to_date(rows[0]["expense_date"]) == last:
+                    # A single date larger than a batch is read on its own
+                    cursor.execute(DATE_QUERY, (last,))
+                    rows = cursor.fetchall()
+                else:
+                    # The last date may continue in the next batch; it is read again from its start
+                    rows = [row for row in rows if db_helper._to_date(row["expense_date"]) != last]
+                    last = db_helper._to_date(rows[-1]["expense_date"])
+
+        day, group = None, []
+        for row in rows:
+            row_date = db_helper._to_date(row["expense_date"])
+            if row_date != day and group:
+                yield day, group
+                group = []
+            day = row_date
+            group.append(row)
+        yield day, group
+        after = last
+
+
+def _duplicates(rows):
+    """(duplicate row, id of the kept row) for every row of one date that repeats an earlier one."""
+    kept = {}
+    duplicates = []
+    for row in rows:
+        key = _key(row)
+        if key in kept:
+            duplicates.append((row, kept[key]))
+        else:
+            kept[key] = row["id"]
+    return duplicates
+
+
+# Delete one chunk of duplicates in its own transaction; the rows are audited before it commits.
+# Returns the audit entries of the rows actually deleted.
+def _delete_chunk(chunk, audit, state, number):
+    kept_ids = {kept_id for _, kept_id in chunk}
+    ids = [row["id"] for row, _ in chunk] + sorted(kept_ids)
+    where = f"id IN ({', '.join(['%s'] * len(ids))})"
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute(f"SELECT id, expense_date, amount, category_id, notes FROM expenses WHERE {where} FOR UPDATE",
+                       ids)
+        current = {row["id"]: _key(row) for row in cursor.fetchall()}
+        # Only rows that still equal their kept row (neither changed since the scan)
+        deleted = [(row, kept_id) for row, kept_id in chunk
+                   if row["id"] in current and current[row["id"]] == current.get(kept_id)]
+        if not deleted:
+            return []
+        entries = _entries(deleted, state, number, dry_run=False)
+        _audit(audit, entries)
+        delete_ids = [row["id"] for row, _ in deleted]
+        delete_where = f"id IN ({', '.join(['%s'] * len(delete_ids))})"
+        changes = db_helper._rows_to_delete(cursor, delete_where, delete_ids)
+        cursor.execute(f"DELETE FROM expenses WHERE {delete_where}", delete_ids)
+        db_helper._apply_changes(cursor, changes)
+    db_helper._notify(changes)
+    _audit(audit, [{"run": state["run"], "chunk": number, "status": "committed"}])
+    return entries
+
+
+def _entries(rows, state, number, dry_run):
+    return [{
+        "id": row["id"],
+        "kept_id": kept_id,
+        "expense_date": db_helper._to_date(row["expense_date"]).isoformat(),
+        "amount": float(row["amount"]),
+        "category": categories.name_of(row["category_id"]),
+        "notes": row["notes"],
+        "dry_run": dry_run,
+        "run": state["run"],
+        "chunk": number,
+    } for row, kept_id in rows]
+
+
+def _audit(audit, entries):
+    for entry in entries:
+        audit.write(json.dumps(entry) + "\n")
+    audit.flush()
+    os.fsync(audit.fileno())
+
+
+def _count(state, entries):
+    state["deleted"] += len(entries)
+    for entry in entries:
+        state["amount_removed"] += entry["amount"]
+        state["by_category"][entry["category"]] = state["by_category"].get(entry["category"], 0) + 1
+
+
+# Chunks of this run audited after the last saved state: the run stopped before (or while)
+# committing them, or before saving the state. Count those that committed and add their status line.
+def _recover(state, audit_file, audit):
+    if not os.path.exists(audit_file):
+        return
+    entries, resolved = {}, set()
+    size = 0
+    with open(audit_file, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Torn by a crash in the middle of _audit, before its chunk was deleted. It is cut
+                # off, or the next entry would be appended to it.
+                logger.warning("Removing an incomplete last line from the audit file")
+                os.truncate(audit_file, size)
+                break
+            size += len(line)
+            entry = json.loads(line)
+            if entry.get("run") != state["run"] or entry["chunk"] <= state["chunks"]:
+                continue
+            if "status" in entry:
+                resolved.add(entry["chunk"])
+            else:
+                entries.setdefault(entry["chunk"], []).append(entry)
+
+    for number, chunk in sorted(entries.items()):
+        ids = [entry["id"] for entry in chunk]
+        with db_helper.get_db_cursor(primary=True) as cursor:
+            cursor.execute(f"SELECT COUNT(*) AS remaining FROM expenses WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                           ids)
+            committed = cursor.fetchone()["remaining"] == 0
+        if number not in resolved:
+            _audit(audit, [{"run": state["run"], "chunk": number, "status": "committed" if committed else "rolled_back"}])
+        if committed:
+            _count(state, chunk)
+        state["chunks"] = number
+        logger.info(f"Recovered chunk {number} of the interrupted run: {'committed' if committed else 'rolled back'}")
+
+
+def compact(dry_run=False, restart=False, state_file=STATE_FILE, audit_file=AUDIT_FILE, delete_chunk=DELETE_CHUNK):
+    """
+    Delete the exact duplicates of the expenses table, keeping the lowest id of every group.
+
+    Returns:
+        dict: the summary: rows scanned, duplicate groups, rows deleted (or, with dry_run, found),
+              amount removed, deletes per category, the last date done and the duration.
+    """
+    started = time.perf_counter()
+    # A dry run neither continues nor updates the progress of real runs
+    state = _load_state(state_file, restart or dry_run)
+    after = date.fromisoformat(state["last_date"]) if state["last_date"] else date.min
+
+    pending = []
+    # Rows scanned and duplicate groups found since the last flush; they are saved with its date
+    scanned = {"rows": 0, "groups": 0}
+    with open(audit_file, "a") as audit:
+        if not dry_run:
+            _recover(state, audit_file, audit)
+            _save_state(state_file, state)
+
+        def flush(day):
+            while pending:
+                chunk = pending[:delete_chunk]
+                del pending[:delete_chunk]
+                number = state["chunks"] + 1
+                if dry_run:
+                    entries = _entries(chunk, state, number, dry_run=True)
+                    _audit(audit, entries)
+                else:
+                    entries = _delete_chunk(chunk, audit, state, number)
+                _count(state, entries)
+                state["chunks"] = number
+                if not dry_run:
+                    _save_state(state_file, state)
+            state["last_date"] = day.isoformat()
+            state["scanned"] += scanned["rows"]
+            state["groups"] += scanned["groups"]
+            scanned.update(rows=0, groups=0)
+            if not dry_run:
+                _save_state(state_file, state)
+
+        day = None
+        for day, rows in _dates(after):
+            scanned["rows"] += len(rows)
+            duplicates = _duplicates(rows)
+            scanned["groups"] += len({kept_id for _, kept_id in duplicates})
+            pending.extend(duplicates)
+            # Delete in full chunks, and save the progress at least every SCAN_BATCH rows
+            if len(pending) >= delete_chunk or scanned["rows"] >= SCAN_BATCH:
+                flush(day)
+                logger.info(f"Compacted expenses up to {day}: {state['deleted']} duplicates removed")
+        if day is not None:
+            flush(day)
+
+    summary = {**state, "dry_run": dry_run, "finished_at": datetime.now().isoformat(timespec="seconds"),
+               "duration_seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Compaction {'dry run ' if dry_run else ''}finished: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete exact duplicate expenses")
+    parser.add_argument("--dry-run", action="store_true", help="Only count and audit the duplicates")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress of an earlier run")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    parser.add_argument("--audit-file", default=AUDIT_FILE)
+    parser.add_argument("--report", help="Also write the summary as JSON to this file")
+    args = parser.parse_args()
+    report = compact(args.dry_run, args.restart, args.state_file, args.audit_file)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
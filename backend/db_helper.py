@@ -1,9 +1,25 @@
 import mysql.connector
 import os
+import functools
+import itertools
+import threading
+import time
+from datetime import date, timedelta
 from dotenv import load_dotenv
 from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+import weakref
 #import logging_setup
 from logging_setup import setup_logger, log_function_call
+import local_db
+import archive
+import budgets
+import categories
+import change_feed
+import ingest_buffer
+import shared_cache
+import single_flight
+import tracing
 
 # Initialize the logger
 logger = setup_logger(name='db_helper', log_file='backend_server_logs.log')
@@ -14,34 +30,529 @@ log = log_function_call(logger)
 # Load environment variables from .env
 load_dotenv()
 
-@contextmanager
-def get_db_cursor(commit=False):
-    connection = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
+def connect(host=None):
+    # DB_ENGINE=sqlite switches to the local stand-in (see local_db.py); MySQL is the default.
+    # host selects a replica; for the stand-in it is the path of the replica's database file.
+    if os.getenv("DB_ENGINE", "mysql").lower() == "sqlite":
+        return local_db.connect(database=host or os.getenv("DB_NAME"))
+
+    port = None
+    if host and ":" in host:
+        host, port = host.rsplit(":", 1)
+    return mysql.connector.connect(
+        host=host or os.getenv("DB_HOST"),
+        port=int(port) if port else 3306,
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         database=os.getenv("DB_NAME")
     )
 
+# Read/write splitting.
+# DB_REPLICAS is a comma separated list of read replicas (host or host:port, database file paths
+# for the stand-in). Read-only cursors are spread round-robin over the healthy replicas, writes go
+# to DB_HOST. A replica that fails to connect is skipped for REPLICA_RETRY_SECONDS, and reads fall
+# back to the primary when no replica is healthy. For READ_STICKINESS_SECONDS after a write, reads
+# go to the primary too, so they see the write even if the replicas lag behind (in the multi-worker
+# mode, after a write of any worker: the time of the last write is shared, see shared_cache.py).
+_replica_lock = threading.Lock()
+_replica_turn = itertools.count()
+_replica_down_until = {}  # replica -> time.monotonic() until which it is skipped
+_last_write = float("-inf")
+
+def _replicas():
+    return [host.strip() for host in os.getenv("DB_REPLICAS", "").split(",") if host.strip()]
+
+def replica_status():
+    """Health of every configured replica: {replica: True if it is used for reads}."""
+    now = time.monotonic()
+    return {replica: _replica_down_until.get(replica, 0) <= now for replica in _replicas()}
+
+# Connection pool: idle connections per database are reused instead of connecting on every call.
+# At most DB_POOL_SIZE idle connections are kept per database, and a connection that has been idle
+# for more than DB_POOL_RECYCLE_SECONDS is replaced (MySQL drops idle connections after wait_timeout).
+_pool_lock = threading.Lock()
+_idle = {}  # pool key -> [(connection, time.monotonic() when it was released), ...]
+_in_use = {}  # pool key -> number of checked out connections
+_pool_stats = {"opened": 0, "reused": 0}
+
+def _pool_key(host):
+    return os.getenv("DB_ENGINE", "mysql").lower(), host or os.getenv("DB_HOST"), os.getenv("DB_NAME")
+
+def _checkout(host=None):
+    key = _pool_key(host)
+    now = time.monotonic()
+    stale = []
+    connection = None
+    with _pool_lock:
+        idle = _idle.get(key, [])
+        while idle:
+            candidate, released = idle.pop()
+            if now - released < float(os.getenv("DB_POOL_RECYCLE_SECONDS", "300")):
+                connection = candidate
+                break
+            stale.append(candidate)
+    for candidate in stale:
+        _discard(candidate)
+    reused = connection is not None
+    connection = connection or connect(host)
+    with _pool_lock:
+        _pool_stats["reused" if reused else "opened"] += 1
+        _in_use[key] = _in_use.get(key, 0) + 1
+    return connection, key
+
+def _release(connection, key, reusable=True):
+    with _pool_lock:
+        _in_use[key] -= 1
+        if reusable:
+            idle = _idle.setdefault(key, [])
+            if len(idle) < int(os.getenv("DB_POOL_SIZE", "10")):
+                idle.append((connection, time.monotonic()))
+                return
+    _discard(connection)
+
+def pool_status():
+    """Connections in use and idle (over all databases), and how often a checkout reused one."""
+    with _pool_lock:
+        stats = {
+            "in_use": sum(_in_use.values()),
+            "idle": sum(len(idle) for idle in _idle.values()),
+            "max_idle_per_database": int(os.getenv("DB_POOL_SIZE", "10")),
+            **_pool_stats,
+        }
+    checkouts = stats["reused"] + stats["opened"]
+    stats["reuse_ratio"] = stats["reused"] / checkouts if checkouts else None
+    return stats
+
+def _discard(connection):
+    _statement_caches.pop(connection, None)
+    try:
+        connection.close()
+    except Exception:
+        logger.exception("Failed to close a database connection")
+
+def _checkout_for_read():
+    replicas = _replicas()
+    now = time.monotonic()
+    stickiness = float(os.getenv("READ_STICKINESS_SECONDS", "0"))
+    if not replicas or (stickiness > 0 and now - max(_last_write, shared_cache.last_write()) < stickiness):
+        return _checkout()
+
+    start = next(_replica_turn)
+    for i in range(len(replicas)):
+        replica = replicas[(start + i) % len(replicas)]
+        if _replica_down_until.get(replica, 0) > now:
+            continue
+        try:
+            checked_out = _checkout(replica)
+        except Exception:
+            logger.exception(f"Replica {replica} is unavailable, skipping it for a while")
+            with _replica_lock:
+                _replica_down_until[replica] = now + float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+            continue
+        with _replica_lock:
+            _replica_down_until.pop(replica, None)
+        return checked_out
+    return _checkout()
+
+# End the read snapshot of a connection before it goes back to the pool,
+# otherwise the next user of the connection would not see newer commits
+def _end_read(connection):
+    if connection.in_transaction:
+        connection.rollback()
+
+@contextmanager
+def get_db_cursor(commit=False, primary=False):
+    """
+    Cursor returning rows as dicts. Read-only cursors (commit=False) may be served by a replica;
+    pass primary=True for reads that must see every committed write (e.g. before a write).
+    """
+    global _last_write
+    connection, key = _checkout() if commit or primary else _checkout_for_read()
+
     cursor = connection.cursor(dictionary=True)
-    yield cursor
-    if commit:
-        connection.commit()
-    print("Closing cursor")
+    if tracing.active():
+        cursor = tracing.TracedCursor(cursor)
+    reusable = False
+    try:
+        yield cursor
+        if commit:
+            connection.commit()
+            _last_write = time.monotonic()
+            shared_cache.note_write(_last_write)
+        else:
+            _end_read(connection)
+        reusable = True
+    finally:
+        print("Closing cursor")
+
+        cursor.close()
+        # A connection that failed mid-transaction is closed (rolling the transaction back), not reused
+        _release(connection, key, reusable)
+
+# Database health probe for /healthz and /readyz: a SELECT 1 round trip on the primary. The result
+# is reused for HEALTH_PROBE_SECONDS, so frequent health checks do not add load of their own.
+_probe_lock = threading.Lock()
+_probe = None  # (time.monotonic() of the probe, result)
+
+def probe():
+    """{"ok", "latency_ms", "error", "age_seconds"} of the most recent database round trip."""
+    global _probe
+    with _probe_lock:
+        now = time.monotonic()
+        if _probe is None or now - _probe[0] >= float(os.getenv("HEALTH_PROBE_SECONDS", "5")):
+            started = time.perf_counter()
+            try:
+                with get_db_cursor(primary=True) as cursor:
+                    cursor.execute("SELECT 1 AS ok")
+                    cursor.fetchall()
+                result = {"ok": True, "latency_ms": (time.perf_counter() - started) * 1000, "error": None}
+            except Exception as e:
+                logger.exception("Database health probe failed")
+                result = {"ok": False, "latency_ms": None, "error": str(e)}
+            _probe = (now, result)
+        return {**_probe[1], "age_seconds": now - _probe[0]}
+
+# Server-side prepared statements for the hot read queries.
+# Every pooled connection keeps a prepared cursor per statement (at most MAX_PREPARED_STATEMENTS,
+# least recently used first out), so the server parses a hot query once per connection and later
+# calls only send the parameters. Statements must have a bounded set of shapes: parameters instead
+# of inlined values, and IN lists padded to a fixed length.
+MAX_PREPARED_STATEMENTS = 32
+
+_statement_caches = weakref.WeakKeyDictionary()  # connection -> OrderedDict((query, dictionary) -> (query, cursor))
+_statement_stats_lock = threading.Lock()
+_statement_stats = {"prepares": 0, "executes": 0, "evictions": 0}
+
+def statement_stats():
+    """Prepare / execute counts of run_prepared since the server started."""
+    with _statement_stats_lock:
+        stats = dict(_statement_stats)
+    stats["cache_hit_ratio"] = 1 - stats["prepares"] / stats["executes"] if stats["executes"] else None
+    return stats
+
+def _count(name):
+    with _statement_stats_lock:
+        _statement_stats[name] += 1
+
+def run_prepared(query, params=(), primary=False, dictionary=True):
+    """
+    fetchall() of a read-only query, run as a prepared statement cached on the pooled connection.
+    Rows are dicts, or plain tuples in SELECT order with dictionary=False.
+    """
+    connection, key = _checkout() if primary else _checkout_for_read()
+    reusable = False
+    try:
+        cache = _statement_caches.setdefault(connection, OrderedDict())
+        cache_key = (query, dictionary)
+        if cache_key in cache:
+            cache.move_to_end(cache_key)
+        else:
+            if len(cache) >= MAX_PREPARED_STATEMENTS:
+                cache.popitem(last=False)[1][1].close()
+                _count("evictions")
+            cache[cache_key] = (query, connection.cursor(prepared=True, dictionary=dictionary))
+            _count("prepares")
+        # The connector only skips the prepare when it is given the very same string object again
+        cached_query, cursor = cache[cache_key]
+        if tracing.active():
+            cursor = tracing.TracedCursor(cursor)
+        try:
+            cursor.execute(cached_query, tuple(params))
+            rows = cursor.fetchall()
+        finally:
+            # Failed executes count too, so the hit ratio never drops below 0
+            _count("executes")
+        _end_read(connection)
+        reusable = True
+        return rows
+    finally:
+        _release(connection, key, reusable)
+
+# Callbacks notified after a write has been committed, see add_write_listener()
+_write_listeners = []
+
+def add_write_listener(callback):
+    """
+    Register callback(changes) to be called after every committed write.
 
-    cursor.close()
-    connection.close()
+    changes is a list of dicts with the keys op ('insert' or 'delete'), expense_date (date),
+    amount, category and notes. An update is reported as a delete followed by an insert.
+    Listeners keep derived state (running totals, statistics, ...) in sync without re-scanning.
+
+    Rows moved between the database and the archive (see archive.py) are reported with op 'move'
+    and no sequence number: the totals over both do not change, but state read while the move was
+    under way may have counted the rows twice and has to be reloaded.
+    """
+    _write_listeners.append(callback)
+
+# Concurrent identical analytics calls never join a query that started before a write
+add_write_listener(single_flight.record_write)
+add_write_listener(shared_cache.record_write)
+
+def _notify(changes):
+    if not changes:
+        return
+    for callback in _write_listeners:
+        try:
+            callback(changes)
+        except Exception:
+            logger.exception(f"Write listener {callback.__name__} failed")
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _change(op, expense_date, amount, category, notes):
+    return {"op": op, "expense_date": _to_date(expense_date), "amount": float(amount),
+            "category": category, "notes": notes}
+
+# Bookkeeping inside every write transaction: the running budget totals and the change log
+def _apply_changes(cursor, changes):
+    budgets.apply_changes(cursor, changes)
+    change_feed.record(cursor, changes)
+
+# Lock and return the rows a DELETE with the same WHERE clause is about to remove,
+# so the running totals and the listeners can be told what was deleted.
+def _rows_to_delete(cursor, where, params):
+    cursor.execute(
+        f"SELECT expense_date, amount, category_id, notes FROM expenses WHERE {where} FOR UPDATE",
+        params
+    )
+    return [_change("delete", row['expense_date'], row['amount'], categories.name_of(row['category_id']), row['notes'])
+            for row in cursor.fetchall()]
+
+def _named(rows):
+    """Rows read from expenses with their category_id replaced by the category name."""
+    named = []
+    for row in rows:
+        named.append({("category" if key == "category_id" else key):
+                      (categories.name_of(value) if key == "category_id" else value)
+                      for key, value in row.items()})
+    return named
+
+# Column projection.
+# The expense read functions return dicts with all of EXPENSE_FIELDS by default. Given `columns`
+# (a tuple of some of EXPENSE_FIELDS), they select only those columns through a tuple cursor and
+# return ExpenseRows: named tuples of just those fields, without a dict per row. Rows can be read as
+# row.amount or row["amount"], and FastAPI serializes them into response models by attribute.
+EXPENSE_FIELDS = ("id", "expense_date", "amount", "category", "notes")
+API_COLUMNS = ("expense_date", "amount", "category", "notes")  # the fields of an expense in API responses
+
+def _row_getitem(row, key):
+    return getattr(row, key) if isinstance(key, str) else tuple.__getitem__(row, key)
+
+def _row_reduce(row):
+    return _make_row, (row._fields, tuple(row))
+
+@functools.lru_cache(maxsize=None)
+def row_type(columns):
+    """ExpenseRow class with the given fields (a tuple of EXPENSE_FIELDS)."""
+    if not columns or not set(columns) <= set(EXPENSE_FIELDS):
+        raise ValueError(f"Columns must be some of: {', '.join(EXPENSE_FIELDS)}")
+    return type("ExpenseRow", (namedtuple("ExpenseRow", columns),),
+                {"__slots__": (), "__getitem__": _row_getitem, "__reduce__": _row_reduce})
+
+# Unpickling (e.g. from the shared cache) recreates the row class
+def _make_row(columns, values):
+    return row_type(columns)._make(values)
+
+# The query with its {columns} placeholder filled in; cached, so the prepared statement cache gets
+# the very same string object on every call
+@functools.lru_cache(maxsize=256)
+def _projected(query, columns):
+    return query.format(columns=", ".join("category_id" if c == "category" else c for c in columns))
+
+def _read_expenses(query, params, columns=None, primary=False):
+    """Rows of a query on expenses whose SELECT list is {columns}: dicts, or ExpenseRows of `columns`."""
+    if columns is None:
+        return _named(run_prepared(_projected(query, EXPENSE_FIELDS), params, primary=primary))
+    make = row_type(columns)._make
+    rows = run_prepared(_projected(query, columns), params, primary=primary, dictionary=False)
+    if "category" not in columns:
+        return [make(row) for row in rows]
+    i = columns.index("category")
+    names = categories.id_names()
+    return [make((*row[:i], names[row[i]], *row[i + 1:])) for row in rows]
+
+# Rows from other sources (the archive, the write-behind buffer) in the shape of _read_expenses
+def _as_rows(dicts, columns=None):
+    if columns is None:
+        return list(dicts)
+    make = row_type(columns)._make
+    return [make(row.get(column) for column in columns) for row in dicts]
+
+
+# Rows per multi-row INSERT statement, to stay well below MySQL's max_allowed_packet
+INSERT_CHUNK_SIZE = 5000
+
+def insert_many(cursor, table, columns, rows):
+    """Insert rows with one multi-row INSERT per INSERT_CHUNK_SIZE rows instead of one per row."""
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[i:i + INSERT_CHUNK_SIZE]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * len(chunk)),
+            [value for row in chunk for value in row]
+        )
+
+def year_bounds(year, first_month=1, last_month=12):
+    """
+    Half-open date range [start, end) covering the given months of a year.
+
+    Filtering on the bare expense_date column (instead of YEAR(expense_date) or MONTH(expense_date))
+    lets MySQL use the expense_date index and prune the yearly partitions of the expenses table.
+    """
+    start = date(year, first_month, 1)
+    end = date(year + 1, 1, 1) if last_month == 12 else date(year, last_month + 1, 1)
+    return start, end
+
+# Pad an IN list to `size` values by repeating its first value, so the statement has one shape
+def _padded(values, size):
+    return list(values) + [values[0]] * (size - len(values))
+
+# Placeholders in an IN list: the next power of two (at least `minimum`), so the list can grow
+# without giving every number of values its own statement
+def _slots(count, minimum):
+    slots = minimum
+    while slots < count:
+        slots *= 2
+    return slots
+
+def _category_slots(count):
+    return _slots(count, 16)
+
+MONTHLY_EXPENSES_QUERY = '''
+    SELECT
+        MONTHNAME(expense_date) AS month_name,
+        SUM(amount) AS total_amount
+    FROM
+        expenses
+    WHERE
+        expense_date >= %s AND expense_date < %s
+    GROUP BY
+        MONTH(expense_date), MONTHNAME(expense_date)
+    ORDER BY
+        MONTH(expense_date)
+'''
+
+@functools.lru_cache(maxsize=None)
+def _monthly_expenses_by_category_query(slots):
+    return f'''
+    SELECT
+        MONTHNAME(expense_date) AS month_name,
+        SUM(amount) AS total_amount
+    FROM
+        expenses
+    WHERE
+        expense_date >= %s AND expense_date < %s AND category_id IN ({', '.join(['%s'] * slots)})
+    GROUP BY
+        MONTH(expense_date), MONTHNAME(expense_date)
+    ORDER BY
+        MONTH(expense_date)
+'''
+
+NOTE_SEARCH_QUERY = f"""
+    SELECT {{columns}} FROM expenses
+    WHERE LOWER(notes) LIKE %s
+    AND expense_date >= %s AND expense_date < %s
+    AND MONTH(expense_date) IN ({', '.join(['%s'] * 12)})
+    ORDER BY expense_date DESC
+"""
 
 @log
-def fetch_expenses_for_date(expense_date):
+def fetch_expenses_for_date(expense_date, columns=None):
     #logger.info(f"fetch_expenses_for_date called with {expense_date}")
-    with get_db_cursor() as cursor:
-        cursor.execute("SELECT * FROM expenses WHERE expense_date = %s", (expense_date,))
-        expenses_for_date = cursor.fetchall()
-        return expenses_for_date
+    if ingest_buffer.has_pending(expense_date):
+        # Read-your-writes: include accepted expenses the write-behind buffer has not flushed yet
+        # (from the primary, a replica may not have the groups the buffer has already dropped)
+        rows = ingest_buffer.read_with_pending(expense_date, lambda d: _fetch_expenses_for_date(d, primary=True))
+        return _as_rows(rows, columns)
+    return _fetch_expenses_for_date(expense_date, columns=columns)
+
+def _fetch_expenses_for_date(expense_date, primary=False, columns=None):
+    return _read_expenses(
+        "SELECT {columns} FROM expenses WHERE expense_date = %s", (expense_date,), columns, primary=primary
+    )
+
+
+# Most dates (or days of a range) fetch_expenses_for_dates accepts in one call
+MAX_BATCH_DATES = 366
 
+@functools.lru_cache(maxsize=None)
+def _expenses_for_dates_query(slots):
+    return (f"SELECT {{columns}} FROM expenses WHERE expense_date IN ({', '.join(['%s'] * slots)}) "
+            "ORDER BY expense_date, id")
+
+EXPENSES_BETWEEN_QUERY = (
+    "SELECT {columns} FROM expenses WHERE expense_date >= %s AND expense_date <= %s ORDER BY expense_date, id"
+)
 
 @log
+def fetch_expenses_for_dates(dates=None, start_date=None, end_date=None, columns=None):
+    """
+    Expenses of several dates in one query, as {date: [expense, ...]} in date order.
+
+    Pass either a list of dates or an inclusive start_date / end_date range; every requested date
+    is in the result, with an empty list if it has no expenses.
+    """
+    ranged = dates is None
+    if (start_date is None or end_date is None) if ranged else (start_date is not None or end_date is not None):
+        raise ValueError("Pass either dates or both start_date and end_date")
+    if ranged:
+        if start_date > end_date:
+            raise ValueError("start_date must not be after end_date")
+        dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+    if len(dates) > MAX_BATCH_DATES:
+        raise ValueError(f"At most {MAX_BATCH_DATES} dates can be fetched at once")
+
+    # A contiguous range is one range scan, scattered dates an IN list padded to a fixed length
+    # The date is needed for grouping, whether it was asked for or not
+    query_columns = columns if columns is None or "expense_date" in columns else ("expense_date", *columns)
+    if ranged:
+        rows = _read_expenses(EXPENSES_BETWEEN_QUERY, (start_date, end_date), query_columns)
+    else:
+        slots = _slots(len(dates), 32)
+        rows = _read_expenses(_expenses_for_dates_query(slots), _padded(dates, slots), query_columns)
+
+    expenses_by_date = {expense_date: [] for expense_date in dates}
+    for expense in rows:
+        expenses_by_date[_to_date(expense["expense_date"])].append(expense)
+    if query_columns is not columns:
+        make = row_type(columns)._make
+        expenses_by_date = {day: [make(row[1:]) for row in rows] for day, rows in expenses_by_date.items()}
+    # Dates with expenses still waiting in the write-behind buffer are read like single dates
+    for expense_date in dates:
+        if ingest_buffer.has_pending(expense_date):
+            expenses_by_date[expense_date] = fetch_expenses_for_date(expense_date, columns)
+    return expenses_by_date
+
+@log
+@shared_cache.cached
+@single_flight.coalesce
+def fetch_daily_totals(year: int):
+    """Total of every day of the year (index 0 is January 1st), archived years included."""
+    rows = run_prepared(
+        "SELECT expense_date, SUM(amount) AS total_amount FROM expenses "
+        "WHERE expense_date >= %s AND expense_date < %s GROUP BY expense_date",
+        year_bounds(year)
+    )
+    start, end = year_bounds(year)
+    totals = [0.0] * (end - start).days
+    for row in rows:
+        totals[(_to_date(row["expense_date"]) - start).days] += float(row["total_amount"])
+    if year in archive.archived_years():
+        for expense_date, category, total in archive.daily_totals(year):
+            totals[(_to_date(expense_date) - start).days] += total
+    return totals
+
+
+@log
+@shared_cache.cached
+@single_flight.coalesce
 def fetch_monthly_expenses(year: int, category: str):
     """
     Fetch month-wise expenses for a specific year and category(ies).
@@ -53,187 +564,163 @@ def fetch_monthly_expenses(year: int, category: str):
     Returns:
         List[Tuple]: A list of tuples containing the month name and total amount.
     """
-    allowed_categories = {
-        "food", "utilities", "housing", "transportation", "insurance",
-        "medical", "debt payment", "entertainment", "misc", "shopping", "all"
-    }
-
-    # Normalize category input
-    category_lower = category.lower()
-
-    # Validate category input
-    if category_lower == "all":
-        category_filter = ""
+    # Normalize and validate category input
+    if category.strip().lower() == "all":
+        selected = None
     else:
-        categories = [c.strip().lower() for c in category_lower.split(",")]
-        for cat in categories:
-            if cat not in allowed_categories:
-                raise ValueError(
-                    f"Invalid category: '{cat}'. Must be one of: "
-                    f"{', '.join([c.title() for c in allowed_categories if c != 'all'])} or 'all'"
-                )
-        category_filter = " OR ".join([f"LOWER(category) = '{cat}'" for cat in categories])
+        selected = list(dict.fromkeys(c.strip().lower() for c in category.split(",")))
+        category_ids = [categories.require(cat, allow_all=True) for cat in selected]
+        if None in category_ids:
+            raise ValueError("'all' cannot be combined with other categories")
 
     # logger.info(f"fetch_monthly_expenses called with year={year}, category='{category}'")
-    with get_db_cursor() as cursor:
-        # Execute query with year and category filters
-        if category_filter:
-            query = f'''
-                SELECT
-                    MONTHNAME(expense_date) AS month_name,
-                    SUM(amount) AS total_amount
-                FROM
-                    expenses
-                WHERE
-                    YEAR(expense_date) = %s AND ({category_filter})
-                GROUP BY
-                    MONTH(expense_date), MONTHNAME(expense_date)
-                ORDER BY
-                    MONTH(expense_date);
-            '''
+    # Execute query with year and category filters
+    if selected:
+        # One statement shape for any number of categories: the IN list is padded to a fixed length
+        slots = _category_slots(len(category_ids))
+        expenses_by_month = run_prepared(
+            _monthly_expenses_by_category_query(slots),
+            [*year_bounds(year), *_padded(category_ids, slots)]
+        )
+    else:
+        expenses_by_month = run_prepared(MONTHLY_EXPENSES_QUERY, year_bounds(year))
+
+    # Initialize a dictionary to hold month-wise expenses
+    month_expenses = {}
+
+    # Populate month_expenses dictionary
+    for expense in expenses_by_month:
+        month_expenses[expense['month_name']] = expense['total_amount']
+
+    # Merge the totals of an archived year
+    if year in archive.archived_years():
+        for month, total in archive.monthly_totals(year, selected).items():
+            month_expenses[month] = month_expenses.get(month, 0) + total
+
+    # Create a list of tuples with month names and total amounts
+    result = []
+    month_names = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+                   "November", "December"]
+
+    # Loop through each month and append to result
+    for month in month_names:
+        if month in month_expenses:
+            result.append((month, month_expenses[month]))
         else:
-            query = '''
-                SELECT
-                    MONTHNAME(expense_date) AS month_name,
-                    SUM(amount) AS total_amount
-                FROM
-                    expenses
-                WHERE
-                    YEAR(expense_date) = %s
-                GROUP BY
-                    MONTH(expense_date), MONTHNAME(expense_date)
-                ORDER BY
-                    MONTH(expense_date);
-            '''
-
-        cursor.execute(query, (year,))
-        expenses_by_month = cursor.fetchall()
-
-        # Initialize a dictionary to hold month-wise expenses
-        month_expenses = {}
-
-        # Populate month_expenses dictionary
-        for expense in expenses_by_month:
-            month_expenses[expense['month_name']] = expense['total_amount']
-
-        # Create a list of tuples with month names and total amounts
-        result = []
-        month_names = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
-                       "November", "December"]
-
-        # Loop through each month and append to result
-        for month in month_names:
-            if month in month_expenses:
-                result.append((month, month_expenses[month]))
-            else:
-                result.append((month, 0.0))
-
-        return result
+            result.append((month, 0.0))
+
+    return result
 
 
 @log
 def insert_expense(expense_date, amount, category, notes):
-    # Define allowed categories (case-insensitive)
-    allowed_categories = {
-        "food", "utilities", "housing", "transportation", "insurance", "medical",
-        "debt payment", "entertainment", "misc", "shopping"
-    }
-
-    # Validate category input
-    if category.lower() not in allowed_categories:
-        raise ValueError(f"Invalid category: '{category}'. Must be one of: {', '.join(allowed_categories)}")
+    # Validate category input (case-insensitive)
+    category_id = categories.require(category)
 
     #logger.info(f"insert_expense called with {expense_date}, {amount}, {category}, {notes}")
     with get_db_cursor(commit=True) as cursor:
         cursor.execute(
-            "INSERT INTO expenses (expense_date, amount, category, notes) VALUES (%s, %s, %s, %s)",
-            (expense_date, amount, category, notes)
+            "INSERT INTO expenses (expense_date, amount, category_id, notes) VALUES (%s, %s, %s, %s)",
+            (expense_date, amount, category_id, notes)
         )
+        changes = [_change("insert", expense_date, amount, categories.name_of(category_id), notes)]
+        _apply_changes(cursor, changes)
+
+    _notify(changes)
 
 @log
 def delete_expenses_for_date(expense_date):
     #logger.info(f"delete_expenses_for_date called with {expense_date}")
     with get_db_cursor(commit=True) as cursor:
+        changes = _rows_to_delete(cursor, "expense_date = %s", (expense_date,))
         cursor.execute("DELETE FROM expenses WHERE expense_date = %s", (expense_date,))
+        _apply_changes(cursor, changes)
+
+    _notify(changes)
 
 @log
+@shared_cache.cached
+@single_flight.coalesce
 def fetch_expense_summary(start_date, end_date):
     #logger.info(f"fetch_expense_summary called with start_date={start_date}, end_date={end_date}")
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            '''SELECT category, SUM(amount) as Total
-               FROM expenses WHERE expense_date
-               BETWEEN %s and %s
-               GROUP BY category;''',
-            (start_date, end_date)
-        )
-
-        data = cursor.fetchall()
-        return data
+    data = _named(run_prepared(
+        '''SELECT category_id, SUM(amount) as Total
+           FROM expenses WHERE expense_date
+           BETWEEN %s and %s
+           GROUP BY category_id''',
+        (start_date, end_date)
+    ))
+
+    # Merge the totals of archived years in the range
+    archived_totals = archive.category_totals(start_date, end_date)
+    if archived_totals:
+        for row in data:
+            row['Total'] += archived_totals.pop(row['category'], 0)
+        data.extend({'category': category, 'Total': total} for category, total in archived_totals.items())
+
+    return data
 
 @log
-def fetch_expenses_for_particular_category_date(category, expense_date):
-    allowed_categories = {
-        "food", "utilities", "housing", "transportation", "insurance",
-        "medical", "debt payment", "entertainment", "misc", "shopping", "all"
-    }
+def export_expenses(start_date, end_date, columns=API_COLUMNS):
+    """All expenses in the inclusive date range, archived years included, ordered by date."""
+    rows = _read_expenses(EXPENSES_BETWEEN_QUERY, (start_date, end_date), columns)
 
-    # Normalize category input
-    category_lower = category.lower()
+    archived_rows = archive.rows_between(start_date, end_date)
+    if archived_rows:
+        rows = sorted(_as_rows(archived_rows, columns) + rows, key=lambda row: _to_date(row['expense_date']))
 
-    # Validate category
-    if category_lower not in allowed_categories:
-        raise ValueError(
-            f"Invalid category: '{category}'. Must be one of: "
-            f"{', '.join([c.title() for c in allowed_categories if c != 'all'])} or 'all'"
-        )
-    #logger.info(f"fetch_expenses_for_particular_category_date called with category='{category}', expense_date={expense_date}")
-    with get_db_cursor() as cursor:
-        if category_lower == "all":
-            # Query without category filter
-            cursor.execute(
-                "SELECT * FROM expenses WHERE expense_date = %s",
-                (expense_date,)
-            )
-        else:
-            # Case-insensitive category match using LOWER()
-            cursor.execute(
-                "SELECT * FROM expenses "
-                "WHERE expense_date = %s AND LOWER(category) = %s",
-                (expense_date, category_lower)
-            )
+    return rows
 
-        expenses_for_category_date = cursor.fetchall()
-        return expenses_for_category_date if expenses_for_category_date else []
+@log
+@shared_cache.cached
+@single_flight.coalesce
+def fetch_expenses_for_particular_category_date(category, expense_date, columns=None):
+    # Validate category (case-insensitive); None means 'all'
+    category_id = categories.require(category, allow_all=True)
+
+    #logger.info(f"fetch_expenses_for_particular_category_date called with category='{category}', expense_date={expense_date}")
+    if category_id is None:
+        # Query without category filter
+        return _read_expenses(
+            "SELECT {columns} FROM expenses WHERE expense_date = %s",
+            (expense_date,), columns
+        )
+    return _read_expenses(
+        "SELECT {columns} FROM expenses "
+        "WHERE expense_date = %s AND category_id = %s",
+        (expense_date, category_id), columns
+    )
 
 @log
-def fetch_expenses_for_particular_note(wildcard_note: str, year: int, months: list):
+@shared_cache.cached
+@single_flight.coalesce
+def fetch_expenses_for_particular_note(wildcard_note: str, year: int, months: list, columns=None):
     """Fetch expenses matching note pattern, year, and months."""
-    with get_db_cursor() as cursor:
-        # Base query with new filters
-        query = """
-            SELECT * FROM expenses 
-            WHERE LOWER(notes) LIKE %s 
-            AND YEAR(expense_date) = %s 
-            AND MONTH(expense_date) IN ({})
-            ORDER BY expense_date DESC
-        """.format(','.join(['%s'] * len(months)))  # Dynamic IN clause
+    months = sorted(set(months))
+    if any(not 1 <= month <= 12 for month in months):
+        raise ValueError("Months must be between 1 and 12")
+    if not months:
+        return []
 
-        # Prepare parameters
-        wildcard_term = '%' + wildcard_note.lower() + '%'
-        params = [wildcard_term, year] + months
+    # Prepare parameters; the month IN list is padded to 12 values, so every search has one shape
+    wildcard_term = '%' + wildcard_note.lower() + '%'
+    start, end = year_bounds(year, min(months), max(months))
+    params = [wildcard_term, start, end] + _padded(months, 12)
 
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        return results if results else []
+    results = _read_expenses(NOTE_SEARCH_QUERY, params, columns)
+
+    # Merge the matching rows of an archived year, keeping the newest-first order
+    if year in archive.archived_years():
+        results.extend(_as_rows(archive.note_matches(wildcard_note, year, months), columns))
+        results.sort(key=lambda row: _to_date(row['expense_date']), reverse=True)
+
+    return results if results else []
 
 @log
-def fetch_expenses_by_category_and_day(category: str, period_of_week: str):
-    # Define allowed categories and periods
-    allowed_categories = {
-        "food", "utilities", "housing", "transportation", "insurance",
-        "medical", "debt payment", "entertainment", "misc", "shopping", "all"
-    }
+@shared_cache.cached
+@single_flight.coalesce
+def fetch_expenses_by_category_and_day(category: str, period_of_week: str, columns=None):
+    # Define allowed periods
     allowed_periods = {
         "weekend", "weekday",
         "monday", "tuesday", "wednesday", "thursday",
@@ -242,15 +729,9 @@ def fetch_expenses_by_category_and_day(category: str, period_of_week: str):
 
     # Normalize inputs
     period = period_of_week.lower()
-    category_filter = category.lower()
 
-    # Validate category
-    if category_filter not in allowed_categories:
-        valid_cats = [c.title() for c in allowed_categories if c != "all"]
-        raise ValueError(
-            f"Invalid category: '{category}'. Must be one of: "
-            f"{', '.join(valid_cats)} or 'all'"
-        )
+    # Validate category (case-insensitive); None means 'all'
+    category_id = categories.require(category, allow_all=True)
 
     # Validate period
     if period not in allowed_periods:
@@ -260,32 +741,31 @@ def fetch_expenses_by_category_and_day(category: str, period_of_week: str):
         )
 
     #logger.info(f"fetch_expenses_by_category_and_day called with category='{category}', period_of_week='{period_of_week}'")
-    with get_db_cursor() as cursor:
-        query = "SELECT * FROM expenses WHERE "
-        conditions = []
-        params = []
+    query = "SELECT {columns} FROM expenses WHERE "
+    conditions = []
+    params = []
 
-        # Category filter (skip if 'all')
-        if category_filter != "all":
-            conditions.append("LOWER(category) = %s")
-            params.append(category_filter)
+    # Category filter (skip if 'all')
+    if category_id is not None:
+        conditions.append("category_id = %s")
+        params.append(category_id)
 
-        # Period filter
-        if period == "weekend":
-            conditions.append("DAYOFWEEK(expense_date) IN (1,7)")  # Sun=1, Sat=7
-        elif period == "weekday":
-            conditions.append("DAYOFWEEK(expense_date) BETWEEN 2 AND 6")  # Mon-Fri
-        else:  # Specific day
-            conditions.append("LOWER(DAYNAME(expense_date)) = %s")
-            params.append(period)
+    # Period filter
+    if period == "weekend":
+        conditions.append("DAYOFWEEK(expense_date) IN (1,7)")  # Sun=1, Sat=7
+    elif period == "weekday":
+        conditions.append("DAYOFWEEK(expense_date) BETWEEN 2 AND 6")  # Mon-Fri
+    else:  # Specific day
+        conditions.append("LOWER(DAYNAME(expense_date)) = %s")
+        params.append(period)
 
-        # Build final query
-        query += " AND ".join(conditions) + " ORDER BY expense_date DESC"
+    # Build final query
+    query += " AND ".join(conditions) + " ORDER BY expense_date DESC"
 
-        cursor.execute(query, tuple(params))
-        results = cursor.fetchall()
+    # At most six shapes (category or not x weekend, weekday or day name), all prepared once
+    results = _read_expenses(query, params, columns)
 
-        return results if results else []
+    return results
 
 
 @log
@@ -293,19 +773,29 @@ def delete_expense(expense_date: str, category: str, notes: str):
     """
     Deletes a record from the database based on expense_date, category, and notes.
     """
+    category_id = categories.id_of(category)
     with get_db_cursor(commit=True) as cursor:
+        changes = _rows_to_delete(
+            cursor,
+            "expense_date = %s AND category_id = %s AND LOWER(notes) = LOWER(%s)",
+            (expense_date, category_id, notes)
+        )
         cursor.execute(
             """
             DELETE FROM expenses 
             WHERE expense_date = %s 
-            AND category = %s 
+            AND category_id = %s 
             AND LOWER(notes) = LOWER(%s)
             """,
-            (expense_date, category, notes)
+            (expense_date, category_id, notes)
         )
+        _apply_changes(cursor, changes)
+
+    _notify(changes)
 
 @log
 def add_expense(expense_date: str, amount: float, category: str, notes: str, check_duplicate: bool = False):
+    category_id = categories.require(category)
     with get_db_cursor(commit=True) as cursor:
         if check_duplicate:
             cursor.execute(
@@ -313,21 +803,25 @@ def add_expense(expense_date: str, amount: float, category: str, notes: str, che
                 SELECT 1 FROM expenses 
                 WHERE expense_date = %s 
                 AND amount = %s 
-                AND category = %s 
+                AND category_id = %s 
                 AND LOWER(notes) = LOWER(%s)
                 """,
-                (expense_date, amount, category, notes)
+                (expense_date, amount, category_id, notes)
             )
             if cursor.fetchone():
                 raise ValueError("Duplicate expense entry")
 
         cursor.execute(
             """
-            INSERT INTO expenses (expense_date, amount, category, notes)
+            INSERT INTO expenses (expense_date, amount, category_id, notes)
             VALUES (%s, %s, %s, %s)
             """,
-            (expense_date, amount, category, notes)
+            (expense_date, amount, category_id, notes)
         )
+        changes = [_change("insert", expense_date, amount, categories.name_of(category_id), notes)]
+        _apply_changes(cursor, changes)
+
+    _notify(changes)
 
 
 def check_duplicate(expense_date: str, amount: float, category: str, notes: str, exclude_original: tuple = None):
@@ -337,15 +831,15 @@ def check_duplicate(expense_date: str, amount: float, category: str, notes: str,
             SELECT 1 FROM expenses 
             WHERE expense_date = %s 
             AND amount = %s 
-            AND category = %s 
+            AND category_id = %s 
             AND LOWER(notes) = LOWER(%s)
         """
-        params = [expense_date, amount, category, notes]
+        params = [expense_date, amount, categories.id_of(category), notes]
 
         if exclude_original:
             old_amount, old_category, old_notes = exclude_original
-            query += " AND NOT (amount = %s AND category = %s AND LOWER(notes) = LOWER(%s))"
-            params += [old_amount, old_category, old_notes]
+            query += " AND NOT (amount = %s AND category_id = %s AND LOWER(notes) = LOWER(%s))"
+            params += [old_amount, categories.id_of(old_category), old_notes]
 
         cursor.execute(query, params)
         return cursor.fetchone() is not None
@@ -353,6 +847,8 @@ def check_duplicate(expense_date: str, amount: float, category: str, notes: str,
 
 def update_expense(old_data: dict, new_data: dict):
     """Atomic update operation with duplicate check"""
+    old_category_id = categories.id_of(old_data["category"])
+    new_category_id = categories.require(new_data["category"])
     with get_db_cursor(commit=True) as cursor:
         # 1. Check duplicate for new values (excluding original)
         cursor.execute(
@@ -360,17 +856,17 @@ def update_expense(old_data: dict, new_data: dict):
             SELECT 1 FROM expenses 
             WHERE expense_date = %s 
             AND amount = %s 
-            AND category = %s 
+            AND category_id = %s 
             AND LOWER(notes) = LOWER(%s)
-            AND NOT (amount = %s AND category = %s AND LOWER(notes) = LOWER(%s))
+            AND NOT (amount = %s AND category_id = %s AND LOWER(notes) = LOWER(%s))
             """,
             (
                 new_data["expense_date"],
                 new_data["amount"],
-                new_data["category"],
+                new_category_id,
                 new_data["notes"],
                 old_data["amount"],
-                old_data["category"],
+                old_category_id,
                 old_data["notes"]
             )
         )
@@ -378,18 +874,23 @@ def update_expense(old_data: dict, new_data: dict):
             raise ValueError("Duplicate expense entry")
 
         # 2. Delete original
+        changes = _rows_to_delete(
+            cursor,
+            "expense_date = %s AND amount = %s AND category_id = %s AND LOWER(notes) = LOWER(%s)",
+            (old_data["expense_date"], old_data["amount"], old_category_id, old_data["notes"])
+        )
         cursor.execute(
             """
             DELETE FROM expenses 
             WHERE expense_date = %s 
             AND amount = %s 
-            AND category = %s 
+            AND category_id = %s 
             AND LOWER(notes) = LOWER(%s)
             """,
             (
                 old_data["expense_date"],
                 old_data["amount"],
-                old_data["category"],
+                old_category_id,
                 old_data["notes"]
             )
         )
@@ -397,16 +898,21 @@ def update_expense(old_data: dict, new_data: dict):
         # 3. Insert new
         cursor.execute(
             """
-            INSERT INTO expenses (expense_date, amount, category, notes)
+            INSERT INTO expenses (expense_date, amount, category_id, notes)
             VALUES (%s, %s, %s, %s)
             """,
             (
                 new_data["expense_date"],
                 new_data["amount"],
-                new_data["category"],
+                new_category_id,
                 new_data["notes"]
             )
         )
+        changes.append(_change("insert", new_data["expense_date"], new_data["amount"],
+                               categories.name_of(new_category_id), new_data["notes"]))
+        _apply_changes(cursor, changes)
+
+    _notify(changes)
 
 #if __name__ == "__main__":
 #     pass
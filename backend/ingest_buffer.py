@@ -0,0 +1,269 @@
+# Optional write-behind buffer for high-rate ingestion (e.g. mobile clients syncing).
+#
+# Enabled with WRITE_BEHIND=true in .env. Accepted expenses are appended to a local journal file
+# (fsync'ed once per request) and acknowledged straight away. A background thread commits them to
+# the database in groups, as soon as FLUSH_SIZE expenses are waiting or every FLUSH_INTERVAL
+# seconds, with one multi-row INSERT per group instead of one connection and commit per expense.
+#
+# Every journal entry carries a sequence number. The highest committed sequence number is stored
+# in ingest_checkpoints in the same transaction as the group, so after a crash the entries above it
+# are replayed from the journal exactly once. fetch_expenses_for_date merges entries that are still
+# waiting, so a client always reads its own acknowledged writes.
+
+import json
+import os
+import threading
+from datetime import date
+
+import categories
+import db_helper
+from logging_setup import setup_logger
+
+logger = setup_logger(name='ingest_buffer', log_file='backend_server_logs.log')
+
+DEFAULT_JOURNAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_journal.jsonl")
+
+# The journal is rewritten with only the waiting entries once it grows beyond this size
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024
+
+_lock = threading.Condition()
+# Held by the flusher while it commits a group and removes it from _pending, so readers never see
+# a group both in the database and in _pending (or in neither)
+_commit_lock = threading.Lock()
+
+_pending = []          # journal entries not committed yet, in sequence order
+_pending_dates = {}    # expense_date -> number of waiting entries
+_next_sequence = 1
+_flushed_sequence = 0
+_flushed_total = 0
+_thread = None
+_stopping = False
+
+
+def enabled():
+    return os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+
+
+def journal_path():
+    return os.getenv("INGEST_JOURNAL", DEFAULT_JOURNAL)
+
+
+def _flush_size():
+    return int(os.getenv("FLUSH_SIZE", "500"))
+
+
+def _flush_interval():
+    return float(os.getenv("FLUSH_INTERVAL", "0.5"))
+
+
+def _journal_key():
+    return os.path.basename(journal_path())
+
+
+def is_running():
+    return _thread is not None and _thread.is_alive()
+
+
+def stats():
+    with _lock:
+        return {
+            "enabled": is_running(),
+            "pending": len(_pending),
+            "flushed_total": _flushed_total,
+            "flushed_sequence": _flushed_sequence,
+            "next_sequence": _next_sequence,
+        }
+
+
+def _track(entry, count):
+    expense_date = entry["expense_date"]
+    _pending_dates[expense_date] = _pending_dates.get(expense_date, 0) + count
+    if _pending_dates[expense_date] <= 0:
+        del _pending_dates[expense_date]
+
+
+def submit(expenses):
+    """
+    Journal and acknowledge expenses without waiting for the database.
+
+    Args:
+        expenses (List[dict]): expense_date, amount, category and notes of each expense.
+
+    Returns:
+        int: the sequence number of the last accepted expense.
+    """
+    names = [categories.canonical(expense["category"]) for expense in expenses]
+
+    global _next_sequence
+    with _lock:
+        entries = []
+        for expense, name in zip(expenses, names):
+            entries.append({
+                "sequence": _next_sequence,
+                "expense_date": db_helper._to_date(expense["expense_date"]),
+                "amount": float(expense["amount"]),
+                "category": name,
+                "notes": expense["notes"],
+            })
+            _next_sequence += 1
+
+        # One write and one fsync per request; nothing is acknowledged before it is on disk
+        with open(journal_path(), "a") as journal:
+            for entry in entries:
+                journal.write(json.dumps({**entry, "expense_date": entry["expense_date"].isoformat()}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        for entry in entries:
+            _pending.append(entry)
+            _track(entry, 1)
+        if len(_pending) >= _flush_size():
+            _lock.notify()
+        return _next_sequence - 1
+
+
+def has_pending(expense_date):
+    if not _pending_dates:
+        return False
+    return db_helper._to_date(expense_date) in _pending_dates
+
+
+def read_with_pending(expense_date, fetch):
+    """Rows returned by fetch(expense_date) plus the waiting entries for that date."""
+    expense_date = db_helper._to_date(expense_date)
+    with _commit_lock:
+        rows = fetch(expense_date)
+        with _lock:
+            waiting = [entry for entry in _pending if entry["expense_date"] == expense_date]
+    return rows + [
+        {"id": None, "expense_date": e["expense_date"], "amount": e["amount"], "category": e["category"],
+         "notes": e["notes"]}
+        for e in waiting
+    ]
+
+
+def _read_checkpoint():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT last_sequence FROM ingest_checkpoints WHERE journal = %s", (_journal_key(),))
+        row = cursor.fetchone()
+        return row["last_sequence"] if row else 0
+
+
+# Load the entries the database has not committed yet from the journal
+def recover():
+    global _next_sequence, _flushed_sequence
+    checkpoint = _read_checkpoint()
+    recovered = []
+    last_sequence = checkpoint
+    if os.path.exists(journal_path()):
+        with open(journal_path()) as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; it was never acknowledged
+                    logger.warning("Skipping an incomplete journal line")
+                    continue
+                last_sequence = max(last_sequence, entry["sequence"])
+                if entry["sequence"] > checkpoint:
+                    entry["expense_date"] = date.fromisoformat(entry["expense_date"])
+                    recovered.append(entry)
+
+    with _lock:
+        _pending[:] = recovered
+        _pending_dates.clear()
+        for entry in recovered:
+            _track(entry, 1)
+        _flushed_sequence = checkpoint
+        _next_sequence = last_sequence + 1
+    if recovered:
+        logger.info(f"Recovered {len(recovered)} unflushed expenses from {journal_path()}")
+    return len(recovered)
+
+
+def _compact_journal():
+    # Called with _lock held. Keep only the entries that are still waiting.
+    if not _pending:
+        open(journal_path(), "w").close()
+    elif os.path.getsize(journal_path()) > JOURNAL_MAX_BYTES:
+        tmp_path = journal_path() + ".tmp"
+        with open(tmp_path, "w") as journal:
+            for entry in _pending:
+                journal.write(json.dumps({**entry, "expense_date": entry["expense_date"].isoformat()}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_path, journal_path())
+
+
+def flush():
+    """Commit one group of waiting entries. Returns the number of expenses committed."""
+    global _flushed_sequence, _flushed_total
+    with _lock:
+        batch = _pending[:_flush_size() * 4]
+    if not batch:
+        return 0
+
+    changes = [db_helper._change("insert", e["expense_date"], e["amount"], e["category"], e["notes"]) for e in batch]
+    rows = [(e["expense_date"], e["amount"], categories.require(e["category"]), e["notes"]) for e in batch]
+    with _commit_lock:
+        with db_helper.get_db_cursor(commit=True) as cursor:
+            db_helper.insert_many(cursor, "expenses", ("expense_date", "amount", "category_id", "notes"), rows)
+            db_helper._apply_changes(cursor, changes)
+            cursor.execute(
+                "INSERT INTO ingest_checkpoints (journal, last_sequence) VALUES (%s, %s) "
+                "ON DUPLICATE KEY UPDATE last_sequence = VALUES(last_sequence)",
+                (_journal_key(), batch[-1]["sequence"])
+            )
+
+        with _lock:
+            del _pending[:len(batch)]
+            for entry in batch:
+                _track(entry, -1)
+            _flushed_sequence = batch[-1]["sequence"]
+            _flushed_total += len(batch)
+            _compact_journal()
+
+    db_helper._notify(changes)
+    return len(batch)
+
+
+def _run():
+    while True:
+        with _lock:
+            _lock.wait_for(lambda: _stopping or len(_pending) >= _flush_size(), timeout=_flush_interval())
+            stopping = _stopping
+        try:
+            while flush() >= _flush_size():
+                pass
+        except Exception:
+            logger.exception("Write-behind flush failed, retrying")
+            if not stopping:
+                threading.Event().wait(_flush_interval())
+                continue
+        if stopping:
+            return
+
+
+def start():
+    """Recover the journal and start the background flusher."""
+    global _thread, _stopping
+    if is_running():
+        return
+    _stopping = False
+    recover()
+    _thread = threading.Thread(target=_run, name="ingest-flusher", daemon=True)
+    _thread.start()
+    logger.info("Write-behind ingest buffer started")
+
+
+def stop():
+    """Flush everything that is waiting and stop the background flusher."""
+    global _thread, _stopping
+    if not is_running():
+        return
+    with _lock:
+        _stopping = True
+        _lock.notify()
+    _thread.join()
+    _thread = None
+    logger.info("Write-behind ingest buffer stopped")
@@ -0,0 +1,200 @@
+import os
+import re
+import sqlite3
+import calendar
+import functools
+from datetime import date, datetime
+
+# Local SQLite stand-in for the MySQL server.
+# It is selected by setting DB_ENGINE=sqlite in .env, in which case DB_NAME is the path of the
+# database file. It lets benchmarks, load tests and unit tests run without an external server.
+# Only the subset of MySQL used by this project is supported:
+# - %s placeholders
+# - YEAR, MONTH, MONTHNAME, DAYOFWEEK and DAYNAME on DATE columns
+# - AUTO_INCREMENT primary keys in CREATE TABLE statements
+# - INSERT ... ON DUPLICATE KEY UPDATE col = VALUES(col) and INSERT IGNORE
+# - SELECT ... FOR UPDATE (SQLite locks the whole database on write, so the clause is dropped)
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(sep=" "))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _year(value):
+    d = _to_date(value)
+    return d.year if d else None
+
+
+def _month(value):
+    d = _to_date(value)
+    return d.month if d else None
+
+
+def _monthname(value):
+    d = _to_date(value)
+    return calendar.month_name[d.month] if d else None
+
+
+def _dayofweek(value):
+    # MySQL numbering: 1 = Sunday ... 7 = Saturday
+    d = _to_date(value)
+    return (d.isoweekday() % 7) + 1 if d else None
+
+
+def _dayname(value):
+    d = _to_date(value)
+    return calendar.day_name[d.weekday()] if d else None
+
+
+_AUTO_INCREMENT_PK = re.compile(
+    r"\b(?:BIG|SMALL|TINY)?INT(?:EGER)?\s+(?:UNSIGNED\s+)?(?:NOT\s+NULL\s+)?AUTO_INCREMENT\s+PRIMARY\s+KEY",
+    re.IGNORECASE
+)
+_ON_DUPLICATE_KEY = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_FUNCTION = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"^\s*INSERT\s+IGNORE\b", re.IGNORECASE)
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.IGNORECASE)
+_CREATE_INDEX = re.compile(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(?!IF\s+NOT\s+EXISTS)", re.IGNORECASE)
+
+
+# Translate a MySQL statement into the SQLite dialect.
+@functools.lru_cache(maxsize=1024)
+def translate(query):
+    query = _AUTO_INCREMENT_PK.sub("INTEGER PRIMARY KEY AUTOINCREMENT", query)
+    query = _FOR_UPDATE.sub("", query.rstrip())
+    query = _INSERT_IGNORE.sub("INSERT OR IGNORE", query)
+    if _ON_DUPLICATE_KEY.search(query):
+        # SQLite (3.35+) upsert without a conflict target; VALUES(col) becomes excluded.col
+        head, tail = _ON_DUPLICATE_KEY.split(query, maxsplit=1)
+        query = head + "ON CONFLICT DO UPDATE SET" + _VALUES_FUNCTION.sub(r"excluded.\1", tail)
+    query = _CREATE_INDEX.sub(lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS ", query)
+    return query.replace("%s", "?")
+
+
+class LocalCursor:
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def column_names(self):
+        return tuple(col[0] for col in self._cursor.description or ())
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate(query), tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(translate(query), seq_of_params)
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, row)) for row in rows]
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalConnection:
+    def __init__(self, database):
+        self._connection = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            timeout=30
+        )
+        for name, func in (("YEAR", _year), ("MONTH", _month), ("MONTHNAME", _monthname),
+                           ("DAYOFWEEK", _dayofweek), ("DAYNAME", _dayname)):
+            self._connection.create_function(name, 1, func, deterministic=True)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return LocalCursor(self._connection, dictionary=dictionary)
+
+    def start_transaction(self):
+        if not self._connection.in_transaction:
+            self._connection.execute("BEGIN")
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        try:
+            self._connection.execute("SELECT 1")
+            return True
+        except sqlite3.ProgrammingError:
+            return False
+
+    def close(self):
+        self._connection.close()
+
+
+# Run every statement of schema.sql against the given connection.
+def create_schema(connection, schema_file=SCHEMA_FILE):
+    with open(schema_file) as f:
+        lines = [line for line in f.read().splitlines() if not line.strip().startswith("--")]
+    cursor = connection.cursor()
+    for statement in "\n".join(lines).split(";"):
+        if statement.strip():
+            cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+
+
+# Database files whose schema has already been created by this process
+_initialized = set()
+
+
+# Drop-in replacement for mysql.connector.connect().
+# Host, user and password are accepted for compatibility and ignored.
+def connect(database=None, **kwargs):
+    database = database or "expense_manager.sqlite3"
+    connection = LocalConnection(database)
+    if database not in _initialized:
+        create_schema(connection)
+        _initialized.add(database)
+    return connection
@@ -0,0 +1,115 @@
+# One-off migration of the expenses table from a free-text category column to category_id, a
+# reference to the categories dimension table (see categories.py).
+#
+# Category names are matched case-insensitively; names that are not registered yet are added to
+# categories first, so no expense loses its category. The ids are filled in id-range chunks of
+# CHUNK_SIZE rows, each in its own transaction, so large tables are not locked for the whole run.
+# Running the migration again after it has completed (or after an interruption) is safe.
+#
+# Usage (from the backend directory):
+#   python migrate_categories.py
+
+import os
+
+import db_helper
+import local_db
+from logging_setup import setup_logger
+
+logger = setup_logger(name='migrate_categories', log_file='backend_server_logs.log')
+
+CHUNK_SIZE = 50_000
+
+
+def _is_sqlite():
+    return os.getenv("DB_ENGINE", "mysql").lower() == "sqlite"
+
+
+def _connect():
+    if _is_sqlite():
+        # Not local_db.connect(): it applies the current schema.sql, whose indexes need category_id
+        return local_db.LocalConnection(os.getenv("DB_NAME"))
+    return db_helper.connect()
+
+
+# The statements of schema.sql that create and fill the categories table
+def _categories_statements():
+    with open(local_db.SCHEMA_FILE) as f:
+        lines = [line for line in f.read().splitlines() if not line.strip().startswith("--")]
+    return [statement for statement in "\n".join(lines).split(";")
+            if " categories " in statement and "expenses" not in statement]
+
+
+def _expense_columns(cursor):
+    cursor.execute("SELECT * FROM expenses LIMIT 1")
+    cursor.fetchall()
+    return set(cursor.column_names)
+
+
+def migrate():
+    connection = _connect()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        columns = _expense_columns(cursor)
+        if "category" not in columns:
+            print("expenses already references categories by id")
+            return 0
+
+        for statement in _categories_statements():
+            cursor.execute(statement)
+
+        # Register the categories that only exist as free text so far
+        cursor.execute("SELECT LOWER(name) AS name FROM categories")
+        registered = {row["name"] for row in cursor.fetchall()}
+        cursor.execute("SELECT DISTINCT TRIM(category) AS category FROM expenses")
+        for row in cursor.fetchall():
+            if row["category"] and row["category"].lower() not in registered:
+                logger.info(f"Registering category '{row['category']}'")
+                cursor.execute("INSERT INTO categories (name) VALUES (%s)", (row["category"],))
+                registered.add(row["category"].lower())
+
+        if "category_id" not in columns:
+            cursor.execute("ALTER TABLE expenses ADD COLUMN category_id SMALLINT")
+        connection.commit()
+
+        cursor.execute("SELECT MIN(id) AS first_id, MAX(id) AS last_id FROM expenses")
+        bounds = cursor.fetchone()
+        updated = 0
+        if bounds["first_id"] is not None:
+            for start in range(bounds["first_id"], bounds["last_id"] + 1, CHUNK_SIZE):
+                cursor.execute(
+                    "UPDATE expenses SET category_id = "
+                    "(SELECT c.id FROM categories c WHERE LOWER(c.name) = LOWER(TRIM(expenses.category))) "
+                    "WHERE id >= %s AND id < %s",
+                    (start, start + CHUNK_SIZE)
+                )
+                updated += cursor.rowcount
+                connection.commit()
+                logger.info(f"Converted expenses with ids below {start + CHUNK_SIZE}")
+
+        if _is_sqlite():
+            cursor.execute("ALTER TABLE expenses DROP COLUMN category")
+            cursor.execute("CREATE INDEX idx_expenses_category_date ON expenses (category_id, expense_date)")
+        else:
+            cursor.execute(
+                "ALTER TABLE expenses MODIFY category_id SMALLINT NOT NULL, DROP COLUMN category, "
+                "ADD INDEX idx_expenses_category_date (category_id, expense_date)"
+            )
+            cursor.execute(
+                "SELECT COUNT(*) AS partitions FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'expenses' AND PARTITION_NAME IS NOT NULL"
+            )
+            # MySQL does not support foreign keys on partitioned tables (see partition_expenses.py)
+            if not cursor.fetchone()["partitions"]:
+                cursor.execute(
+                    "ALTER TABLE expenses ADD CONSTRAINT fk_expenses_category "
+                    "FOREIGN KEY (category_id) REFERENCES categories (id)"
+                )
+        connection.commit()
+        return updated
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == "__main__":
+    print(f"Converted {migrate()} expenses to category ids")
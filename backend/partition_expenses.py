@@ -0,0 +1,138 @@
+# Maintenance tool for the yearly RANGE partitions of the expenses table (MySQL only).
+#
+# Every analytics query is scoped by year or date range, so partitioning expenses by
+# YEAR(expense_date) lets MySQL skip ("prune") all other years. db_helper filters on the bare
+# expense_date column (see db_helper.year_bounds) so that pruning applies.
+#
+# Usage (from the backend directory):
+#   python partition_expenses.py migrate            # convert expenses to yearly partitions
+#   python partition_expenses.py ensure --ahead 1   # add partitions up to next year (schedule monthly)
+#   python partition_expenses.py status             # list partitions and their row counts
+#
+# A catch-all p_future partition always exists, so inserts never fail when `ensure` has not run yet;
+# `ensure` splits the (normally empty) p_future partition, which is a cheap metadata operation.
+
+import argparse
+import os
+from datetime import date
+
+import db_helper
+from logging_setup import setup_logger
+
+logger = setup_logger(name='partition_expenses', log_file='backend_server_logs.log')
+
+FUTURE_PARTITION = "p_future"
+
+
+def _require_mysql():
+    if os.getenv("DB_ENGINE", "mysql").lower() != "mysql":
+        raise SystemExit("Partitioning is only supported on MySQL (DB_ENGINE=mysql).")
+
+
+# Names and upper bounds of the current partitions, or an empty list if expenses is not partitioned.
+def fetch_partitions():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS upper_bound, TABLE_ROWS AS table_rows
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'expenses' AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """
+        )
+        return cursor.fetchall()
+
+
+def _partition_definition(year):
+    return f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+
+
+def migrate(ahead=1):
+    _require_mysql()
+    if fetch_partitions():
+        print("expenses is already partitioned; running ensure instead")
+        return ensure(ahead)
+
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT MIN(expense_date) AS first_date FROM expenses")
+        first_date = cursor.fetchone()["first_date"]
+
+    last_year = date.today().year + ahead
+    first_year = first_date.year if first_date else date.today().year
+    definitions = [_partition_definition(year) for year in range(first_year, last_year + 1)]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        # MySQL does not support foreign keys on partitioned tables; category ids are still
+        # validated against the category registry (categories.py) on every write
+        cursor.execute(
+            "SELECT CONSTRAINT_NAME AS name FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'expenses' AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+        )
+        for row in cursor.fetchall():
+            logger.info(f"Dropping foreign key {row['name']} of expenses")
+            cursor.execute(f"ALTER TABLE expenses DROP FOREIGN KEY {row['name']}")
+
+        # MySQL requires the partitioning column in every unique key, including the primary key
+        logger.info("Extending the primary key of expenses with expense_date")
+        cursor.execute("ALTER TABLE expenses DROP PRIMARY KEY, ADD PRIMARY KEY (id, expense_date)")
+
+        logger.info(f"Partitioning expenses by year from {first_year} to {last_year}")
+        cursor.execute(
+            "ALTER TABLE expenses PARTITION BY RANGE (YEAR(expense_date)) (" + ", ".join(definitions) + ")"
+        )
+
+    print(f"Partitioned expenses into {len(definitions) - 1} yearly partitions plus {FUTURE_PARTITION}")
+
+
+# Create the yearly partitions up to (current year + ahead) that do not exist yet.
+def ensure(ahead=1):
+    _require_mysql()
+    partitions = fetch_partitions()
+    if not partitions:
+        raise SystemExit("expenses is not partitioned yet. Run 'migrate' first.")
+
+    existing = {int(p["name"][1:]) for p in partitions if p["name"] != FUTURE_PARTITION}
+    last_year = date.today().year + ahead
+    next_year = max(existing) + 1 if existing else date.today().year
+    missing = list(range(next_year, last_year + 1))
+    if not missing:
+        print("All partitions up to", last_year, "exist")
+        return
+
+    definitions = [_partition_definition(year) for year in missing]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        logger.info(f"Adding partitions for {missing}")
+        cursor.execute(
+            f"ALTER TABLE expenses REORGANIZE PARTITION {FUTURE_PARTITION} INTO (" + ", ".join(definitions) + ")"
+        )
+
+    print("Added partitions:", ", ".join(f"p{year}" for year in missing))
+
+
+def status():
+    _require_mysql()
+    partitions = fetch_partitions()
+    if not partitions:
+        print("expenses is not partitioned")
+        return
+    for partition in partitions:
+        print(f"{partition['name']:<10} < {partition['upper_bound']:<10} ~{partition['table_rows']} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the yearly partitions of the expenses table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ("migrate", "ensure"):
+        command = subparsers.add_parser(name)
+        command.add_argument("--ahead", type=int, default=1, help="Years ahead of the current one to create")
+    subparsers.add_parser("status")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.ahead)
+    elif args.command == "ensure":
+        ensure(args.ahead)
+    else:
+        status()
@@ -0,0 +1,247 @@
+# Opt-in profiling of single requests.
+#
+# A request is profiled when it carries the admin header `X-Profile: <PROFILE_TOKEN>` (only if
+# PROFILE_TOKEN is set), or at random with probability PROFILE_SAMPLE_RATE (default 0, i.e. off).
+# At most one request per process is profiled at a time; others run normally meanwhile.
+#
+# FastAPI runs a request in two threads: routing, request parsing and validation of async endpoints
+# on the event loop, and sync endpoints with their response validation in the threadpool. The
+# middleware profiles the event loop part, and ProfiledRoute makes the threadpool part join the
+# same profile (the session is found through a context variable, which the threadpool inherits).
+# Two profilers run side by side:
+# - cProfile (deterministic), written as <name>.pstats (open with `python -m pstats` or snakeviz),
+# - a stack sampler every PROFILE_INTERVAL_MS, written as <name>.collapsed, one "frame;frame;... count"
+#   line per stack, which flamegraph.pl and speedscope read.
+# <name>.json holds the method, route, path and query parameters, request body (the parameters of
+# the POST endpoints; at most MAX_BODY_BYTES), status and duration. The files
+# are written to PROFILE_DIR and their name is returned in the X-Profile-Id response header.
+#
+# While the profiled request waits for the threadpool, the event loop serves other requests, and
+# their event loop work is in the cProfile output as well; profile at low concurrency to avoid it.
+
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from fastapi.routing import APIRoute
+
+PROFILE_HEADER = "X-Profile"
+MAX_BODY_BYTES = 10_000
+
+_session = contextvars.ContextVar("profile_session", default=None)
+_busy = threading.Lock()
+_ids = itertools.count(1)
+_stats_lock = threading.Lock()
+_stats = {"profiled": 0, "skipped_busy": 0}
+
+
+def sample_rate():
+    return float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+
+def directory():
+    return os.getenv("PROFILE_DIR", "profiles")
+
+
+def _interval():
+    return float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+
+def requested(headers):
+    """True if the request should be profiled: the admin header is valid, or it is sampled."""
+    token = os.getenv("PROFILE_TOKEN", "")
+    header = headers.get(PROFILE_HEADER)
+    if token and header is not None and hmac.compare_digest(header, token):
+        return True
+    rate = sample_rate()
+    return rate > 0 and random.random() < rate
+
+
+class _Session:
+    """The profilers and the sampled stacks of one profiled request."""
+
+    def __init__(self):
+        self.profiles = []
+        self.threads = set()   # threads currently running a part of the request
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+
+    # A new cProfile for the current thread, or None if the thread is already profiled
+    # (e.g. the event loop, for async endpoints)
+    def enter(self):
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self.threads:
+                return None
+            self.threads.add(ident)
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            return profile
+
+    def leave(self):
+        with self._lock:
+            self.threads.discard(threading.get_ident())
+
+    # Run func(*args, **kwargs) under a cProfile of the current thread
+    def run(self, func, *args, **kwargs):
+        profile = self.enter()
+        if profile is None:
+            return func(*args, **kwargs)
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self.leave()
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self):
+        interval = _interval()
+        while not self._stop.wait(interval):
+            with self._lock:
+                threads = tuple(self.threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                # The event loop waiting for I/O is not time spent on the request
+                if frame is None or frame.f_code.co_name == "select":
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+def _in_session(func):
+    """Wrap a sync callable run in the threadpool so that it joins the profile of its request."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return func(*args, **kwargs)
+        return session.run(func, *args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoint and response validation are profiled with their request."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        # The request handler was built above and looks both up on every call
+        if not asyncio.iscoroutinefunction(self.dependant.call):
+            self.dependant.call = _in_session(self.dependant.call)
+        if self.secure_cloned_response_field is not None:
+            self.secure_cloned_response_field.validate = _in_session(self.secure_cloned_response_field.validate)
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:80] or "root"
+
+
+def _body(raw):
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return raw[:MAX_BODY_BYTES].decode("utf-8", "replace")
+
+
+def _write(session, request, body, response, duration):
+    route = request.scope.get("route")
+    template = getattr(route, "path", request.url.path)
+    name = f"{datetime.now():%Y%m%d-%H%M%S}-{request.method}-{_slug(template)}-{os.getpid()}-{next(_ids)}"
+    os.makedirs(directory(), exist_ok=True)
+    base = os.path.join(directory(), name)
+
+    profiles = [profile for profile in session.profiles if profile.getstats()]
+    if profiles:
+        pstats.Stats(*profiles).dump_stats(base + ".pstats")
+    with open(base + ".collapsed", "w") as f:
+        for stack, count in session.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + ".json", "w") as f:
+        json.dump({
+            "method": request.method,
+            "route": template,
+            "path": request.url.path,
+            "path_params": request.scope.get("path_params", {}),
+            "query_params": dict(request.query_params),
+            "body": _body(body) if len(body) <= MAX_BODY_BYTES else f"<{len(body)} bytes>",
+            "status_code": response.status_code if response is not None else None,
+            "duration_ms": duration * 1000,
+            "samples": sum(session.stacks.values()),
+            "sample_interval_ms": _interval() * 1000,
+        }, f, indent=2, default=str)
+    return name
+
+
+async def profile_request(request, call_next):
+    """Middleware body: run the request under the profilers and save the profile next to its metadata."""
+    if not _busy.acquire(blocking=False):
+        with _stats_lock:
+            _stats["skipped_busy"] += 1
+        return await call_next(request)
+    try:
+        # Read before the request runs (Starlette keeps it for the endpoint)
+        body = await request.body()
+    except BaseException:
+        _busy.release()
+        raise
+
+    session = _Session()
+    token = _session.set(session)
+    response = None
+    profile = session.enter()
+    started = time.perf_counter()
+    session.start()
+    try:
+        profile.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profile.disable()
+    finally:
+        duration = time.perf_counter() - started
+        session.leave()
+        session.stop()
+        _session.reset(token)
+        try:
+            name = _write(session, request, body, response, duration)
+        finally:
+            _busy.release()
+        with _stats_lock:
+            _stats["profiled"] += 1
+    response.headers["X-Profile-Id"] = name
+    return response
+
+
+def stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    return {
+        "sample_rate": sample_rate(),
+        "admin_header": bool(os.getenv("PROFILE_TOKEN", "")),
+        "directory": directory(),
+        **counters,
+    }
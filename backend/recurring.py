@@ -0,0 +1,163 @@
+# Recurring expenses (rent, EMI, insurance premiums, subscriptions, ...).
+#
+# A rule repeats monthly (on the day of month of its start date, clamped to shorter months), weekly,
+# or every `interval_days` days ('custom'). The scheduler materializes every occurrence that is due
+# up to a given date in one transaction with a single multi-row INSERT, so backfilling months of
+# history costs one round trip instead of one per row. Materialized occurrences are recorded in
+# recurring_occurrences, whose primary key makes re-runs (and concurrent runs) idempotent.
+#
+# Usage (from the backend directory, e.g. from a daily cron job):
+#   python recurring.py run                      # materialize everything due up to today
+#   python recurring.py run --until 2024-12-31   # backfill up to a date
+
+import argparse
+import calendar
+from datetime import date, timedelta
+
+import categories
+import db_helper
+from logging_setup import setup_logger, log_function_call
+
+logger = setup_logger(name='recurring', log_file='backend_server_logs.log')
+log = log_function_call(logger)
+
+frequencies = {"monthly", "weekly", "custom"}
+
+def _add_months(start, months, day):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_dates(rule, first, last):
+    """Dates in [first, last] on which the rule is due."""
+    start = db_helper._to_date(rule["start_date"])
+    if rule["end_date"]:
+        last = min(last, db_helper._to_date(rule["end_date"]))
+    first = max(first, start)
+    if first > last:
+        return []
+
+    dates = []
+    if rule["frequency"] == "monthly":
+        months = (first.year - start.year) * 12 + first.month - start.month
+        current = _add_months(start, months, start.day)
+        while current <= last:
+            if current >= first:
+                dates.append(current)
+            months += 1
+            current = _add_months(start, months, start.day)
+    else:
+        step = 7 if rule["frequency"] == "weekly" else rule["interval_days"]
+        skipped = -(-(first - start).days // step)  # ceiling division
+        current = start + timedelta(days=skipped * step)
+        while current <= last:
+            dates.append(current)
+            current += timedelta(days=step)
+    return dates
+
+
+@log
+def create_rule(category: str, amount: float, notes: str, frequency: str, start_date,
+                end_date=None, interval_days: int = None):
+    category = categories.canonical(category)
+    if frequency not in frequencies:
+        raise ValueError(f"Invalid frequency: '{frequency}'. Must be one of: {', '.join(sorted(frequencies))}")
+    if frequency == "custom" and (not interval_days or interval_days < 1):
+        raise ValueError("Custom rules need interval_days of at least 1")
+    if amount <= 0:
+        raise ValueError("amount must be greater than 0")
+    if end_date and db_helper._to_date(end_date) < db_helper._to_date(start_date):
+        raise ValueError("end_date must not be before start_date")
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute(
+            "INSERT INTO recurring_rules (category, amount, notes, frequency, interval_days, start_date, end_date) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (category, amount, notes, frequency, interval_days if frequency == "custom" else None,
+             start_date, end_date)
+        )
+        return cursor.lastrowid
+
+
+@log
+def fetch_rules():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("SELECT * FROM recurring_rules ORDER BY id")
+        return cursor.fetchall()
+
+
+@log
+def delete_rule(rule_id: int):
+    """Stops a rule. Expenses it already created are kept. Returns False if the rule does not exist."""
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM recurring_occurrences WHERE rule_id = %s", (rule_id,))
+        cursor.execute("DELETE FROM recurring_rules WHERE id = %s", (rule_id,))
+        return cursor.rowcount > 0
+
+
+@log
+def materialize(until=None):
+    """
+    Create every occurrence that is due up to `until` (default: today) and not created yet.
+
+    Returns:
+        int: the number of expenses created.
+    """
+    until = db_helper._to_date(until) if until else date.today()
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("SELECT * FROM recurring_rules WHERE start_date <= %s FOR UPDATE", (until,))
+        rules = cursor.fetchall()
+
+        due = []
+        for rule in rules:
+            last = rule["last_materialized"]
+            first = db_helper._to_date(last) + timedelta(days=1) if last else db_helper._to_date(rule["start_date"])
+            due.extend((rule, occurrence) for occurrence in occurrence_dates(rule, first, until))
+
+        if due:
+            # Skip occurrences created by an earlier run that did not get to update last_materialized
+            rule_ids = sorted({rule["id"] for rule, _ in due})
+            cursor.execute(
+                f"SELECT rule_id, occurrence_date FROM recurring_occurrences "
+                f"WHERE rule_id IN ({', '.join(['%s'] * len(rule_ids))}) AND occurrence_date BETWEEN %s AND %s",
+                rule_ids + [min(o for _, o in due), until]
+            )
+            existing = {(row["rule_id"], db_helper._to_date(row["occurrence_date"])) for row in cursor.fetchall()}
+            due = [(rule, occurrence) for rule, occurrence in due if (rule["id"], occurrence) not in existing]
+
+        # Every rule is done up to `until` now, also when all of its due occurrences existed already,
+        # so the next run does not scan those dates again
+        behind = [(until, rule["id"]) for rule in rules
+                  if not rule["last_materialized"] or db_helper._to_date(rule["last_materialized"]) < until]
+        if behind:
+            cursor.executemany("UPDATE recurring_rules SET last_materialized = %s WHERE id = %s", behind)
+        if not due:
+            return 0
+
+        db_helper.insert_many(
+            cursor, "expenses", ("expense_date", "amount", "category_id", "notes"),
+            [(occurrence, rule["amount"], categories.require(rule["category"]), rule["notes"])
+             for rule, occurrence in due]
+        )
+        db_helper.insert_many(
+            cursor, "recurring_occurrences", ("rule_id", "occurrence_date"),
+            [(rule["id"], occurrence) for rule, occurrence in due]
+        )
+
+        changes = [db_helper._change("insert", occurrence, rule["amount"], rule["category"], rule["notes"])
+                   for rule, occurrence in due]
+        db_helper._apply_changes(cursor, changes)
+
+    db_helper._notify(changes)
+    logger.info(f"Materialized {len(changes)} recurring expenses up to {until}")
+    return len(changes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize due recurring expenses")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--until", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+    print(f"Created {materialize(args.until)} expenses")
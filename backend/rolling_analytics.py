@@ -0,0 +1,161 @@
+# Incrementally maintained time-series analytics: moving totals and month-over-month /
+# year-over-year deltas per category.
+#
+# Daily and monthly totals per category are loaded once with a single GROUP BY query (plus the
+# archived years) and then kept up to date by db_helper's write listener, so requests never re-scan
+# the expenses table. A moving-total series slides one window across the daily totals, adding the
+# day that enters and subtracting the day that leaves, so its cost depends on the window and series
+# length only, not on how much history exists. Month deltas are plain dictionary lookups.
+#
+# The load also reads the sequence number of the last change it contains (see change_feed.py): a
+# write committed before the load whose listener call only arrives after it is then not counted twice.
+
+import threading
+from datetime import date, timedelta
+
+import archive
+import categories
+import change_feed
+import db_helper
+import shared_cache
+
+ALL = "all"
+MAX_WINDOW = 366
+MAX_SERIES_DAYS = 731
+
+_lock = threading.Lock()
+_daily = None    # category key -> {date: total}
+_monthly = None  # (category key, year, month) -> total
+_sequence = 0    # sequence number of the last change the totals contain
+
+
+def _key(category):
+    return category.strip().lower()
+
+
+def _add(daily, monthly, expense_date, category, amount):
+    for key in (_key(category), ALL):
+        days = daily.setdefault(key, {})
+        days[expense_date] = days.get(expense_date, 0) + amount
+        month_key = (key, expense_date.year, expense_date.month)
+        monthly[month_key] = monthly.get(month_key, 0) + amount
+
+
+def _load():
+    daily, monthly = {}, {}
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute(
+            "SELECT s.last_sequence, e.expense_date, e.category_id, SUM(e.amount) AS total "
+            f"FROM {change_feed.LAST_SEQUENCE_JOIN} GROUP BY s.last_sequence, e.expense_date, e.category_id"
+        )
+        rows = cursor.fetchall()
+    for row in rows:
+        if row['category_id'] is not None:
+            _add(daily, monthly, db_helper._to_date(row['expense_date']), categories.name_of(row['category_id']),
+                 row['total'])
+
+    for year in archive.archived_years():
+        for expense_date, category, total in archive.daily_totals(year):
+            _add(daily, monthly, expense_date, category, total)
+    return daily, monthly, rows[0]['last_sequence']
+
+
+def _state():
+    global _daily, _monthly, _sequence
+    if _daily is None:
+        with _lock:
+            if _daily is None:
+                _daily, _monthly, _sequence = _load()
+    return _daily, _monthly
+
+
+# Write listener: apply committed inserts and deletes to the running totals.
+# Nothing is done before the state is first loaded, the load will see those rows anyway; changes
+# the load already saw are skipped.
+def record_changes(changes):
+    if any(change["op"] == "move" for change in changes):
+        # Rows moved to or from the archive, see db_helper.add_write_listener
+        invalidate()
+        return
+    with _lock:
+        if _daily is None:
+            return
+        for change in changes:
+            if change["sequence"] <= _sequence:
+                continue
+            amount = change["amount"] if change["op"] == "insert" else -change["amount"]
+            _add(_daily, _monthly, change["expense_date"], change["category"], amount)
+
+
+# Drop the state, it is reloaded on the next request
+def invalidate():
+    global _daily, _monthly
+    with _lock:
+        _daily, _monthly = None, None
+
+
+def moving_totals(end_date, days=30, windows=(7, 30, 90), category=ALL):
+    """
+    Moving totals for every day of the `days`-long series ending on end_date.
+
+    Returns:
+        List[dict]: one {"date": ..., "7d": total, "30d": total, ...} entry per day, oldest first.
+    """
+    if not 1 <= days <= MAX_SERIES_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_SERIES_DAYS}")
+    for window in windows:
+        if not 1 <= window <= MAX_WINDOW:
+            raise ValueError(f"Windows must be between 1 and {MAX_WINDOW} days")
+
+    categories.require(category, allow_all=True)
+
+    daily, _ = _state()
+    totals = daily.get(_key(category), {})
+    series_start = end_date - timedelta(days=days - 1)
+    series = [{"date": series_start + timedelta(days=i)} for i in range(days)]
+
+    for window in windows:
+        label = f"{window}d"
+        running = sum(totals.get(series_start - timedelta(days=i), 0) for i in range(window))
+        series[0][label] = running
+        for i in range(1, days):
+            day = series_start + timedelta(days=i)
+            running += totals.get(day, 0) - totals.get(day - timedelta(days=window), 0)
+            series[i][label] = running
+
+    return series
+
+
+def _delta(current, previous):
+    return {
+        "previous": previous,
+        "delta": current - previous,
+        "percent": (current - previous) / previous * 100 if previous else None,
+    }
+
+
+def month_deltas(year, month):
+    """
+    Month-over-month and year-over-year change of every category's total for the given month.
+
+    Returns:
+        dict: category -> {"total": ..., "month_over_month": {...}, "year_over_year": {...}}
+    """
+    if not 1 <= month <= 12:
+        raise ValueError("month must be between 1 and 12")
+
+    daily, monthly = _state()
+    previous_month = (year, month - 1) if month > 1 else (year - 1, 12)
+    result = {}
+    for key in sorted(daily, key=lambda k: (k == ALL, k)):
+        current = monthly.get((key, year, month), 0)
+        result[key.title()] = {
+            "total": current,
+            "month_over_month": _delta(current, monthly.get((key, *previous_month), 0)),
+            "year_over_year": _delta(current, monthly.get((key, year - 1, month), 0)),
+        }
+    return result
+
+
+db_helper.add_write_listener(record_changes)
+shared_cache.register(invalidate)
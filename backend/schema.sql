@@ -0,0 +1,104 @@
+-- Schema for the expense_manager database (MySQL dialect).
+-- local_db.py translates these statements when the SQLite stand-in is used.
+-- The expenses table can be converted to yearly partitions with partition_expenses.py.
+
+-- Category dimension (see categories.py); expenses reference it by its small integer id.
+-- Databases created before it existed are converted with migrate_categories.py.
+CREATE TABLE IF NOT EXISTS categories (
+    id SMALLINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(64) NOT NULL UNIQUE
+);
+
+INSERT IGNORE INTO categories (id, name) VALUES
+    (1, 'Food'), (2, 'Utilities'), (3, 'Housing'), (4, 'Transportation'), (5, 'Insurance'),
+    (6, 'Medical'), (7, 'Debt Payment'), (8, 'Entertainment'), (9, 'Misc'), (10, 'Shopping');
+
+-- partition_expenses.py drops the foreign key: MySQL does not support foreign keys on partitioned tables
+CREATE TABLE IF NOT EXISTS expenses (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    expense_date DATE NOT NULL,
+    amount FLOAT NOT NULL,
+    category_id SMALLINT NOT NULL,
+    notes TEXT,
+    CONSTRAINT fk_expenses_category FOREIGN KEY (category_id) REFERENCES categories (id)
+);
+
+CREATE INDEX idx_expenses_expense_date ON expenses (expense_date);
+CREATE INDEX idx_expenses_category_date ON expenses (category_id, expense_date);
+
+-- Monthly budgets per category (category is stored lower-case).
+-- Amounts are DOUBLE: a single-precision running total drifts after many writes. Databases created
+-- with FLOAT columns are converted with:
+--   ALTER TABLE budgets MODIFY monthly_limit DOUBLE NOT NULL, MODIFY alert_threshold DOUBLE NOT NULL DEFAULT 0.8;
+--   ALTER TABLE budget_month_totals MODIFY spent DOUBLE NOT NULL DEFAULT 0;
+--   ALTER TABLE budget_alerts MODIFY spent DOUBLE NOT NULL, MODIFY monthly_limit DOUBLE NOT NULL;
+-- followed by `python budgets.py rebuild`.
+CREATE TABLE IF NOT EXISTS budgets (
+    category VARCHAR(255) NOT NULL PRIMARY KEY,
+    monthly_limit DOUBLE NOT NULL,
+    alert_threshold DOUBLE NOT NULL DEFAULT 0.8
+);
+
+-- Running month-to-date totals per category, updated by every write in db_helper
+CREATE TABLE IF NOT EXISTS budget_month_totals (
+    category VARCHAR(255) NOT NULL,
+    month_start DATE NOT NULL,
+    spent DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, month_start)
+);
+
+-- Threshold crossings detected at write time
+CREATE TABLE IF NOT EXISTS budget_alerts (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    category VARCHAR(255) NOT NULL,
+    month_start DATE NOT NULL,
+    level VARCHAR(16) NOT NULL,
+    spent DOUBLE NOT NULL,
+    monthly_limit DOUBLE NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Recurring expense definitions, materialized into expenses by recurring.py
+CREATE TABLE IF NOT EXISTS recurring_rules (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    category VARCHAR(255) NOT NULL,
+    amount FLOAT NOT NULL,
+    notes TEXT NOT NULL,
+    frequency VARCHAR(16) NOT NULL,
+    interval_days INT,
+    start_date DATE NOT NULL,
+    end_date DATE,
+    last_materialized DATE
+);
+
+-- One row per materialized occurrence; the primary key makes every scheduler run idempotent
+CREATE TABLE IF NOT EXISTS recurring_occurrences (
+    rule_id INT NOT NULL,
+    occurrence_date DATE NOT NULL,
+    PRIMARY KEY (rule_id, occurrence_date)
+);
+
+-- Last journal sequence number committed by the write-behind ingest buffer (ingest_buffer.py)
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    journal VARCHAR(255) NOT NULL PRIMARY KEY,
+    last_sequence BIGINT NOT NULL
+);
+
+-- Append-only change log of the expenses table, for incremental sync (change_feed.py)
+CREATE TABLE IF NOT EXISTS expense_changes (
+    sequence BIGINT NOT NULL PRIMARY KEY,
+    op VARCHAR(8) NOT NULL,
+    expense_date DATE NOT NULL,
+    amount FLOAT NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    notes TEXT,
+    changed_at DATETIME NOT NULL
+);
+
+-- Last sequence number of expense_changes; writers lock this row until they commit
+CREATE TABLE IF NOT EXISTS change_sequence (
+    id TINYINT NOT NULL PRIMARY KEY,
+    last_sequence BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO change_sequence (id, last_sequence) VALUES (1, 0);
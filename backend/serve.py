@@ -0,0 +1,41 @@
+# Production serving mode: several uvicorn worker processes sharing one cache (see shared_cache.py).
+#
+# Each worker is a separate process, so CPU-bound request work (JSON encoding, Pydantic validation,
+# analytics in Python) runs on all cores instead of one. The shared cache directory is emptied on
+# start, because the data may have changed while the server was down.
+#
+# Usage (from the backend directory):
+#   python serve.py --workers 4 --port 8000
+
+import argparse
+import glob
+import os
+import tempfile
+
+import uvicorn
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "expense_manager_shared_cache")
+
+
+def serve(workers, host="127.0.0.1", port=8000, log_level="info"):
+    # One write-behind journal cannot be shared by several processes
+    if workers > 1 and os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes"):
+        raise SystemExit("WRITE_BEHIND cannot be used with more than one worker")
+
+    cache_dir = os.environ.setdefault("SHARED_CACHE_DIR", DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in ("data_version", "results.sqlite3*"):
+        for path in glob.glob(os.path.join(cache_dir, name)):
+            os.remove(path)
+
+    uvicorn.run("backend_server:app", host=host, port=port, workers=workers, log_level=log_level)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the backend with several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port, args.log_level)
@@ -0,0 +1,223 @@
+# State shared by the worker processes of the multi-worker serving mode (see serve.py).
+#
+# With uvicorn --workers N every process has its own memory, so the in-memory state of a worker
+# (running totals, anomaly statistics, the category registry) would not see the writes made by
+# the others, and every worker would compute the same analytics results again. With
+# SHARED_CACHE_DIR set, the workers share two things in that directory:
+# - the data version, an 8-byte counter in a memory-mapped file that every committed write
+#   increments. Before a request is served, sync() compares it with the version the worker saw
+#   last; if another worker has written in between, the registered in-memory state is dropped
+#   and reloaded on its next use. The same file holds the time of the last write of any worker,
+#   so the read stickiness after a write (READ_STICKINESS_SECONDS, see db_helper) holds across
+#   workers too.
+# - analytics results of the functions decorated with `cached`, in a SQLite file keyed by the call
+#   and the data version, so a result computed by one worker is reused by all of them until the
+#   next write. Results of older versions are never read again and are pruned as new ones arrive.
+#
+# Without SHARED_CACHE_DIR everything here is a no-op.
+
+import fcntl
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+from functools import wraps
+
+import single_flight
+
+MAX_ENTRIES = 10_000
+SEGMENT_SIZE = 16  # data version (unsigned 64-bit), then the last write time (double)
+PRUNE_EVERY = 100
+
+_lock = threading.Lock()
+_segment = None        # (file descriptor, mmap) of the data version and the last write time
+_seen_version = None   # data version this worker's in-memory state reflects
+_invalidators = []
+_local = threading.local()  # per-thread connection to the results file
+_stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+
+def directory():
+    return os.getenv("SHARED_CACHE_DIR", "")
+
+
+def enabled():
+    return bool(directory())
+
+
+def _open_segment():
+    global _segment
+    if _segment is None:
+        with _lock:
+            if _segment is None:
+                os.makedirs(directory(), exist_ok=True)
+                fd = os.open(os.path.join(directory(), "data_version"), os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fd).st_size < SEGMENT_SIZE:
+                        os.ftruncate(fd, SEGMENT_SIZE)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                _segment = (fd, mmap.mmap(fd, SEGMENT_SIZE))
+    return _segment
+
+
+# Run operation(segment) under the file lock. The file lock keeps other processes out, _lock the
+# other threads of this one: they share the file descriptor, and with it the file lock, so a
+# thread unlocking it would also release the lock another thread holds.
+def _locked(operation, exclusive):
+    fd, segment = _open_segment()
+    with _lock:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            return operation(segment)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def data_version():
+    """Number of writes committed by all workers (since the serving mode started)."""
+    return _locked(lambda segment: struct.unpack_from("<Q", segment)[0], exclusive=False)
+
+
+def _increment_version(segment):
+    version = struct.unpack_from("<Q", segment)[0] + 1
+    struct.pack_into("<Q", segment, 0, version)
+    return version
+
+
+def _increment():
+    return _locked(_increment_version, exclusive=True)
+
+
+def note_write(monotonic_time):
+    """Record that this worker committed a write at time.monotonic() `monotonic_time`."""
+    if enabled():
+        # CLOCK_MONOTONIC is system-wide, so the times of all workers compare
+        _locked(lambda segment: struct.pack_into("<d", segment, 8, max(
+            monotonic_time, struct.unpack_from("<d", segment, 8)[0])), exclusive=True)
+
+
+def last_write():
+    """time.monotonic() of the last write committed by any worker (-inf if unknown)."""
+    if not enabled():
+        return float("-inf")
+    return _locked(lambda segment: struct.unpack_from("<d", segment, 8)[0], exclusive=False) or float("-inf")
+
+
+def register(invalidate):
+    """Call invalidate() whenever another worker has written (the caller's state is then stale)."""
+    _invalidators.append(invalidate)
+
+
+def sync():
+    """Drop the registered in-memory state if another worker has written since this one last looked."""
+    global _seen_version
+    if not enabled():
+        return
+    version = data_version()
+    with _lock:
+        if version == _seen_version:
+            return
+        _seen_version = version
+        _stats["invalidations"] += 1
+    for invalidate in _invalidators:
+        invalidate()
+
+
+# Write listener (registered by db_helper): tell the other workers about the write. The write
+# listeners of this worker have applied it to its own state, so that state stays valid unless
+# another worker has written as well.
+def record_write(changes):
+    global _seen_version
+    if not enabled():
+        return
+    version = _increment()
+    with _lock:
+        if _seen_version is not None and version == _seen_version + 1:
+            _seen_version = version
+            return
+    sync()
+
+
+def _connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        os.makedirs(directory(), exist_ok=True)
+        connection = sqlite3.connect(os.path.join(directory(), "results.sqlite3"), timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL)"
+        )
+        _local.connection = connection
+    return connection
+
+
+def _store(key, version, result):
+    connection = _connection()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO results (key, version, value) VALUES (?, ?, ?)",
+            (key, version, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+    with _lock:
+        _stats["stores"] += 1
+        prune = _stats["stores"] % PRUNE_EVERY == 0
+    if prune:
+        with connection:
+            connection.execute("DELETE FROM results WHERE version < ?", (data_version(),))
+            connection.execute(
+                "DELETE FROM results WHERE rowid IN "
+                "(SELECT rowid FROM results ORDER BY rowid DESC LIMIT -1 OFFSET ?)", (MAX_ENTRIES,)
+            )
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def cached(func):
+    """Decorator: share the results of func between the workers until the next write."""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+
+        version = data_version()
+        key = repr((name, single_flight._freeze(args), single_flight._freeze(kwargs)))
+        row = _connection().execute(
+            "SELECT value FROM results WHERE key = ? AND version = ?", (key, version)
+        ).fetchone()
+        if row is not None:
+            _count("hits")
+            return pickle.loads(row[0])
+
+        _count("misses")
+        result = func(*args, **kwargs)
+        # A write during the call may or may not be in the result; it then belongs to no version
+        if data_version() == version:
+            _store(key, version, result)
+        return result
+
+    return wrapper
+
+
+def stats():
+    if not enabled():
+        return {"enabled": False}
+    with _lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        "enabled": True,
+        "data_version": data_version(),
+        "worker_pid": os.getpid(),
+        **counters,
+        "hit_ratio": counters["hits"] / lookups if lookups else None,
+    }
@@ -0,0 +1,84 @@
+# Request coalescing ("single flight") for the analytics queries.
+#
+# When a call arrives while an identical one (same function and arguments) is already running, it
+# waits for the running call and receives the same result instead of sending the same query to the
+# database again. Only calls that overlap in time are coalesced; nothing is cached afterwards.
+# Every committed write bumps a generation number that is part of the key, so a call that starts
+# after a write never joins a query that started before it.
+#
+# Coalesced callers share one result object, so results must be treated as read-only.
+
+import threading
+from functools import wraps
+
+_lock = threading.Lock()
+_in_flight = {}  # key -> _Call
+_generation = 0
+_stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Hashable form of the arguments (lists of categories or months become tuples)
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def coalesce(func):
+    """Decorator: concurrent identical calls of func share one execution."""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            key = (name, _freeze(args), _freeze(kwargs), _generation)
+            _stats["calls"] += 1
+            call = _in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _in_flight[key] = _Call()
+                _stats["executed"] += 1
+            else:
+                _stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with _lock:
+                del _in_flight[key]
+            call.done.set()
+
+    return wrapper
+
+
+# Write listener (registered by db_helper): calls after this point start new flights
+def record_write(changes):
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def stats():
+    with _lock:
+        return {**_stats, "in_flight": len(_in_flight)}
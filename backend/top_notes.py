@@ -0,0 +1,136 @@
+# Top-N notes ("what are my 20 biggest recurring expenses this year") by total amount and by count.
+#
+# Notes are normalized before they are counted: case and surrounding / repeated whitespace are
+# ignored, and a leading month name is dropped, so "August Grocery shopping" and "grocery shopping"
+# are the same note. The database groups the rows by their lower-case note, and the groups are
+# streamed (STREAM_BATCH at a time) into two Space-Saving summaries, one ranked by total and one
+# by count. Each keeps at most `capacity` notes, so memory stays bounded for any date range. As
+# long as a range has no more distinct notes than that, the result is exact; otherwise the least
+# frequent notes are evicted, the result is marked approximate, and every entry carries the most
+# its ranked value may be overestimated by (max_error).
+
+import calendar
+import heapq
+import re
+
+import archive
+import categories
+import db_helper
+import shared_cache
+import single_flight
+from logging_setup import setup_logger, log_function_call
+
+logger = setup_logger(name='top_notes', log_file='backend_server_logs.log')
+log = log_function_call(logger)
+
+MAX_LIMIT = 100
+MIN_CAPACITY = 1000
+CAPACITY_PER_RESULT = 20
+STREAM_BATCH = 10_000
+
+# A full month name followed by whitespace or a separator; abbreviations ("mar", "may", "dec") are
+# too often the start of a real note ("May's birthday gift")
+_MONTH_PREFIX = re.compile(
+    r"^(?:" + "|".join(name.lower() for name in calendar.month_name[1:]) + r")(?:\s*[-:,/]\s*|\s+)"
+)
+
+TOTALS_QUERY = '''
+    SELECT LOWER(TRIM(notes)) AS note, SUM(amount) AS total, COUNT(*) AS count
+    FROM expenses
+    WHERE expense_date >= %s AND expense_date <= %s{category_filter}
+    GROUP BY LOWER(TRIM(notes))
+'''
+
+
+def normalize(note):
+    """Lower-case note with whitespace collapsed and a leading month name removed."""
+    note = " ".join(note.lower().split())
+    return _MONTH_PREFIX.sub("", note, count=1) or note
+
+
+class _SpaceSaving:
+    """Bounded summary of the `capacity` heaviest notes, ranked by total (rank=0) or count (rank=1)."""
+
+    def __init__(self, capacity, rank):
+        self.capacity = capacity
+        self.rank = rank
+        self.entries = {}  # note -> [total, count, max_error]
+        self.evictions = 0
+        self._heap = []    # (ranked value, note), may hold outdated values
+
+    def add(self, note, total, count):
+        entry = self.entries.get(note)
+        if entry is None:
+            error = self._evict() if len(self.entries) >= self.capacity else 0
+            # A note that replaces an evicted one inherits its ranked value as possible overestimate
+            entry = self.entries[note] = [0, 0, error]
+            entry[self.rank] = error
+        entry[0] += total
+        entry[1] += count
+        heapq.heappush(self._heap, (entry[self.rank], note))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(entry[self.rank], note) for note, entry in self.entries.items()]
+            heapq.heapify(self._heap)
+
+    # Drop the note with the smallest ranked value and return that value
+    def _evict(self):
+        while True:
+            value, note = heapq.heappop(self._heap)
+            entry = self.entries.get(note)
+            if entry is not None and entry[self.rank] == value:
+                del self.entries[note]
+                self.evictions += 1
+                return value
+
+    def top(self, limit):
+        ranked = sorted(self.entries.items(), key=lambda item: (-item[1][self.rank], item[0]))[:limit]
+        return [{"note": note, "total": total, "count": count, "max_error": error}
+                for note, (total, count, error) in ranked]
+
+
+def _groups(start_date, end_date, category_id):
+    query = TOTALS_QUERY.format(category_filter="" if category_id is None else " AND category_id = %s")
+    params = (start_date, end_date) if category_id is None else (start_date, end_date, category_id)
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH)
+            if not rows:
+                break
+            for row in rows:
+                yield row["note"] or "", float(row["total"]), int(row["count"])
+
+
+@log
+@shared_cache.cached
+@single_flight.coalesce
+def top_notes(start_date, end_date, category="all", limit=20):
+    """
+    The `limit` notes with the highest total amount and the most expenses in the inclusive date range.
+
+    Returns:
+        dict: {"by_total": [...], "by_count": [...], "approximate": bool}, each entry being
+              {"note", "total", "count", "max_error"}.
+    """
+    if start_date > end_date:
+        raise ValueError("start_date must not be after end_date")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    category_id = categories.require(category, allow_all=True)
+
+    capacity = max(MIN_CAPACITY, CAPACITY_PER_RESULT * limit)
+    by_total, by_count = _SpaceSaving(capacity, rank=0), _SpaceSaving(capacity, rank=1)
+    archived = archive.note_totals(
+        start_date, end_date, None if category_id is None else [categories.name_of(category_id).lower()]
+    )
+    for groups in (_groups(start_date, end_date, category_id), archived):
+        for note, total, count in groups:
+            note = normalize(note)
+            by_total.add(note, total, count)
+            by_count.add(note, total, count)
+
+    return {
+        "by_total": by_total.top(limit),
+        "by_count": by_count.top(limit),
+        "approximate": bool(by_total.evictions or by_count.evictions),
+    }
@@ -0,0 +1,280 @@
+# Lightweight request tracing, from the Streamlit frontend through FastAPI down to SQL.
+#
+# With TRACING=true, every request becomes a trace of timed spans:
+# - "http": the whole request in the server, admission queueing included (tracing middleware),
+# - "endpoint": the route function, "serialize": validation of its response by the response model
+#   (TracedRoute),
+# - "db.execute" / "db.fetch": every statement sent through get_db_cursor or run_prepared.
+# The frontend starts the trace: it sends a W3C `traceparent` header with every API call and
+# reports its own spans (the HTTP call as the browser side sees it, DataFrame building, rendering)
+# to POST /traces, so all phases of a tab render share one trace id. Spans of a request are
+# children of the span that was current when they started; the current span is a context
+# variable, so it follows the request into the threadpool.
+#
+# Finished spans go to an in-memory ring buffer (the last TRACE_BUFFER_SPANS, default 10000) that
+# GET /traces and GET /traces/{trace_id} show, and with TRACE_FILE set are also appended to that
+# file as JSON lines (which also collects the spans of all worker processes).
+
+import asyncio
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import profiling
+
+_current = contextvars.ContextVar("trace_span", default=None)  # (trace id, span id) or None
+_lock = threading.Lock()
+_buffer = None
+_file = None
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Phases of a trace for summary(): backend span name -> phase
+PHASES = {
+    "http": "server",
+    "endpoint": "endpoint",
+    "serialize": "serialize",
+    "db.execute": "database",
+    "db.fetch": "database",
+}
+
+
+def enabled():
+    return os.getenv("TRACING", "false").lower() in ("1", "true", "yes")
+
+
+def _ring():
+    global _buffer
+    if _buffer is None:
+        with _lock:
+            if _buffer is None:
+                _buffer = deque(maxlen=int(os.getenv("TRACE_BUFFER_SPANS", "10000")))
+    return _buffer
+
+
+def _new_id(length):
+    return os.urandom(length // 2).hex()
+
+
+def parse_traceparent(header):
+    """(trace id, parent span id) of a W3C traceparent header, or None if it is missing or invalid."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    return (match.group(1), match.group(2)) if match else None
+
+
+def current_trace_id():
+    current = _current.get()
+    return current[0] if current else None
+
+
+def export(spans):
+    """Store finished spans in the ring buffer and the trace file."""
+    global _file
+    ring = _ring()
+    path = os.getenv("TRACE_FILE", "")
+    with _lock:
+        ring.extend(spans)
+        if path:
+            if _file is None or _file.name != path:
+                _file = open(path, "a", buffering=1)
+            for span in spans:
+                _file.write(json.dumps(span, default=str) + "\n")
+
+
+@contextmanager
+def span(name, traceparent=None, service="backend", **attributes):
+    """
+    Time the block as a span named `name`, a child of the current span.
+
+    Without a current span, it starts a trace: continuing the caller's trace of `traceparent`,
+    or a new one. Yields the span's attributes dict (to add to), or None when tracing is off.
+    """
+    parent = _current.get()
+    if parent is None:
+        if not enabled():
+            yield None
+            return
+        parent = parse_traceparent(traceparent) or (_new_id(32), None)
+    trace_id, parent_id = parent
+    span_id = _new_id(16)
+    token = _current.set((trace_id, span_id))
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current.reset(token)
+        export([{
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "service": service,
+            "start": started,
+            "duration_ms": duration * 1000,
+            "attributes": attributes,
+        }])
+
+
+def active():
+    """True inside a traced request (for hot paths that only time themselves then)."""
+    return _current.get() is not None
+
+
+def _traced(func, name):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _traced_async(func, name):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return await func(*args, **kwargs)
+        with span(name):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+class TracedRoute(profiling.ProfiledRoute):
+    """Route whose endpoint and response validation are spans of their request's trace."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        # The request handler was built above and looks both up on every call
+        call = self.dependant.call
+        self.dependant.call = (_traced_async if asyncio.iscoroutinefunction(call) else _traced)(call, "endpoint")
+        if self.secure_cloned_response_field is not None:
+            field = self.secure_cloned_response_field
+            field.validate = _traced(field.validate, "serialize")
+
+
+class TracedCursor:
+    """Cursor wrapper that times execute / fetch calls as spans; anything else is passed through."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, *args, **kwargs):
+        with span("db.execute", statement=_statement(operation)):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, seq_params):
+        with span("db.execute", statement=_statement(operation), many=True):
+            return self._cursor.executemany(operation, seq_params)
+
+    def fetchall(self):
+        with span("db.fetch") as attributes:
+            rows = self._cursor.fetchall()
+            attributes["rows"] = len(rows)
+            return rows
+
+    def fetchone(self):
+        with span("db.fetch"):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        with span("db.fetch") as attributes:
+            rows = self._cursor.fetchmany(size)
+            attributes["rows"] = len(rows)
+            return rows
+
+
+# Spans reported by the frontend (POST /traces)
+MAX_REPORTED_SPANS = 1000
+_SPAN_ID = re.compile(r"^[0-9a-f]{16}$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def record_reported(spans):
+    """Store spans reported by the frontend; raises ValueError for malformed ids."""
+    if len(spans) > MAX_REPORTED_SPANS:
+        raise ValueError(f"At most {MAX_REPORTED_SPANS} spans can be reported at once")
+    for item in spans:
+        if not _TRACE_ID.match(item["trace_id"]) or not _SPAN_ID.match(item["span_id"]) or (
+                item["parent_id"] is not None and not _SPAN_ID.match(item["parent_id"])):
+            raise ValueError("trace_id must be 32 and span ids 16 lower-case hex digits")
+    export([{**item, "service": "frontend"} for item in spans])
+
+
+def _statement(operation, limit=200):
+    text = " ".join(str(operation).split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def recent(limit=20):
+    """The last `limit` traces, newest first: their id, root span, start, duration and span count."""
+    ring = _ring()  # before taking _lock, which _ring() takes itself to create the buffer
+    with _lock:
+        spans = list(ring)
+    traces = {}
+    for item in spans:
+        trace = traces.setdefault(item["trace_id"], {"trace_id": item["trace_id"], "spans": 0, "root": None})
+        trace["spans"] += 1
+        if trace["root"] is None or item["start"] < trace["root"]["start"]:
+            trace["root"] = item
+    ordered = sorted(traces.values(), key=lambda trace: trace["root"]["start"], reverse=True)[:limit]
+    return [{
+        "trace_id": trace["trace_id"],
+        "name": trace["root"]["name"],
+        "service": trace["root"]["service"],
+        "start": trace["root"]["start"],
+        "duration_ms": trace["root"]["duration_ms"],
+        "spans": trace["spans"],
+    } for trace in ordered]
+
+
+def _phase(item):
+    if item["service"] != "backend":
+        return "network" if item["name"].startswith("HTTP ") else "frontend"
+    return PHASES.get(item["name"], "server")
+
+
+def summary(trace_id):
+    """
+    The spans of a trace (in start order) and the time spent per phase.
+
+    Each span's own time (its duration minus that of its child spans) counts for its phase:
+    "frontend" (frontend work such as building DataFrames and rendering), "network" (the frontend's
+    HTTP calls, minus the time the server had them), "server" (middleware, admission queueing,
+    routing and request validation), "endpoint" (the route functions, minus their SQL), "serialize"
+    (response validation) and "database".
+
+    Returns:
+        dict: {"trace_id", "spans": [...], "phases_ms": {...}}, or None for an unknown trace.
+    """
+    ring = _ring()
+    with _lock:
+        spans = sorted((item for item in ring if item["trace_id"] == trace_id), key=lambda item: item["start"])
+    if not spans:
+        return None
+
+    children = {}
+    for item in spans:
+        if item["parent_id"] is not None:
+            children[item["parent_id"]] = children.get(item["parent_id"], 0.0) + item["duration_ms"]
+    phases = dict.fromkeys(("frontend", "network", "server", "endpoint", "serialize", "database"), 0.0)
+    for item in spans:
+        phases[_phase(item)] += max(item["duration_ms"] - children.get(item["span_id"], 0.0), 0.0)
+    return {"trace_id": trace_id, "spans": spans, "phases_ms": phases}
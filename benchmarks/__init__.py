@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (they are run from the backend
+# directory by uvicorn), so the benchmarks need that directory on sys.path as well.
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
@@ -0,0 +1,85 @@
+"""
+Before/after benchmark for fetch_monthly_expenses on a multi-year data set.
+
+"before" is the original query shape, which filters on YEAR(expense_date) and therefore scans every
+row (and every partition). "after" is db_helper.fetch_monthly_expenses, which filters on a bare
+expense_date range so the index and partition pruning apply.
+
+Usage (from the project root):
+    python -m benchmarks.bench_partitioning --size 1m
+    # on MySQL, run once before and once after `python partition_expenses.py migrate`:
+    python -m benchmarks.bench_partitioning --engine mysql --size 1m --label unpartitioned
+    python -m benchmarks.bench_partitioning --engine mysql --size 1m --label partitioned
+"""
+import argparse
+import json
+import sys
+
+from benchmarks import seed_data
+from benchmarks.run_benchmarks import time_call
+import db_helper
+
+LEGACY_QUERY = '''
+    SELECT
+        MONTHNAME(expense_date) AS month_name,
+        SUM(amount) AS total_amount
+    FROM
+        expenses
+    WHERE
+        YEAR(expense_date) = %s
+    GROUP BY
+        MONTH(expense_date), MONTHNAME(expense_date)
+    ORDER BY
+        MONTH(expense_date);
+'''
+
+
+def legacy_monthly_expenses(year):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(LEGACY_QUERY, (year,))
+        return cursor.fetchall()
+
+
+# Partitions MySQL reads for the new query shape (EXPLAIN's partitions column)
+def explain_partitions(year):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            "EXPLAIN SELECT SUM(amount) FROM expenses WHERE expense_date >= %s AND expense_date < %s",
+            db_helper.year_bounds(year)
+        )
+        return [row.get("partitions") for row in cursor.fetchall()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark year-scoped monthly analytics")
+    parser.add_argument("--size", default="1m", choices=list(seed_data.SIZES))
+    parser.add_argument("--engine", default="sqlite", choices=["sqlite", "mysql"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    seed_data.use_database(args.size, args.engine)
+    seed_data.seed(seed_data.SIZES[args.size])
+
+    first_year, last_year = seed_data.SEED_YEARS
+    results = {"label": args.label, "engine": args.engine, "size": args.size, "years": {}}
+    for year in range(first_year, last_year + 1):
+        before = time_call(lambda: legacy_monthly_expenses(year), args.repeats)
+        after = time_call(lambda: db_helper.fetch_monthly_expenses(year, "all"), args.repeats)
+        results["years"][year] = {"before": before, "after": after}
+        if args.engine == "mysql":
+            results["years"][year]["partitions_read"] = explain_partitions(year)
+        print(f"{year}: YEAR() filter {before['median_ms']:9.2f} ms -> "
+              f"date range {after['median_ms']:9.2f} ms", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
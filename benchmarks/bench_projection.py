@@ -0,0 +1,93 @@
+"""
+Before/after benchmark for reading big result sets with and without a column projection.
+
+"before" reads every column through a dictionary cursor and builds one dict per row, as all the
+expense reads used to (db_helper's read functions without `columns`). "after" selects only the
+fields of an API response through a tuple cursor and builds compact ExpenseRows (columns=API_COLUMNS).
+Both are timed for the read alone and for the read plus JSON serialization through the Expense
+response model, and the peak memory of the read is measured with tracemalloc.
+
+Usage (from the project root):
+    python -m benchmarks.bench_projection --size 1m
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from datetime import date
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmarks import seed_data
+from benchmarks.run_benchmarks import time_call
+import db_helper
+from backend_server import Expense
+
+EXPENSES = TypeAdapter(List[Expense])
+
+VARIANTS = {
+    "before": None,
+    "after": db_helper.API_COLUMNS,
+}
+
+
+def read(start_date, end_date, columns):
+    return db_helper.export_expenses(start_date, end_date, columns=columns)
+
+
+# As FastAPI does for a response_model: validate (rows by attribute) and dump to JSON
+def read_and_serialize(start_date, end_date, columns):
+    return EXPENSES.dump_json(EXPENSES.validate_python(read(start_date, end_date, columns), from_attributes=True))
+
+
+def peak_memory(start_date, end_date, columns):
+    tracemalloc.start()
+    try:
+        rows = read(start_date, end_date, columns)
+        return len(rows), tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark projected reads with compact rows")
+    parser.add_argument("--size", default="1m", choices=list(seed_data.SIZES))
+    parser.add_argument("--engine", default="sqlite", choices=["sqlite", "mysql"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    seed_data.use_database(args.size, args.engine)
+    seed_data.seed(seed_data.SIZES[args.size])
+
+    first_year, last_year = seed_data.SEED_YEARS
+    start_date, end_date = date(first_year, 1, 1), date(last_year, 12, 31)
+    results = {"engine": args.engine, "size": args.size, "variants": {}}
+    for name, columns in VARIANTS.items():
+        rows, peak = peak_memory(start_date, end_date, columns)
+        results["variants"][name] = {
+            "columns": list(columns or db_helper.EXPENSE_FIELDS),
+            "rows": rows,
+            "read": time_call(lambda: read(start_date, end_date, columns), args.repeats),
+            "read_and_serialize": time_call(lambda: read_and_serialize(start_date, end_date, columns), args.repeats),
+            "peak_bytes_per_row": peak / rows if rows else None,
+        }
+
+    before, after = results["variants"]["before"], results["variants"]["after"]
+    for step in ("read", "read_and_serialize"):
+        print(f"{step:<20} dict rows {before[step]['median_ms']:10.2f} ms -> "
+              f"projected rows {after[step]['median_ms']:10.2f} ms", file=sys.stderr)
+    print(f"{'peak memory per row':<20} dict rows {before['peak_bytes_per_row']:10.0f} B  -> "
+          f"projected rows {after['peak_bytes_per_row']:10.0f} B", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Async HTTP load generator for the FastAPI backend.
+
+Replays a weighted mix of the endpoints the Streamlit tabs call (per-date fetch, monthly analytics,
+date-range analytics, note search and update batches) while ramping the number of concurrent
+virtual users, and reports throughput, error rate and latency percentiles for every stage.
+
+Usage (from the project root):
+    # start a local uvicorn instance on the SQLite stand-in, seeded with the 10k data set
+    python -m benchmarks.load_generator --start-server --size 10k --concurrency 1 4 16 64
+
+    # or target an already running backend
+    python -m benchmarks.load_generator --url http://localhost:8000 --concurrency 8 32
+
+    # scaling across cores: the same ramp against 1, 2 and 4 worker processes (backend/serve.py)
+    python -m benchmarks.load_generator --start-server --workers 1 2 4 --concurrency 16 64
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+from benchmarks import seed_data
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# Writes go to dates outside the seeded range so they never change the analytics being measured
+WRITE_YEAR = 2031
+
+# Relative weight of every operation in the mix
+DEFAULT_MIX = {
+    "fetch_date": 40,
+    "monthly_analytics": 15,
+    "date_range_analytics": 15,
+    "note_search": 15,
+    "update_batch": 15,
+}
+
+NOTE_TERMS = ["bill", "rent", "insurance", "grocery", "loan", "tickets", "shopping", "emi"]
+CATEGORIES = ["all", "Food", "Shopping", "Utilities", "Food, Shopping", "Housing, Insurance"]
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class VirtualUser:
+    def __init__(self, user_id, client, rng):
+        self.user_id = user_id
+        self.client = client
+        self.rng = rng
+        self.write_date = date(WRITE_YEAR, 1, 1) + timedelta(days=user_id % 365)
+        self.counter = itertools.count()
+        self.last_added = None
+
+    def _random_date(self):
+        first, last = seed_data.SEED_YEARS
+        start = date(first, 1, 1)
+        return start + timedelta(days=self.rng.randrange((date(last, 12, 31) - start).days + 1))
+
+    async def fetch_date(self):
+        return await self.client.get(f"/expenses/{self._random_date().isoformat()}")
+
+    async def monthly_analytics(self):
+        payload = {"year": self.rng.randint(*seed_data.SEED_YEARS), "category": self.rng.choice(CATEGORIES)}
+        return await self.client.post("/analytics/expenses/monthly", json=payload)
+
+    async def date_range_analytics(self):
+        start = self._random_date()
+        end = start + timedelta(days=self.rng.choice([7, 31, 92, 365]))
+        payload = {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        return await self.client.post("/analytics/getexpensesbydaterange/", json=payload)
+
+    async def note_search(self):
+        months = sorted(self.rng.sample(range(1, 13), self.rng.choice([1, 3, 12])))
+        payload = {
+            "wildcard_note": self.rng.choice(NOTE_TERMS),
+            "year": self.rng.randint(*seed_data.SEED_YEARS),
+            "months": months
+        }
+        return await self.client.post("/expenses/note", json=payload)
+
+    # Two new rows plus a modification of the row added by the previous batch, like the Add/Update tab
+    async def update_batch(self):
+        write_date = self.write_date.isoformat()
+        additions = []
+        for _ in range(2):
+            additions.append({
+                "expense_date": write_date,
+                "amount": float(self.rng.randint(10, 500)),
+                "category": "Food",
+                "notes": f"Load test user {self.user_id} row {next(self.counter)}"
+            })
+
+        updates = []
+        if self.last_added:
+            updates.append({
+                "old_expense_date": write_date,
+                "old_amount": self.last_added["amount"],
+                "old_category": self.last_added["category"],
+                "old_notes": self.last_added["notes"],
+                "new_expense_date": write_date,
+                "new_amount": self.last_added["amount"] + 1,
+                "new_category": self.last_added["category"],
+                "new_notes": self.last_added["notes"] + " (edited)"
+            })
+
+        response = await self.client.post("/expenses/update", json={"updates": updates, "additions": additions})
+        if response.status_code == 200:
+            self.last_added = additions[-1]
+        return response
+
+
+class StageStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, operation, latency, ok):
+        self.latencies.setdefault(operation, []).append(latency)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, concurrency, elapsed):
+        all_latencies = sorted(itertools.chain.from_iterable(self.latencies.values()))
+        total = len(all_latencies)
+        errors = sum(self.errors.values())
+
+        def latency_summary(values):
+            values = sorted(values)
+            return {
+                "p50_ms": _percentile(values, 0.50) * 1000,
+                "p90_ms": _percentile(values, 0.90) * 1000,
+                "p99_ms": _percentile(values, 0.99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+            }
+
+        return {
+            "concurrency": concurrency,
+            "duration_s": elapsed,
+            "requests": total,
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "error_rate": errors / total if total else 0.0,
+            **latency_summary(all_latencies),
+            "operations": {
+                operation: {
+                    "requests": len(values),
+                    "errors": self.errors.get(operation, 0),
+                    **latency_summary(values),
+                }
+                for operation, values in self.latencies.items()
+            },
+        }
+
+
+async def _run_user(user, mix, deadline, stats):
+    operations = list(mix)
+    weights = [mix[op] for op in operations]
+    while time.perf_counter() < deadline:
+        operation = user.rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await getattr(user, operation)()
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        stats.record(operation, time.perf_counter() - start, ok)
+
+
+async def run_stage(base_url, concurrency, duration, mix, seed, timeout):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        users = [VirtualUser(i, client, random.Random(seed + i)) for i in range(concurrency)]
+        stats = StageStats()
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(_run_user(user, mix, deadline, stats) for user in users))
+        return stats.summary(concurrency, time.perf_counter() - started)
+
+
+async def cleanup(base_url, max_users):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for offset in range(min(max_users, 365)):
+            await client.delete(f"/expenses/{(date(WRITE_YEAR, 1, 1) + timedelta(days=offset)).isoformat()}")
+
+
+async def run_ramp(base_url, stages, duration, mix, seed, timeout):
+    results = []
+    for concurrency in stages:
+        # every stage starts from the same data so update batches never collide with earlier rows
+        await cleanup(base_url, concurrency)
+        summary = await run_stage(base_url, concurrency, duration, mix, seed, timeout)
+        results.append(summary)
+        print(f"users={concurrency:>4}  rps={summary['throughput_rps']:8.1f}  "
+              f"errors={summary['error_rate']:6.2%}  p50={summary['p50_ms']:8.1f} ms  "
+              f"p90={summary['p90_ms']:8.1f} ms  p99={summary['p99_ms']:8.1f} ms", file=sys.stderr)
+    await cleanup(base_url, max(stages))
+    return results
+
+
+# Start the backend (serve.py, with a shared cache across the workers) on the SQLite stand-in,
+# seeded with the given data set, and wait until it answers.
+def start_server(size_name, port, workers=1):
+    seed_data.use_database(size_name, "sqlite")
+    seed_data.seed(seed_data.SIZES[size_name])
+
+    env = dict(os.environ)
+    # Next to serve.py's default, one per port so servers started side by side do not share it
+    env.setdefault("SHARED_CACHE_DIR", os.path.join(tempfile.gettempdir(), f"expense_manager_shared_cache_{port}"))
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base_url}/docs", timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited before it started serving")
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start within 10 seconds")
+
+
+def _parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, weight = item.split("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}'. Must be one of: {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp concurrent load against the expense backend")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000", help="Base URL of a running backend")
+    target.add_argument("--start-server", action="store_true",
+                        help="Start a local uvicorn instance on the SQLite stand-in")
+    parser.add_argument("--size", default="10k", choices=list(seed_data.SIZES),
+                        help="Data set to seed when --start-server is used")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="Worker processes when --start-server is used; several values run the ramp for each")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Number of concurrent virtual users in each ramp stage")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per stage")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="Operation weights, e.g. fetch_date=50,note_search=50")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the stage results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for workers in (args.workers if args.start_server else [None]):
+        process = None
+        base_url = args.url
+        if args.start_server:
+            process, base_url = start_server(args.size, args.port, workers)
+
+        try:
+            results = asyncio.run(
+                run_ramp(base_url, args.concurrency, args.duration, args.mix, args.seed, args.timeout)
+            )
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+        runs.append({"workers": workers, "stages": results})
+
+    report = {"target": base_url, "mix": args.mix, "stages": runs[0]["stages"]}
+    if len(runs) > 1:
+        report["scaling"] = runs
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if any(stage["error_rate"] > 0 for run in runs for stage in run["stages"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
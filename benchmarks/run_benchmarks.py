@@ -0,0 +1,292 @@
+"""
+Benchmark suite for db_helper and the FastAPI routes.
+
+Usage (from the project root):
+    python -m benchmarks.run_benchmarks run --sizes 10k 1m --output results.json
+    python -m benchmarks.run_benchmarks run --sizes 10k --save-baseline
+    python -m benchmarks.run_benchmarks compare results.json --baseline benchmarks/baseline.json
+
+Each data set is seeded once (see seed_data.py) and every benchmark is timed `--repeats` times
+after one warm-up call. Timings are reported in milliseconds.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import date, datetime
+
+from benchmarks import seed_data
+import db_helper
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Dates reserved for the write benchmarks, outside the seeded range
+WRITE_DATE = date(2030, 1, 15)
+WRITE_DATE_UPDATED = date(2030, 1, 16)
+
+
+def _stats(samples):
+    samples = sorted(samples)
+    p95_index = min(len(samples) - 1, round(0.95 * (len(samples) - 1)))
+    return {
+        "runs": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p95_ms": samples[p95_index] * 1000,
+    }
+
+
+# Time func() `repeats` times after one warm-up call.
+# - setup: optional callable run before every call, outside of the timed section.
+def time_call(func, repeats, setup=None):
+    if setup:
+        setup()
+    func()
+
+    samples = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+# Read benchmarks: name -> zero-argument callable
+def db_helper_read_benchmarks():
+    all_months = list(range(1, 13))
+    return {
+        "db_helper.fetch_expenses_for_date": lambda: db_helper.fetch_expenses_for_date(date(2024, 8, 24)),
+        "db_helper.fetch_monthly_expenses[all]": lambda: db_helper.fetch_monthly_expenses(2024, "all"),
+        "db_helper.fetch_monthly_expenses[food,shopping]":
+            lambda: db_helper.fetch_monthly_expenses(2024, "Food, Shopping"),
+        "db_helper.fetch_expense_summary[month]":
+            lambda: db_helper.fetch_expense_summary(date(2024, 8, 1), date(2024, 8, 31)),
+        "db_helper.fetch_expense_summary[year]":
+            lambda: db_helper.fetch_expense_summary(date(2024, 1, 1), date(2024, 12, 31)),
+        "db_helper.fetch_expenses_for_particular_category_date":
+            lambda: db_helper.fetch_expenses_for_particular_category_date("Food", date(2024, 8, 24)),
+        "db_helper.fetch_expenses_for_particular_note[month]":
+            lambda: db_helper.fetch_expenses_for_particular_note("bill", 2024, [8]),
+        "db_helper.fetch_expenses_for_particular_note[year]":
+            lambda: db_helper.fetch_expenses_for_particular_note("bill", 2024, all_months),
+        "db_helper.fetch_expenses_by_category_and_day[shopping,monday]":
+            lambda: db_helper.fetch_expenses_by_category_and_day("Shopping", "monday"),
+    }
+
+
+def _clear_write_dates():
+    db_helper.delete_expenses_for_date(WRITE_DATE)
+    db_helper.delete_expenses_for_date(WRITE_DATE_UPDATED)
+
+
+def _seed_write_row():
+    _clear_write_dates()
+    db_helper.insert_expense(WRITE_DATE, 100.0, "Food", "Benchmark row")
+
+
+# Write benchmarks: name -> (callable, setup)
+def db_helper_write_benchmarks():
+    return {
+        "db_helper.insert_expense": (
+            lambda: db_helper.insert_expense(WRITE_DATE, 100.0, "Food", "Benchmark row"),
+            _clear_write_dates
+        ),
+        "db_helper.add_expense[check_duplicate]": (
+            lambda: db_helper.add_expense(WRITE_DATE, 100.0, "Food", "Benchmark row", check_duplicate=True),
+            _clear_write_dates
+        ),
+        "db_helper.update_expense": (
+            lambda: db_helper.update_expense(
+                old_data={"expense_date": WRITE_DATE, "amount": 100.0, "category": "Food",
+                          "notes": "Benchmark row"},
+                new_data={"expense_date": WRITE_DATE_UPDATED, "amount": 120.0, "category": "Food",
+                          "notes": "Benchmark row updated"}
+            ),
+            _seed_write_row
+        ),
+        "db_helper.delete_expense": (
+            lambda: db_helper.delete_expense(WRITE_DATE, "Food", "Benchmark row"),
+            _seed_write_row
+        ),
+        "db_helper.delete_expenses_for_date": (
+            lambda: db_helper.delete_expenses_for_date(WRITE_DATE),
+            _seed_write_row
+        ),
+    }
+
+
+# Route benchmarks through an in-process test client: name -> (callable, setup)
+def route_benchmarks(client):
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.url} -> {response.status_code}")
+        return response
+
+    write_date = WRITE_DATE.isoformat()
+    addition = {"expense_date": write_date, "amount": 100.0, "category": "Food", "notes": "Benchmark row"}
+    update = {
+        "old_expense_date": write_date, "old_amount": 100.0, "old_category": "Food", "old_notes": "Benchmark row",
+        "new_expense_date": write_date, "new_amount": 120.0, "new_category": "Food",
+        "new_notes": "Benchmark row updated"
+    }
+
+    return {
+        "GET /expenses/{date}": (lambda: check(client.get("/expenses/2024-08-24")), None),
+        "POST /analytics/expenses/monthly": (
+            lambda: check(client.post("/analytics/expenses/monthly", json={"year": 2024, "category": "all"})), None
+        ),
+        "POST /expenses/note": (
+            lambda: check(client.post("/expenses/note",
+                                      json={"wildcard_note": "bill", "year": 2024, "months": list(range(1, 13))})),
+            None
+        ),
+        "POST /analytics/getexpensesbydaterange/": (
+            lambda: check(client.post("/analytics/getexpensesbydaterange/",
+                                      json={"start_date": "2024-08-01", "end_date": "2024-08-31"})),
+            None
+        ),
+        "POST /expenses/category/date": (
+            lambda: check(client.post("/expenses/category/date",
+                                      json={"category": "food", "expense_date": "2024-08-24"})),
+            None
+        ),
+        "POST /expenses/category/period": (
+            lambda: check(client.post("/expenses/category/period",
+                                      json={"category": "shopping", "period_of_week": "monday"})),
+            None
+        ),
+        "POST /expenses/addorudpate/": (
+            lambda: check(client.post("/expenses/addorudpate/", json=[addition])), _clear_write_dates
+        ),
+        "POST /expenses/update[add]": (
+            lambda: check(client.post("/expenses/update", json={"updates": [], "additions": [addition]})),
+            _clear_write_dates
+        ),
+        "POST /expenses/update[modify]": (
+            lambda: check(client.post("/expenses/update", json={"updates": [update], "additions": []})),
+            _seed_write_row
+        ),
+        "DELETE /expenses/{date}": (lambda: check(client.delete(f"/expenses/{write_date}")), _seed_write_row),
+    }
+
+
+def run(sizes, engine, repeats, route_repeats):
+    from fastapi.testclient import TestClient
+    import backend_server
+
+    results = {}
+    for size_name in sizes:
+        seed_data.use_database(size_name, engine)
+        started = time.perf_counter()
+        seeded = seed_data.seed(seed_data.SIZES[size_name])
+        print(f"[{size_name}] {'seeded' if seeded else 'reused'} data set "
+              f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        size_results = {}
+        for name, func in db_helper_read_benchmarks().items():
+            size_results[name] = time_call(func, repeats)
+        for name, (func, setup) in db_helper_write_benchmarks().items():
+            size_results[name] = time_call(func, repeats, setup)
+
+        with TestClient(backend_server.app) as client:
+            for name, (func, setup) in route_benchmarks(client).items():
+                size_results[name] = time_call(func, route_repeats, setup)
+
+        _clear_write_dates()
+        for name, stats in size_results.items():
+            print(f"[{size_name}] {name:<60} median {stats['median_ms']:10.2f} ms", file=sys.stderr)
+        results[size_name] = size_results
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "engine": engine,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+# Compare the median of every benchmark present in both reports.
+# Returns a list of (size, name, baseline_ms, current_ms, ratio, regressed).
+def compare(current, baseline, threshold):
+    rows = []
+    for size_name, benchmarks in current["results"].items():
+        baseline_size = baseline["results"].get(size_name, {})
+        for name, stats in benchmarks.items():
+            if name not in baseline_size:
+                continue
+            old = baseline_size[name]["median_ms"]
+            new = stats["median_ms"]
+            ratio = new / old if old else float("inf")
+            rows.append((size_name, name, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    regressions = 0
+    for size_name, name, old, new, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        regressions += regressed
+        print(f"[{size_name}] {name:<60} {old:10.2f} -> {new:10.2f} ms  x{ratio:5.2f} {flag}")
+    print(f"{regressions} regression(s) above {threshold:.0%} out of {len(rows)} benchmark(s)")
+    return regressions
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark db_helper functions and API routes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Seed the data sets and run the benchmarks")
+    run_parser.add_argument("--sizes", nargs="+", default=["10k"], choices=list(seed_data.SIZES))
+    run_parser.add_argument("--engine", default="sqlite", choices=["sqlite", "mysql"])
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--route-repeats", type=int, default=5)
+    run_parser.add_argument("--output", help="Write the results as JSON to this file")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Also store the results in {BASELINE_FILE}")
+    run_parser.add_argument("--baseline", help="Compare the results against this baseline file")
+    run_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Relative slowdown of the median that counts as a regression (default 0.25)")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a results file against a baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("--baseline", default=BASELINE_FILE)
+    compare_parser.add_argument("--threshold", type=float, default=0.25)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(args.sizes, args.engine, args.repeats, args.route_repeats)
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output)
+        else:
+            print(output)
+        if args.save_baseline:
+            with open(BASELINE_FILE, "w") as f:
+                f.write(output)
+        if args.baseline:
+            rows = compare(report, _load(args.baseline), args.threshold)
+            return 1 if print_comparison(rows, args.threshold) else 0
+        return 0
+
+    rows = compare(_load(args.results), _load(args.baseline), args.threshold)
+    return 1 if print_comparison(rows, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
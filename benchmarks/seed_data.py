@@ -0,0 +1,86 @@
+import os
+import random
+from datetime import date, timedelta
+
+import categories as categories_registry
+import db_helper
+from insert_data_into_db import categories, random_expense
+
+# Deterministic data sets for the benchmarks.
+# Rows are spread evenly over SEED_YEARS so that every year- and range-scoped query has data to scan.
+
+SEED_YEARS = (2020, 2024)
+BATCH_SIZE = 10_000
+
+# Named data set sizes accepted on the command line
+SIZES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# The database named in .env (loaded by db_helper), before use_database replaces DB_NAME
+_BASE_DB_NAME = os.getenv("DB_NAME", "expense_manager")
+
+
+# Point db_helper at the database that holds the given data set.
+# - engine: 'sqlite' uses a file under benchmarks/data, 'mysql' uses the database named in .env
+#   with a per-size suffix (the database must already exist with the expenses table).
+def use_database(size_name, engine="sqlite"):
+    if engine == "sqlite":
+        os.makedirs(DATA_DIR, exist_ok=True)
+        os.environ["DB_ENGINE"] = "sqlite"
+        os.environ["DB_NAME"] = os.path.join(DATA_DIR, f"expenses_{size_name}.sqlite3")
+    else:
+        os.environ["DB_ENGINE"] = "mysql"
+        os.environ["DB_NAME"] = f"{_BASE_DB_NAME}_bench_{size_name}"
+
+
+# Yield `count` (expense_date, amount, category, notes) tuples, always the same for the same seed.
+def generate_rows(count, seed=42):
+    rng = random.Random(seed)
+    first_day = date(SEED_YEARS[0], 1, 1)
+    total_days = (date(SEED_YEARS[1], 12, 31) - first_day).days + 1
+
+    for i in range(count):
+        expense_date = first_day + timedelta(days=(i * total_days) // count)
+        category = categories[rng.randrange(len(categories))]
+        amount, note = random_expense(category, expense_date.month, rng)
+        yield expense_date, amount, category, note
+
+
+def count_rows():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT COUNT(*) AS total FROM expenses")
+        return cursor.fetchone()["total"]
+
+
+# Make sure the current database holds exactly the data set of the given size.
+# An existing database with the right row count is reused, since seeding 10M rows takes a while.
+def seed(count, seed=42, force=False):
+    if not force and count_rows() == count:
+        return False
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM expenses")
+
+    batch = []
+    for row in generate_rows(count, seed):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            _insert_batch(batch)
+            batch = []
+    if batch:
+        _insert_batch(batch)
+    return True
+
+
+def _insert_batch(rows):
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.executemany(
+            "INSERT INTO expenses (expense_date, amount, category_id, notes) VALUES (%s, %s, %s, %s)",
+            [(expense_date, amount, categories_registry.require(category), notes)
+             for expense_date, amount, category, notes in rows]
+        )
@@ -1,6 +1,7 @@
 import streamlit as st
 from datetime import datetime
-import requests
+import trace_client
+from category_list import fetch_categories
 
 API_URL = "http://localhost:8000"
 
@@ -8,7 +9,7 @@ def add_update_tab():
     selected_date = st.date_input("Enter the date:", datetime(2024, 8, 1))
 
     # Fetch existing expenses for the selected date
-    response = requests.get(f"{API_URL}/expenses/{selected_date}")
+    response = trace_client.get(f"{API_URL}/expenses/{selected_date}")
     if response.status_code == 200:
         existing_expenses = response.json()
     else:
@@ -38,11 +39,7 @@ def add_update_tab():
     end_index = start_index + records_per_page
     paginated_expenses = existing_expenses[start_index:end_index]
 
-    categories = [
-        "Food", "Utilities", "Housing", "Transportation",
-        "Insurance", "Medical", "Debt Payment", "Entertainment",
-        "Misc", "Shopping"
-    ]
+    categories = fetch_categories()
 
     # Add New Expense checkbox (outside form)
     show_new_expense = st.checkbox("Add New Expense", value=False)
@@ -196,7 +193,7 @@ def add_update_tab():
                 payload["updates"] = modifications
 
             # Send to backend
-            response = requests.post(f"{API_URL}/expenses/update", json=payload)
+            response = trace_client.post(f"{API_URL}/expenses/update", json=payload)
 
             if response.status_code == 200:
                 st.success("Operation completed successfully!")
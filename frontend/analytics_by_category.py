@@ -1,7 +1,7 @@
 import streamlit as st
 from datetime import datetime
-import requests
-import pandas as pd
+from dataframes import read_dataframe
+from trace_client import Trace
 
 API_URL = "http://localhost:8000"
 
@@ -19,24 +19,21 @@ def analytics_by_category_tab():
             "end_date": end_date.strftime("%Y-%m-%d")
         }
 
-        response = requests.post(f"{API_URL}/analytics/getexpensesbydaterange/", json=payload)
-        response = response.json()
+        with Trace("Analytics by Category") as trace:
+            response = trace.post(f"{API_URL}/analytics/getexpensesbydaterange/", json=payload,
+                                  params={"format": "columnar"})
 
-        data = {
-            "Category": list(response.keys()),
-            "Total": [response[category]["Total"] for category in response],
-            "Percentage": [response[category]["Percentage"] for category in response]
-        }
-
-        df = pd.DataFrame(data)
-        df_sorted = df.sort_values(by="Percentage", ascending=False)
+            with trace.span("dataframe"):
+                df = read_dataframe(response).rename(columns={"category": "Category"})
+                df_sorted = df.sort_values(by="Percentage", ascending=False)
 
-        st.title("Expense Breakdown By Category")
+            with trace.span("render"):
+                st.title("Expense Breakdown By Category")
 
-        st.bar_chart(data=df_sorted.set_index("Category")['Percentage'], width=0, height=0, use_container_width=True)
+                st.bar_chart(data=df_sorted.set_index("Category")['Percentage'], width=0, height=0, use_container_width=True)
 
-        df_sorted["Total"] = df_sorted["Total"].map("{:.2f}".format)
-        df_sorted["Percentage"] = df_sorted["Percentage"].map("{:.2f}".format)
+                df_sorted["Total"] = df_sorted["Total"].map("{:.2f}".format)
+                df_sorted["Percentage"] = df_sorted["Percentage"].map("{:.2f}".format)
 
-        st.table(df_sorted)
+                st.table(df_sorted)
 
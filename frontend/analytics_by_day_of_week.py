@@ -1,6 +1,8 @@
 import streamlit as st
-import requests
 import pandas as pd
+from category_list import fetch_categories
+from dataframes import read_dataframe
+from trace_client import Trace
 
 API_URL = "http://localhost:8000"
 
@@ -12,11 +14,7 @@ def analytics_by_day_of_week_tab():
 
     with col1:
         # Category selection
-        categories = [
-            "Food", "Utilities", "Housing", "Transportation",
-            "Insurance", "Medical", "Debt Payment", "Entertainment",
-            "Misc", "Shopping", "all"
-        ]
+        categories = fetch_categories() + ["all"]
 
         # Multi-select dropdown with validation for 'all'
         selected_categories = st.multiselect(
@@ -59,46 +57,50 @@ def analytics_by_day_of_week_tab():
         else:
             categories_to_process = selected_categories
 
-        all_expenses = []
-
-        try:
-            backend_period = period_map[selected_period]
-
-            # Process each category separately
-            for category in categories_to_process:
-                response = requests.post(
-                    f"{API_URL}/expenses/category/period",
-                    json={
-                        "category": category.lower(),
-                        "period_of_week": backend_period
-                    }
-                )
-
-                if response.status_code == 200:
-                    all_expenses.extend(response.json())
-                else:
-                    error_message = response.json().get("detail", "Failed to fetch data")
-                    st.error(f"Error: {error_message}")
-                    return
-
-            if not all_expenses:
-                st.info("No expenses found for the selected criteria")
-                return
-
-            # Aggregate and sort data
-            df = pd.DataFrame(all_expenses)
-            df['amount'] = df['amount'].astype(float)
-            category_totals = df.groupby('category')['amount'].sum().reset_index()
-            category_totals.columns = ['Category', 'Total Amount']
-
-            # Sort by Total Amount (descending) before formatting
-            category_totals = category_totals.sort_values(by='Total Amount', ascending=False)
-
-            # Format to one decimal place
-            category_totals['Total Amount'] = category_totals['Total Amount'].map(lambda x: f"{x:.1f}")
-
-            # Display results
-            st.table(category_totals)
-
-        except Exception as e:
-            st.error(f"Connection error: {str(e)}")
+        frames = []
+
+        with Trace("Analytics by Day of Week") as trace:
+            try:
+                backend_period = period_map[selected_period]
+
+                # Process each category separately
+                for category in categories_to_process:
+                    response = trace.post(
+                        f"{API_URL}/expenses/category/period",
+                        json={
+                            "category": category.lower(),
+                            "period_of_week": backend_period
+                        },
+                        params={"format": "columnar"}
+                    )
+
+                    if response.status_code == 200:
+                        frames.append(read_dataframe(response))
+                    else:
+                        error_message = response.json().get("detail", "Failed to fetch data")
+                        st.error(f"Error: {error_message}")
+                        return
+
+                with trace.span("dataframe"):
+                    df = pd.concat(frames, ignore_index=True)
+                    if df.empty:
+                        st.info("No expenses found for the selected criteria")
+                        return
+
+                    # Aggregate and sort data
+                    df['amount'] = df['amount'].astype(float)
+                    category_totals = df.groupby('category')['amount'].sum().reset_index()
+                    category_totals.columns = ['Category', 'Total Amount']
+
+                    # Sort by Total Amount (descending) before formatting
+                    category_totals = category_totals.sort_values(by='Total Amount', ascending=False)
+
+                    # Format to one decimal place
+                    category_totals['Total Amount'] = category_totals['Total Amount'].map(lambda x: f"{x:.1f}")
+
+                with trace.span("render"):
+                    # Display results
+                    st.table(category_totals)
+
+            except Exception as e:
+                st.error(f"Connection error: {str(e)}")
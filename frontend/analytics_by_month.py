@@ -1,6 +1,8 @@
 import streamlit as st
-import requests
 import pandas as pd
+from category_list import fetch_categories
+from dataframes import read_dataframe
+from trace_client import Trace
 
 API_URL = "http://localhost:8000"
 
@@ -16,7 +18,8 @@ def analytics_by_month_tab():
         category = st.text_input(
             "Category (comma-separated or 'all')",
             value="all",
-            help="Enter one or more categories separated by commas (e.g., 'Shopping, Misc') or 'all' to include all categories."
+            help="Enter one or more categories separated by commas (e.g., 'Shopping, Misc') or 'all' to include all categories. "
+                 f"Available categories: {', '.join(fetch_categories())}."
         )
 
     # Button to fetch analytics
@@ -27,39 +30,30 @@ def analytics_by_month_tab():
             "category": category.strip()
         }
 
-        # Make API request
-        response = requests.post(f"{API_URL}/analytics/expenses/monthly", json=payload)
-
-        if response.status_code == 200:
-            # Parse response JSON
-            response_data = response.json()
-
-            # Prepare data for visualization
-            data = {
-                "Month": [item["month"] for item in response_data],
-                "Total Amount": [item["total_amount"] for item in response_data]
-            }
-
-            df = pd.DataFrame(data)
-
-            # Ensure months are sorted in ascending order from January to December
-            month_order = [
-                "January", "February", "March", "April", "May", "June",
-                "July", "August", "September", "October", "November", "December"
-            ]
-            df["Month"] = pd.Categorical(df["Month"], categories=month_order, ordered=True)
-            df_sorted = df.sort_values(by="Month")
-
-            # Bar chart visualization
-            st.title("Monthly Expense Breakdown")
-            st.bar_chart(data=df_sorted.set_index("Month")["Total Amount"], width=0, height=0, use_container_width=True)
-
-            # Format total amounts for display in table
-            df_sorted["Total Amount"] = df_sorted["Total Amount"].map("{:.2f}".format)
-
-            # Display table
-            st.table(df_sorted)
-        else:
-            # Handle errors from the API
-            error_message = response.json().get("detail", "An error occurred while fetching monthly analytics.")
-            st.error(f"Error: {error_message}")
+        with Trace("Analytics by Month") as trace:
+            # Make API request
+            response = trace.post(f"{API_URL}/analytics/expenses/monthly", json=payload,
+                                  params={"format": "columnar"})
+
+            if response.status_code == 200:
+                with trace.span("dataframe"):
+                    # The months come in calendar order from the backend
+                    df_sorted = read_dataframe(response).rename(columns={"month": "Month", "total_amount": "Total Amount"})
+
+                    # Keep that order in the chart (it would otherwise sort the months alphabetically)
+                    df_sorted["Month"] = pd.Categorical(df_sorted["Month"], categories=df_sorted["Month"], ordered=True)
+
+                with trace.span("render"):
+                    # Bar chart visualization
+                    st.title("Monthly Expense Breakdown")
+                    st.bar_chart(data=df_sorted.set_index("Month")["Total Amount"], width=0, height=0, use_container_width=True)
+
+                    # Format total amounts for display in table
+                    df_sorted["Total Amount"] = df_sorted["Total Amount"].map("{:.2f}".format)
+
+                    # Display table
+                    st.table(df_sorted)
+            else:
+                # Handle errors from the API
+                error_message = response.json().get("detail", "An error occurred while fetching monthly analytics.")
+                st.error(f"Error: {error_message}")
@@ -0,0 +1,19 @@
+import streamlit as st
+import requests
+import trace_client
+
+API_URL = "http://localhost:8000"
+
+# Category names from the backend's category registry, cached for a few minutes
+@st.cache_data(ttl=300)
+def _fetch_categories():
+    response = trace_client.get(f"{API_URL}/categories")
+    response.raise_for_status()
+    return response.json()
+
+def fetch_categories():
+    try:
+        return _fetch_categories()
+    except requests.RequestException:
+        st.error("Failed to retrieve categories")
+        return []
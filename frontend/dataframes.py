@@ -0,0 +1,12 @@
+import pandas as pd
+
+# Media type of the backend's ?format=arrow responses
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# DataFrame of a ?format=columnar (or ?format=arrow) response, built from its column arrays
+# without going through one dict per row
+def read_dataframe(response):
+    if response.headers.get("content-type", "").startswith(ARROW_MEDIA_TYPE):
+        import pyarrow.ipc
+        return pyarrow.ipc.open_stream(response.content).read_pandas()
+    return pd.DataFrame(response.json()["columns"])
@@ -1,5 +1,5 @@
 import streamlit as st
-import requests
+import trace_client
 import pandas as pd
 import re
 from datetime import datetime
@@ -71,7 +71,7 @@ def expenses_by_note_tab():
 
         try:
             # Send request to backend
-            response = requests.post(
+            response = trace_client.post(
                 f"{API_URL}/expenses/note",
                 json={
                     "wildcard_note": search_term.strip(),
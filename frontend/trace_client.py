@@ -0,0 +1,92 @@
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+API_URL = "http://localhost:8000"
+
+
+# Spans are reported to the backend's trace viewer only with TRACING=true (as on the backend)
+def enabled():
+    return os.getenv("TRACING", "false").lower() in ("1", "true", "yes")
+
+
+# One trace per tab action: API calls made through it send its id in a W3C traceparent header,
+# so the backend's spans join it, and its own spans (HTTP calls, DataFrame building, rendering)
+# are reported to POST /traces when it ends.
+#   with Trace("Analytics by Category") as trace:
+#       response = trace.post(url, json=payload)
+#       with trace.span("dataframe"):
+#           ...
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self._parents = []
+        self._root = None
+
+    def __enter__(self):
+        self._root = self.span(self.name)
+        self._root.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._root.__exit__(*exc_info)
+        self.report()
+        return False
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span_id = os.urandom(8).hex()
+        parent_id = self._parents[-1] if self._parents else None
+        self._parents.append(span_id)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self._parents.pop()
+            self.spans.append({
+                "trace_id": self.trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": name,
+                "start": started,
+                "duration_ms": (time.perf_counter() - start) * 1000,
+                "attributes": attributes,
+            })
+
+    def request(self, method, url, **kwargs):
+        with self.span(f"HTTP {method} {urlparse(url).path}") as attributes:
+            headers = {**kwargs.pop("headers", {}), "traceparent": f"00-{self.trace_id}-{self._parents[-1]}-01"}
+            response = requests.request(method, url, headers=headers, **kwargs)
+            attributes["status_code"] = response.status_code
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def report(self):
+        if not enabled() or not self.spans:
+            return
+        try:
+            requests.post(f"{API_URL}/traces", json=self.spans, timeout=2)
+        except requests.RequestException:
+            pass  # tracing must never break a tab
+
+
+# A single API call as a trace of its own
+def get(url, **kwargs):
+    with Trace(f"GET {urlparse(url).path}") as trace:
+        return trace.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    with Trace(f"POST {urlparse(url).path}") as trace:
+        return trace.post(url, **kwargs)
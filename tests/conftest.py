@@ -12,3 +12,7 @@ print("PROJECT ROOT: ", project_root)
 
 # Add the project root directory to sys.path so that imports like 'from backend import db_helper' work
 sys.path.insert(0, project_root)
+
+# The backend modules import each other by their plain names ('import db_helper'), and so do the tests:
+# importing one through the 'backend' package as well would load a second copy of it
+sys.path.insert(0, os.path.join(project_root, 'backend'))
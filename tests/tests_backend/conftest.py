@@ -0,0 +1,179 @@
+import itertools
+import random
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import anomalies
+import backend_server
+import categories
+import db_helper
+import local_db
+import rolling_analytics
+from insert_data_into_db import categories as CATEGORY_NAMES, random_expense
+
+# Backend tests run against the local SQLite stand-in (local_db.py), no database server is needed.
+# The database is created once per test session in a temporary directory and bulk-loaded with a
+# deterministic data set. Every test then runs inside a transaction that is rolled back when it
+# ends, so tests may write freely and still all see the same data.
+#
+# db_helper checks out a pooled connection for every cursor; during a test every checkout gets
+# the session's connection instead, inside a savepoint of the test's transaction. A commit releases
+# the savepoint (the write stays visible until the end of the test), a rollback or a failed
+# checkout rolls back to it, just as with separate connections.
+
+# The data set:
+# - BULK_ROWS_PER_MONTH random expenses (insert_data_into_db.random_expense, seeded) per category
+#   and month of BULK_MONTHS, without exact duplicates and without debt payments on Sundays,
+# - the hand-written expenses of August 2024 below, the month most tests look at.
+BULK_SEED = 2024
+BULK_ROWS_PER_MONTH = 20
+BULK_MONTHS = [(2023, month) for month in range(1, 13)] + [(2024, month) for month in (1, 2, 3, 4, 5, 6, 7, 10, 11, 12)]
+
+AUGUST_2024 = [
+    (date(2024, 8, 2), 850.0, "Housing", "Monthly rent"),
+    (date(2024, 8, 5), 320.0, "Debt Payment", "Car loan EMI"),
+    (date(2024, 8, 7), 500.0, "Medical", "Doctor visit"),
+    (date(2024, 8, 10), 900.0, "Food", "Festival feast"),
+    (date(2024, 8, 12), 2500.0, "Shopping", "Furniture"),
+    (date(2024, 8, 15), 260.0, "Utilities", "Electricity bill"),
+    (date(2024, 8, 18), 1000.0, "Food", "Grocery shopping"),
+    (date(2024, 8, 20), 57.0, "Misc", "Stationery"),
+    # Saturday the 24th: seven expenses, the first two in this order
+    (date(2024, 8, 24), 1200.0, "Shopping", "Asics Shoes"),
+    (date(2024, 8, 24), 299.0, "Utilities", "Broadband bill"),
+    (date(2024, 8, 24), 150.0, "Food", "Grocery shopping"),
+    (date(2024, 8, 24), 60.0, "Transportation", "Uber rides"),
+    (date(2024, 8, 24), 40.0, "Misc", "Haircut"),
+    (date(2024, 8, 24), 114.0, "Insurance", "Motor Vehicle Insurance Premium"),
+    (date(2024, 8, 24), 200.0, "Food", "Restaurant dinner"),
+    (date(2024, 8, 25), 180.0, "Food", "Sunday brunch"),
+    (date(2024, 8, 26), 45.0, "Transportation", "Metro tickets"),
+    (date(2024, 8, 28), 1212.0, "Food", "Family dinner"),
+    (date(2024, 8, 29), 4200.0, "Shopping", "iMac purchase"),
+    (date(2024, 8, 30), 280.0, "Debt Payment", "Personal loan EMI"),
+]
+
+
+def dataset():
+    """(expense_date, amount, category, notes) of every expense of the test database, in insert order."""
+    rng = random.Random(BULK_SEED)
+    seen = set()
+    rows = []
+    for (year, month), category in itertools.product(BULK_MONTHS, CATEGORY_NAMES):
+        for _ in range(BULK_ROWS_PER_MONTH):
+            expense_date = date(year, month, rng.randint(1, 28))
+            if category == "Debt Payment" and expense_date.weekday() == 6:
+                expense_date += timedelta(days=1)
+            amount, notes = random_expense(category, month, rng)
+            row = (expense_date, amount, category, notes)
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+    return rows + AUGUST_2024
+
+
+def _load(connection):
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT id, name FROM categories")
+    category_ids = {row["name"]: row["id"] for row in cursor.fetchall()}
+    cursor.executemany(
+        "INSERT INTO expenses (expense_date, amount, category_id, notes) VALUES (%s, %s, %s, %s)",
+        [(expense_date, amount, category_ids[category], notes) for expense_date, amount, category, notes in dataset()]
+    )
+    connection.commit()
+    cursor.close()
+
+
+@pytest.fixture(scope="session")
+def test_database(tmp_path_factory):
+    """Connection to the session's database, created and loaded on first use."""
+    path = str(tmp_path_factory.mktemp("database") / "expenses.sqlite3")
+    with pytest.MonkeyPatch.context() as patch:
+        # Anything that connects on its own (rather than through db_helper's pool) finds it too
+        patch.setenv("DB_ENGINE", "sqlite")
+        patch.setenv("DB_NAME", path)
+        connection = local_db.connect(database=path)
+        _load(connection)
+        yield connection
+        connection.close()
+
+
+class _Savepoint:
+    """One db_helper checkout during a test: the session's connection, inside a savepoint."""
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self._name = name
+        self._execute(f"SAVEPOINT {name}")
+        self.in_transaction = True
+
+    def _execute(self, statement):
+        cursor = self._connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+
+    def cursor(self, **kwargs):
+        return self._connection.cursor(**kwargs)
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        if self.in_transaction:
+            self._execute(f"RELEASE SAVEPOINT {self._name}")
+            self.in_transaction = False
+
+    def rollback(self):
+        if self.in_transaction:
+            self._execute(f"ROLLBACK TO SAVEPOINT {self._name}")
+            self._execute(f"RELEASE SAVEPOINT {self._name}")
+            self.in_transaction = False
+
+    def is_connected(self):
+        return True
+
+    # Called by db_helper._release: like closing a real connection, this drops uncommitted work
+    def close(self):
+        self.rollback()
+
+
+@pytest.fixture(autouse=True)
+def db_transaction(test_database, monkeypatch):
+    """Run the test inside a transaction of the session's database that is rolled back afterwards."""
+    test_database.start_transaction()
+    names = (f"checkout_{i}" for i in itertools.count())
+    monkeypatch.setattr(db_helper, "_checkout", lambda host=None: (_Savepoint(test_database, next(names)), None))
+    monkeypatch.setattr(db_helper, "_release", lambda connection, key, reusable=True: connection.close())
+    yield test_database
+    test_database.rollback()
+    # In-memory state built from the rolled back data is rebuilt on its next use
+    for invalidate in (categories.invalidate, rolling_analytics.invalidate, anomalies.invalidate):
+        invalidate()
+
+
+# db_helper's own pool functions, before db_transaction replaces them
+_CHECKOUT, _RELEASE = db_helper._checkout, db_helper._release
+
+
+@pytest.fixture
+def own_connections(monkeypatch):
+    """db_helper's real (emptied) connection pool, for tests with database files of their own."""
+    monkeypatch.setattr(db_helper, "_checkout", _CHECKOUT)
+    monkeypatch.setattr(db_helper, "_release", _RELEASE)
+    monkeypatch.setattr(db_helper, "_idle", {})
+    monkeypatch.setattr(db_helper, "_in_use", {})
+    monkeypatch.setattr(db_helper, "_replica_turn", itertools.count())
+    monkeypatch.setattr(db_helper, "_replica_down_until", {})
+    monkeypatch.setattr(db_helper, "_last_write", float("-inf"))
+    yield
+    for idle in db_helper._idle.values():
+        for connection, _ in idle:
+            connection.close()
+
+
+@pytest.fixture
+def client():
+    """In-process client of the API; it uses the test's transaction like direct db_helper calls."""
+    return TestClient(backend_server.app)
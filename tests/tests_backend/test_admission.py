@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+import admission
+import backend_server
+
+
+def _controller(total=2, max_wait=5.0):
+    return admission.AdmissionController(total=total, classes={
+        "interactive": admission.RequestClass(priority=0, limit=2, queue=1, max_wait=max_wait),
+        "analytics": admission.RequestClass(priority=1, limit=1, queue=1, max_wait=max_wait),
+    })
+
+
+def test_class_limits_and_priority():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("analytics")
+        # The analytics class is at its limit, although a shared slot is still free
+        analytics = asyncio.ensure_future(controller.acquire("analytics"))
+        await controller.acquire("interactive")
+        interactive = asyncio.ensure_future(controller.acquire("interactive"))
+        await asyncio.sleep(0)
+        assert {name: stats["queue_depth"] for name, stats in controller.stats().items()} == {
+            "interactive": 1, "analytics": 1
+        }
+
+        # The freed shared slot goes to the waiting interactive request
+        controller.release("analytics")
+        await asyncio.wait_for(interactive, 1)
+        assert not analytics.done()
+        controller.release("interactive")
+        await asyncio.wait_for(analytics, 1)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["interactive"] == {"running": 1, "queue_depth": 0, "admitted": 2, "queued": 1, "shed": 0,
+                                    "timed_out": 0}
+    assert stats["analytics"] == {"running": 1, "queue_depth": 0, "admitted": 2, "queued": 1, "shed": 0,
+                                  "timed_out": 0}
+
+
+def test_full_queue_and_long_wait_are_rejected():
+    async def scenario():
+        controller = _controller(max_wait=0.05)
+        await controller.acquire("analytics")
+        waiting = asyncio.ensure_future(controller.acquire("analytics"))
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Rejected) as shed:
+            await controller.acquire("analytics")
+        with pytest.raises(admission.Rejected) as timed_out:
+            await waiting
+        return controller.stats(), shed.value, timed_out.value
+
+    stats, shed, timed_out = asyncio.run(scenario())
+    assert (shed.status_code, shed.retry_after) == (429, 1)
+    assert (timed_out.status_code, timed_out.retry_after) == (503, 1)
+    assert stats["analytics"] == {"running": 1, "queue_depth": 0, "admitted": 1, "queued": 1, "shed": 1,
+                                  "timed_out": 1}
+
+
+def test_rejected_requests(client, monkeypatch):
+    # No running slots at all: interactive requests find their queue full, analytics requests time out
+    controller = admission.AdmissionController(total=0, classes={
+        "interactive": admission.RequestClass(priority=0, limit=0, queue=0, max_wait=2),
+        "analytics": admission.RequestClass(priority=1, limit=0, queue=1, max_wait=0.05),
+    })
+    monkeypatch.setattr(backend_server, "admission_control", controller)
+
+    response = client.get("/categories")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+    response = client.get("/analytics/calendar", params={"year": 2024})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    # Health checks and metrics are never queued
+    for path in backend_server.UNLIMITED_PATHS[:3]:
+        assert client.get(path).status_code == 200, path
+    assert controller.stats()["interactive"]["shed"] == 1
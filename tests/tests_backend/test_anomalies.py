@@ -0,0 +1,91 @@
+import statistics
+from datetime import date
+import pytest
+import anomalies
+import db_helper
+
+
+def _august_food():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("SELECT amount FROM expenses WHERE category_id = 1 AND MONTH(expense_date) = 8")
+        return [row["amount"] for row in cursor.fetchall()]
+
+
+def test_score_against_seasonal_statistics():
+    amounts = _august_food()
+    result = anomalies.score("Food", "2024-08-31", 150)
+
+    assert result["samples"] == len(amounts)
+    assert result["seasonal_mean"] == pytest.approx(statistics.mean(amounts))
+    assert result["seasonal_std"] == pytest.approx(statistics.stdev(amounts))
+    assert not result["anomaly"]
+    assert anomalies.score("Food", "2024-08-31", 100_000)["anomaly"]
+
+
+def test_find_anomalies_after_a_write():
+    before = anomalies.find_anomalies(date(2024, 8, 1), date(2024, 8, 31), "Food")
+    assert "Family dinner" in [row["notes"] for row in before]
+    db_helper.insert_expense("2024-08-31", 100_000, "Food", "Wedding banquet")
+
+    found = anomalies.find_anomalies(date(2024, 8, 1), date(2024, 8, 31), "Food")
+    assert (found[0]["amount"], found[0]["notes"]) == (100_000, "Wedding banquet")
+    assert all(row["category"] == "Food" for row in found)
+    assert anomalies.score("Food", "2024-08-31", 150)["samples"] == len(_august_food())
+
+
+def test_write_committed_before_the_load_is_counted_once(monkeypatch):
+    anomalies.invalidate()
+    notified = []
+    monkeypatch.setattr(db_helper, "_notify", notified.append)
+    db_helper.insert_expense("2024-08-31", 100_000, "Food", "Wedding banquet")
+    loaded = anomalies.score("Food", "2024-08-31", 150)
+    anomalies.record_changes(notified[0])
+
+    assert anomalies.score("Food", "2024-08-31", 150) == loaded
+    assert loaded["samples"] == len(_august_food())
+    assert loaded["seasonal_mean"] == pytest.approx(statistics.mean(_august_food()))
+
+
+def test_write_validates_before_scoring(client, monkeypatch):
+    anomalies.invalidate()
+    warmed = []
+    monkeypatch.setattr(anomalies, "warm", lambda: warmed.append(True))
+    expense = {"expense_date": "2024-08-31", "amount": 100, "category": "Sports", "notes": "Tennis balls"}
+
+    assert client.post("/expenses/addorudpate/", json=[expense]).status_code == 400
+    assert warmed == [] and not anomalies.loaded()
+
+    # Before the statistics are loaded, writes are not held up by the load
+    response = client.post("/expenses/addorudpate/", json=[{**expense, "category": "Shopping"}])
+    assert response.status_code == 200
+    assert response.json()["scores"] == [None]
+    assert warmed == [True]
+
+    anomalies.score("Food", "2024-08-31", 0)  # loads the statistics
+    response = client.post("/expenses/addorudpate/", json=[{**expense, "category": "Shopping"}])
+    assert response.json()["scores"][0]["samples"] > 0
+
+
+def test_find_anomalies_reads_only_the_category(monkeypatch):
+    queries = []
+    read_expenses = db_helper._read_expenses
+
+    def spy(query, params, columns=None, primary=False):
+        queries.append((query, params))
+        return read_expenses(query, params, columns, primary)
+    monkeypatch.setattr(db_helper, "_read_expenses", spy)
+
+    found = anomalies.find_anomalies(date(2024, 8, 1), date(2024, 8, 31), "food")
+    assert [row["notes"] for row in found] == ["Family dinner"]
+    assert queries == [(anomalies.CATEGORY_BETWEEN_QUERY, (1, date(2024, 8, 1), date(2024, 8, 31)))]
+
+
+def test_find_anomalies_invalid(client):
+    with pytest.raises(ValueError):
+        anomalies.find_anomalies(date(2023, 1, 1), date(2024, 1, 2))
+    with pytest.raises(ValueError):
+        anomalies.find_anomalies(date(2024, 8, 1), date(2024, 8, 31), "Sports")
+
+    assert len(anomalies.find_anomalies(date(2024, 1, 1), date(2024, 12, 31))) > 0
+    response = client.get("/analytics/anomalies", params={"start_date": "2020-01-01", "end_date": "2024-12-31"})
+    assert response.status_code == 400
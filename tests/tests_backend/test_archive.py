@@ -0,0 +1,132 @@
+import os
+import pytest
+from datetime import date
+import pyarrow as pa
+import archive
+import db_helper
+import rolling_analytics
+import single_flight
+
+
+@pytest.fixture
+def archived_2021(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_DIR", str(tmp_path))
+    rows = [
+        {"id": 1, "expense_date": date(2021, 3, 2), "amount": 250.0, "category": "Utilities", "notes": "Water bill"},
+        {"id": 2, "expense_date": date(2021, 3, 9), "amount": 120.0, "category": "Food", "notes": "Grocery shopping"},
+        {"id": 3, "expense_date": date(2021, 8, 1), "amount": 1300.0, "category": "Shopping", "notes": "Furniture"},
+        {"id": 4, "expense_date": date(2021, 8, 24), "amount": 40.0, "category": "Food",
+         "notes": "August Grocery shopping"},
+        {"id": 5, "expense_date": date(2021, 12, 30), "amount": 260.0, "category": "Utilities", "notes": "Gas bill"},
+    ]
+    archive._write(2021, pa.Table.from_pylist(rows, schema=archive.SCHEMA))
+    return rows
+
+
+def test_archived_years(archived_2021):
+    assert archive.archived_years() == {2021}
+    assert archive.archived_years_between("2020-06-01", "2021-01-31") == [2021]
+    assert archive.archived_years_between("2022-01-01", "2022-12-31") == []
+
+
+def test_monthly_totals(archived_2021):
+    totals = archive.monthly_totals(2021)
+    assert totals == {"March": 370.0, "August": 1340.0, "December": 260.0}
+
+    food_only = archive.monthly_totals(2021, ["food"])
+    assert food_only == {"March": 120.0, "August": 40.0}
+
+    assert archive.monthly_totals(2019) == {}
+
+
+def test_category_totals(archived_2021):
+    totals = archive.category_totals("2021-03-01", "2021-08-24")
+    assert totals == {"Utilities": 250.0, "Food": 160.0, "Shopping": 1300.0}
+
+
+def test_note_matches(archived_2021):
+    matches = archive.note_matches("BILL", 2021, [3, 12])
+    assert [row["notes"] for row in matches] == ["Water bill", "Gas bill"]
+
+    assert archive.note_matches("bill", 2021, [8]) == []
+
+
+def test_rows_between(archived_2021):
+    rows = archive.rows_between(date(2021, 8, 1), date(2021, 12, 31))
+    assert [row["id"] for row in rows] == [3, 4, 5]
+
+
+class Crash(Exception):
+    pass
+
+
+def _live_2023():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT id FROM expenses WHERE expense_date >= %s AND expense_date < %s",
+                       (date(2023, 1, 1), date(2024, 1, 1)))
+        return sorted(row["id"] for row in cursor.fetchall())
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_archive_rerun_after_a_partial_run(archive_dir, monkeypatch):
+    ids = _live_2023()
+    totals = db_helper.fetch_monthly_expenses(2023, "Food")
+    notified = []
+
+    def crash(changes):
+        notified.append(changes)
+        raise Crash()
+
+    # The file is written and January deleted, then the run dies
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(db_helper, "_notify", crash)
+        with pytest.raises(Crash):
+            archive.archive_year(2023)
+    assert {change["op"] for change in notified[0]} == {"move"}
+    assert len(_live_2023()) < len(ids)
+
+    assert archive.archive_year(2023) == len(ids) - len(notified[0])
+    assert _live_2023() == []
+    assert sorted(archive.load_year(2023)["id"].to_pylist()) == ids
+    assert db_helper.fetch_monthly_expenses(2023, "Food") == totals
+
+
+def test_archive_and_restore_notify_the_write_listeners(archive_dir):
+    generation = single_flight._generation
+    rolling_analytics.moving_totals(date(2023, 8, 31), days=1)
+    archive.archive_year(2023)
+    assert single_flight._generation == generation + 12
+    assert rolling_analytics._daily is None
+
+    rolling_analytics.moving_totals(date(2023, 8, 31), days=1)
+    archive.restore_year(2023)
+    assert single_flight._generation == generation + 13
+    assert rolling_analytics._daily is None
+
+
+def test_restore_rerun_after_a_crash(archive_dir):
+    def crash(path):
+        raise Crash()
+
+    ids = _live_2023()
+    totals = db_helper.fetch_monthly_expenses(2023, "Food")
+    archive.archive_year(2023)
+
+    # The rows are committed, then the run dies before the file is removed
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(archive.os, "remove", crash)
+        with pytest.raises(Crash):
+            archive.restore_year(2023)
+    assert archive.archived_years() == set()
+    assert _live_2023() == ids
+    assert db_helper.fetch_monthly_expenses(2023, "Food") == totals
+
+    assert archive.restore_year(2023) == len(ids)
+    assert _live_2023() == ids
+    assert archive.archived_years() == set()
+    assert not os.listdir(archive_dir)
@@ -0,0 +1,117 @@
+import pytest
+import columnar
+import db_helper
+
+
+def test_expenses_batch_dates(client):
+    response = client.post("/expenses/batch", json={"dates": ["2024-08-25", "2024-08-24", "1824-08-24"]})
+
+    assert response.status_code == 200
+    expenses = response.json()
+    assert list(expenses) == ["1824-08-24", "2024-08-24", "2024-08-25"]
+    assert len(expenses["2024-08-24"]) == 7
+    assert expenses["2024-08-24"][1]["notes"] == "Broadband bill"
+    assert expenses["2024-08-25"] == [
+        {"expense_date": "2024-08-25", "amount": 180.0, "category": "Food", "notes": "Sunday brunch"}
+    ]
+    assert expenses["1824-08-24"] == []
+
+
+def test_expenses_batch_range(client):
+    response = client.post("/expenses/batch", json={"start_date": "2024-08-24", "end_date": "2024-08-27"})
+
+    assert response.status_code == 200
+    assert {day: len(rows) for day, rows in response.json().items()} == {
+        "2024-08-24": 7, "2024-08-25": 1, "2024-08-26": 1, "2024-08-27": 0
+    }
+
+
+@pytest.mark.parametrize("payload", [
+    {"dates": ["2024-08-24"], "start_date": "2024-08-01"},
+    {"dates": ["2024-08-24"], "end_date": "2024-08-31"},
+    {"dates": ["2024-08-24"], "start_date": "2024-08-01", "end_date": "2024-08-31"},
+    {"start_date": "2024-08-01"},
+    {},
+    {"start_date": "2024-08-31", "end_date": "2024-08-01"},
+    {"start_date": "2023-01-01", "end_date": "2024-12-31"},
+])
+def test_expenses_batch_invalid(client, payload):
+    assert client.post("/expenses/batch", json=payload).status_code == 400
+
+
+def test_calendar(client):
+    response = client.get("/analytics/calendar", params={"year": 2024})
+
+    assert response.status_code == 200
+    calendar = response.json()
+    assert calendar["start_date"] == "2024-01-01"
+    totals = calendar["totals"]
+    assert len(totals) == 366
+    # August 24th is the 237th day of the leap year 2024
+    assert totals[236] == 1200 + 299 + 150 + 60 + 40 + 114 + 200
+    assert sum(totals[244:274]) == 0  # no expenses in September
+
+    assert client.get("/analytics/calendar", params={"year": 0}).status_code == 400
+
+
+def test_monthly_expenses_formats(client, monkeypatch):
+    request = {"year": 2024, "category": "Food"}
+    rows = client.post("/analytics/expenses/monthly", json=request).json()
+    assert rows[7] == {"month": "August", "total_amount": 3642}
+    response = client.post("/analytics/expenses/monthly", params={"format": "columnar"}, json=request)
+    assert response.json()["columns"]["total_amount"][7] == 3642
+
+    # Errors of the endpoint keep their status
+    monkeypatch.setattr(columnar, "pyarrow", None)
+    assert client.post("/analytics/expenses/monthly", params={"format": "arrow"}, json=request).status_code == 406
+    monkeypatch.setattr(db_helper, "fetch_monthly_expenses", lambda year, category: [])
+    assert client.post("/analytics/expenses/monthly", json=request).status_code == 404
+
+
+@pytest.fixture
+def fresh_probe(monkeypatch):
+    # Probe the database on every health check
+    monkeypatch.setattr(db_helper, "_probe", None)
+    monkeypatch.setenv("HEALTH_PROBE_SECONDS", "0")
+    monkeypatch.delenv("DB_REPLICAS", raising=False)
+
+
+def test_health_report(client, fresh_probe):
+    for path in ("/healthz", "/readyz"):
+        response = client.get(path)
+        assert response.status_code == 200, path
+        report = response.json()
+        assert report["status"] == "ok"
+        assert report["database"]["ok"] and report["database"]["error"] is None
+        assert report["database"]["latency_ms"] >= 0
+        assert report["replicas"] == {}
+        assert {"in_use", "idle", "reuse_ratio"} <= report["pool"].keys()
+        assert report["cache_hit_ratio"].keys() == {"prepared_statements", "coalescing"}
+        assert report["queue_depth"] == {"interactive": 0, "analytics": 0, "write_behind": 0}
+
+
+def test_not_ready_while_the_database_is_down(client, fresh_probe, monkeypatch):
+    def unreachable(*args):
+        raise ConnectionError("database is unreachable")
+    monkeypatch.setattr(db_helper, "_checkout", unreachable)
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    report = response.json()
+    assert report["status"] == "degraded"
+    assert report["database"] == {"ok": False, "latency_ms": None, "error": "database is unreachable",
+                                  "age_seconds": report["database"]["age_seconds"]}
+    # The process itself is alive
+    assert client.get("/healthz").status_code == 200
+
+
+def test_not_ready_while_a_replica_is_down(client, fresh_probe, monkeypatch):
+    monkeypatch.setenv("DB_REPLICAS", "replica1,replica2")
+    # A read found replica2 unavailable
+    monkeypatch.setattr(db_helper, "_replica_down_until", {"replica2": float("inf")})
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    report = response.json()
+    assert report["status"] == "degraded" and report["database"]["ok"]
+    assert report["replicas"] == {"replica1": True, "replica2": False}
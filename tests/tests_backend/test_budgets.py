@@ -0,0 +1,58 @@
+import pytest
+import budgets
+import db_helper
+import single_flight
+
+
+@pytest.fixture
+def food_budget():
+    # The test data is bulk-loaded around db_helper, so the running totals start empty
+    budgets.rebuild_month_totals()
+    budgets.set_budget("Food", 4000, 0.9)
+
+
+def _food_status(year=2024, month=8):
+    return next(row for row in budgets.fetch_budget_status(year, month) if row["category"] == "Food")
+
+
+def test_status_and_alerts(food_budget):
+    status = _food_status()
+    assert status["spent"] == 3642
+    assert status["status"] == "warning"  # 91% of the limit
+
+    db_helper.insert_expense("2024-08-31", 400, "Food", "Catering")
+    status = _food_status()
+    assert status["spent"] == 4042
+    assert status["status"] == "exceeded"
+    assert [(alert["level"], alert["spent"]) for alert in budgets.fetch_budget_alerts()] == [("exceeded", 4042)]
+
+    db_helper.delete_expenses_for_date("2024-08-31")
+    assert _food_status()["spent"] == 3642
+
+
+def test_running_total_does_not_drift(food_budget):
+    for _ in range(200):
+        db_helper.insert_expense("2024-09-15", 0.1, "Food", "Chewing gum")
+    assert _food_status(2024, 9)["spent"] == pytest.approx(20, abs=1e-9)
+
+
+def test_status_endpoint(client, food_budget):
+    response = client.get("/budgets/status", params={"year": 2024, "month": 8})
+    assert response.status_code == 200
+    assert [row["category"] for row in response.json()] == ["Food"]
+
+    assert client.get("/budgets/status", params={"year": 2024, "month": 0}).status_code == 400
+    assert client.get("/budgets/status", params={"year": 2024, "month": 13}).status_code == 400
+    assert client.get("/budgets/status", params={"year": 0, "month": 8}).status_code == 400
+
+
+def test_limit_changes_start_new_status_calls(food_budget):
+    # Like an expense write, a limit change keeps later status calls from joining one that read the old limit
+    generation = single_flight._generation
+    budgets.set_budget("Food", 3000, 0.9)
+    assert single_flight._generation == generation + 1
+    assert _food_status()["status"] == "exceeded"
+
+    assert budgets.delete_budget("Food")
+    assert single_flight._generation == generation + 2
+    assert budgets.fetch_budget_status(2024, 8) == []
@@ -0,0 +1,98 @@
+import sqlite3
+import pytest
+import categories
+import migrate_categories
+
+LEGACY_EXPENSES = [
+    ("2024-08-01", 120, "Food", "Lunch"),
+    ("2024-08-02", 40, "food ", "Coffee"),
+    ("2024-08-03", 900, "Housing", "Rent"),
+    ("2024-08-04", 35, "Gifts", "Flowers"),
+    ("2024-08-05", 15, "gifts", "Card"),
+]
+
+
+@pytest.fixture
+def legacy_database(tmp_path, monkeypatch):
+    """A database from before the categories table: expenses keep their category as free text."""
+    path = str(tmp_path / "legacy.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, expense_date DATE NOT NULL, "
+        "amount FLOAT NOT NULL, category VARCHAR(255) NOT NULL, notes TEXT)"
+    )
+    connection.executemany("INSERT INTO expenses (expense_date, amount, category, notes) VALUES (?, ?, ?, ?)",
+                           LEGACY_EXPENSES)
+    connection.commit()
+    connection.close()
+    monkeypatch.setenv("DB_NAME", path)
+    # Several chunks for five rows
+    monkeypatch.setattr(migrate_categories, "CHUNK_SIZE", 2)
+    return path
+
+
+def _migrated(path):
+    connection = sqlite3.connect(path)
+    try:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(expenses)")]
+        rows = connection.execute(
+            "SELECT e.notes, c.name FROM expenses e LEFT JOIN categories c ON c.id = e.category_id ORDER BY e.id"
+        ).fetchall()
+        names = [row[0] for row in connection.execute("SELECT name FROM categories ORDER BY id")]
+        return columns, rows, names
+    finally:
+        connection.close()
+
+
+def test_migration_backfills_category_ids(legacy_database):
+    assert migrate_categories.migrate() == len(LEGACY_EXPENSES)
+
+    columns, rows, names = _migrated(legacy_database)
+    assert "category" not in columns and "category_id" in columns
+    # Names are matched case-insensitively; unknown ones are registered once
+    assert rows == [("Lunch", "Food"), ("Coffee", "Food"), ("Rent", "Housing"), ("Flowers", "Gifts"),
+                    ("Card", "Gifts")]
+    assert names[:10] == ["Food", "Utilities", "Housing", "Transportation", "Insurance", "Medical",
+                          "Debt Payment", "Entertainment", "Misc", "Shopping"]
+    assert names[10:] == ["Gifts"]
+
+    # Running it again changes nothing
+    assert migrate_categories.migrate() == 0
+    assert _migrated(legacy_database) == (columns, rows, names)
+
+
+def test_migration_resumes_after_an_interruption(legacy_database):
+    # An earlier run registered the categories, added the column and converted the first chunk
+    connection = sqlite3.connect(legacy_database)
+    connection.executescript(
+        "CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(64) NOT NULL UNIQUE);"
+        "INSERT INTO categories (id, name) VALUES (1, 'Food'), (3, 'Housing'), (11, 'Gifts');"
+        "ALTER TABLE expenses ADD COLUMN category_id SMALLINT;"
+        "UPDATE expenses SET category_id = 1 WHERE id <= 2;"
+    )
+    connection.commit()
+    connection.close()
+
+    assert migrate_categories.migrate() == len(LEGACY_EXPENSES)
+
+    columns, rows, names = _migrated(legacy_database)
+    assert "category" not in columns
+    assert [name for _, name in rows] == ["Food", "Food", "Housing", "Gifts", "Gifts"]
+    assert names.count("Gifts") == 1 and len(names) == 11
+
+
+def test_add_category(client):
+    response = client.post("/categories", json={"name": "  Gifts "})
+    assert response.status_code == 200
+    category_id = response.json()["id"]
+    assert categories.id_of("gifts") == category_id
+    assert "Gifts" in client.get("/categories").json()
+
+
+@pytest.mark.parametrize("name", ["Food", " food ", "Gifts", "", "   ", "All"])
+def test_add_category_invalid(client, name):
+    assert client.post("/categories", json={"name": "Gifts"}).status_code == 200
+
+    response = client.post("/categories", json={"name": name})
+    assert response.status_code == 400
+    assert client.get("/categories").json().count("Gifts") == 1
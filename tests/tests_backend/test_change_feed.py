@@ -0,0 +1,54 @@
+from datetime import date
+import change_feed
+import db_helper
+
+
+def _last_sequence():
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT last_sequence FROM change_sequence WHERE id = 1")
+        return cursor.fetchone()["last_sequence"]
+
+
+def test_writes_are_recorded_in_order():
+    since = _last_sequence()
+    db_helper.insert_expense("2024-08-31", 12, "Food", "Ice cream")
+    db_helper.update_expense(
+        {"expense_date": "2024-08-31", "amount": 12, "category": "Food", "notes": "Ice cream"},
+        {"expense_date": "2024-08-31", "amount": 15, "category": "Food", "notes": "Ice cream"},
+    )
+    db_helper.delete_expense("2024-08-31", "Food", "Ice cream")
+
+    feed = change_feed.changes_since(since)
+    changes = feed["changes"]
+    assert [change["sequence"] for change in changes] == list(range(since + 1, since + 5))
+    assert [(change["op"], change["amount"]) for change in changes] == [
+        ("insert", 12), ("delete", 12), ("insert", 15), ("delete", 15)
+    ]
+    assert all(change["expense_date"] == date(2024, 8, 31) for change in changes)
+    assert feed["last_sequence"] == since + 4
+    assert change_feed.changes_since(feed["last_sequence"]) == {"changes": [], "last_sequence": since + 4}
+
+
+def test_changes_resume_after_since(client):
+    since = _last_sequence()
+    for notes in ("Tea", "Cake", "Coffee"):
+        db_helper.insert_expense("2024-08-31", 5, "Food", notes)
+
+    first = client.get("/changes", params={"since": since, "limit": 2}).json()
+    assert [change["notes"] for change in first["changes"]] == ["Tea", "Cake"]
+    rest = client.get("/changes", params={"since": first["last_sequence"]}).json()
+    assert [change["notes"] for change in rest["changes"]] == ["Coffee"]
+    assert rest["last_sequence"] == since + 3
+
+    assert client.get("/changes", params={"since": -1}).status_code == 400
+    assert client.get("/changes", params={"limit": 0}).status_code == 400
+
+
+def test_changes_are_read_from_the_primary(monkeypatch):
+    # A write is in the feed right away, even when the replicas lag behind
+    def replica():
+        raise AssertionError("changes read from a replica")
+    monkeypatch.setattr(db_helper, "_checkout_for_read", replica)
+    since = _last_sequence()
+    db_helper.insert_expense("2024-08-31", 5, "Food", "Tea")
+    assert [change["notes"] for change in change_feed.changes_since(since)["changes"]] == ["Tea"]
@@ -0,0 +1,123 @@
+import json
+import pytest
+import compact_expenses
+import db_helper
+
+
+@pytest.fixture
+def duplicates(tmp_path):
+    # Two copies of an existing expense, and a new expense twice; the originals have the lower ids
+    db_helper.insert_expense("2024-08-24", 1200, "Shopping", "Asics Shoes")
+    db_helper.insert_expense("2024-08-24", 1200, "Shopping", "Asics Shoes")
+    db_helper.insert_expense("2023-03-05", 75, "Misc", "Car wash and wax")
+    db_helper.insert_expense("2023-03-05", 75, "Misc", "Car wash and wax")
+    return {"state_file": str(tmp_path / "state.json"), "audit_file": str(tmp_path / "audit.jsonl")}
+
+
+class Crash(Exception):
+    pass
+
+
+def _audit(files):
+    """Audited rows of the chunks that committed, and the status of every chunk."""
+    with open(files["audit_file"]) as f:
+        audit = [json.loads(line) for line in f]
+    status = {entry["chunk"]: entry["status"] for entry in audit if "status" in entry}
+    return [entry for entry in audit if "id" in entry and status.get(entry["chunk"]) == "committed"], status
+
+
+def _crashing_run(files, name, calls=1):
+    """Run the compaction until the `calls`-th call of db_helper.`name`, which raises Crash."""
+    real = getattr(db_helper, name)
+    count = []
+
+    def crash(*args):
+        count.append(1)
+        if len(count) == calls:
+            raise Crash()
+        return real(*args)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(db_helper, name, crash)
+        with pytest.raises(Crash):
+            compact_expenses.compact(delete_chunk=1, **files)
+
+
+def test_compact_keeps_lowest_id(duplicates):
+    summary = compact_expenses.compact(**duplicates)
+
+    assert summary["deleted"] == 3
+    assert summary["groups"] == 2
+    assert summary["amount_removed"] == 2475
+    assert summary["by_category"] == {"Shopping": 2, "Misc": 1}
+
+    expenses = db_helper.fetch_expenses_for_date("2024-08-24")
+    assert len(expenses) == 7
+    assert expenses[0]['amount'] == 1200
+    car_washes = [e for e in db_helper.fetch_expenses_for_date("2023-03-05") if e['notes'] == "Car wash and wax"]
+    assert len(car_washes) == 1
+
+    deleted, status = _audit(duplicates)
+    assert len(deleted) == 3
+    assert all(entry["kept_id"] < entry["id"] for entry in deleted)
+    assert status == {1: "committed"}
+
+    # Nothing is left to delete on a second run
+    assert compact_expenses.compact(restart=True, **duplicates)["deleted"] == 0
+
+
+def test_compact_dry_run_deletes_nothing(duplicates):
+    summary = compact_expenses.compact(dry_run=True, **duplicates)
+
+    assert summary["deleted"] == 3
+    assert len(db_helper.fetch_expenses_for_date("2024-08-24")) == 9
+
+
+def test_compact_resumes_after_a_crash_following_a_commit(duplicates):
+    # The first chunk commits, then the run dies before the chunk's status line and state are written
+    _crashing_run(duplicates, "_notify")
+
+    summary = compact_expenses.compact(delete_chunk=1, **duplicates)
+    assert summary["deleted"] == 3
+    assert summary["amount_removed"] == 2475
+    deleted, status = _audit(duplicates)
+    assert len(deleted) == 3
+    assert set(status.values()) == {"committed"}
+    assert len(db_helper.fetch_expenses_for_date("2024-08-24")) == 7
+
+
+def test_compact_resumes_after_a_crash_before_a_commit(duplicates):
+    # The second chunk is audited, then its transaction fails
+    _crashing_run(duplicates, "_apply_changes", calls=2)
+
+    summary = compact_expenses.compact(delete_chunk=1, **duplicates)
+    assert summary["deleted"] == 3
+    deleted, status = _audit(duplicates)
+    assert len(deleted) == 3
+    assert status[2] == "rolled_back"
+    assert len(db_helper.fetch_expenses_for_date("2024-08-24")) == 7
+
+
+def test_compact_resumes_after_a_torn_audit_line(duplicates, monkeypatch):
+    # The run dies while writing the audit entries of its second chunk
+    write = compact_expenses._audit
+    calls = []
+
+    def tear(audit, entries):
+        calls.append(entries)
+        if len(calls) == 3:
+            audit.write(json.dumps(entries[0])[:20])
+            audit.flush()
+            raise Crash()
+        write(audit, entries)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(compact_expenses, "_audit", tear)
+        with pytest.raises(Crash):
+            compact_expenses.compact(delete_chunk=1, **duplicates)
+
+    summary = compact_expenses.compact(delete_chunk=1, **duplicates)
+    assert summary["deleted"] == 3
+    deleted, status = _audit(duplicates)
+    assert len(deleted) == 3
+    assert set(status.values()) == {"committed"}
+    assert len(db_helper.fetch_expenses_for_date("2024-08-24")) == 7
@@ -1,5 +1,8 @@
+import pickle
+from datetime import date, timedelta
 import pytest
-from backend import db_helper
+import db_helper
+import local_db
 
 def test_fetch_expenses_for_valid_date():
     expenses = db_helper.fetch_expenses_for_date("2024-08-24")
@@ -116,8 +119,165 @@ def test_fetch_monthly_expenses_invalid():
         assert expenses[i][1] == 0
 
 
+def test_projected_rows():
+    columns = ("amount", "category", "notes")
+    rows = db_helper.fetch_expenses_for_date("2024-08-24", columns=columns)
 
+    assert len(rows) == 7
+    assert rows[1]['notes'] == rows[1].notes == rows[1][2] == "Broadband bill"
+    assert (rows[0]['amount'], rows[0]['category']) == (1200, "Shopping")
+    assert rows[0]._fields == columns
+    with pytest.raises(AttributeError):
+        rows[0]['expense_date']
 
+    # Rows survive pickling (the shared cache) with their class and fields
+    copies = pickle.loads(pickle.dumps(rows))
+    assert copies == rows
+    assert type(copies[0]) is db_helper.row_type(columns)
+    assert copies[1]['notes'] == "Broadband bill"
 
 
+def test_fetch_expenses_for_dates_without_the_date_column():
+    columns = ("category", "amount")
+    expenses = db_helper.fetch_expenses_for_dates(
+        start_date=date(2024, 8, 24), end_date=date(2024, 8, 26), columns=columns
+    )
 
+    # The date is queried for the grouping, then left out of the rows
+    assert list(expenses) == [date(2024, 8, 24), date(2024, 8, 25), date(2024, 8, 26)]
+    assert all(row._fields == columns for rows in expenses.values() for row in rows)
+    assert tuple(expenses[date(2024, 8, 24)][0]) == ("Shopping", 1200)
+    assert [tuple(row) for row in expenses[date(2024, 8, 25)]] == [("Food", 180)]
+
+    by_list = db_helper.fetch_expenses_for_dates(dates=[date(2024, 8, 26), date(2024, 8, 25)], columns=columns)
+    assert by_list == {day: expenses[day] for day in (date(2024, 8, 25), date(2024, 8, 26))}
+
+
+@pytest.fixture
+def replicated(tmp_path, own_connections, monkeypatch):
+    """A primary and two replica files, each with one expense on 2024-08-24 noting its database."""
+    paths = {name: str(tmp_path / f"{name}.sqlite3") for name in ("primary", "replica1", "replica2")}
+    for name, path in paths.items():
+        connection = local_db.connect(database=path)
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO expenses (expense_date, amount, category_id, notes) VALUES (%s, %s, %s, %s)",
+            ("2024-08-24", 1, 1, name)
+        )
+        connection.commit()
+        connection.close()
+    monkeypatch.setenv("DB_NAME", paths["primary"])
+    monkeypatch.setenv("DB_REPLICAS", f"{paths['replica1']},{paths['replica2']}")
+    return paths
+
+
+def _read_from():
+    return [expense['notes'] for expense in db_helper.fetch_expenses_for_date("2024-08-24")]
+
+
+def test_reads_go_round_robin_to_the_replicas(replicated):
+    assert [_read_from() for _ in range(3)] == [["replica1"], ["replica2"], ["replica1"]]
+
+    # Writes and primary reads go to the primary
+    db_helper.insert_expense("2024-08-24", 2, "Food", "written")
+    with db_helper.get_db_cursor(primary=True) as cursor:
+        cursor.execute("SELECT notes FROM expenses ORDER BY id")
+        assert [row['notes'] for row in cursor.fetchall()] == ["primary", "written"]
+
+
+def test_reads_fall_back_to_the_primary(replicated, tmp_path, monkeypatch):
+    missing = str(tmp_path / "missing" / "replica.sqlite3")
+    monkeypatch.setenv("DB_REPLICAS", f"{missing},{replicated['replica2']}")
+    assert _read_from() == ["replica2"]
+    assert db_helper.replica_status() == {missing: False, replicated['replica2']: True}
+
+    # With no healthy replica left, reads are served by the primary
+    monkeypatch.setenv("DB_REPLICAS", missing)
+    assert _read_from() == ["primary"]
+
+
+def test_reads_stick_to_the_primary_after_a_write(replicated, monkeypatch):
+    monkeypatch.setenv("READ_STICKINESS_SECONDS", "60")
+    assert _read_from() == ["replica1"]
+
+    db_helper.insert_expense("2024-08-24", 2, "Food", "written")
+    assert _read_from() == ["primary", "written"]
+    assert _read_from() == ["primary", "written"]
+
+    monkeypatch.setenv("READ_STICKINESS_SECONDS", "0")
+    assert _read_from() == ["replica2"]
+
+
+def test_note_search_months():
+    all_months = db_helper.fetch_expenses_for_particular_note("bill", 2024, list(range(1, 13)))
+    assert db_helper.fetch_expenses_for_particular_note("bill", 2024, list(range(1, 13)) + [1, 8]) == all_months
+    assert db_helper.fetch_expenses_for_particular_note("bill", 2024, [8, 8]) == \
+        db_helper.fetch_expenses_for_particular_note("bill", 2024, [8])
+
+    for months in ([0], [13], [8, 13]):
+        with pytest.raises(ValueError):
+            db_helper.fetch_expenses_for_particular_note("bill", 2024, months)
+
+
+def test_note_search_invalid_months(client):
+    for months in ([0], [13], list(range(1, 13)) + [1]):
+        response = client.post("/expenses/note", json={"wildcard_note": "bill", "year": 2024, "months": months})
+        assert response.status_code == (200 if len(months) > 12 else 400), months
+
+
+def test_in_list_padding(monkeypatch):
+    assert [db_helper._slots(count, 32) for count in (1, 32, 33, 64, 65)] == [32, 32, 64, 64, 128]
+    assert db_helper._padded([3, 1], 4) == [3, 1, 3, 3]
+
+    # Up to 32 dates share one statement, more take the next power of two
+    queries = []
+    run_prepared = db_helper.run_prepared
+
+    def spy(query, params, **kwargs):
+        queries.append((query, len(params)))
+        return run_prepared(query, params, **kwargs)
+    monkeypatch.setattr(db_helper, "run_prepared", spy)
+    for count in (2, 20, 40):
+        db_helper.fetch_expenses_for_dates(dates=[date(2024, 1, 1) + timedelta(days=i) for i in range(count)])
+    assert queries[0][0] is queries[1][0]
+    assert [params for _, params in queries] == [32, 32, 64]
+
+
+def test_run_prepared_reuses_statements(replicated, monkeypatch):
+    monkeypatch.setattr(db_helper, "_statement_stats", {"prepares": 0, "executes": 0, "evictions": 0})
+    query = "SELECT id, notes FROM expenses WHERE expense_date = %s"
+
+    assert db_helper.run_prepared(query, ("2024-08-24",), primary=True) == [{"id": 1, "notes": "primary"}]
+    assert db_helper.run_prepared(query, ("2024-08-25",), primary=True) == []
+    assert db_helper.run_prepared(query, ("2024-08-24",), primary=True, dictionary=False) == [(1, "primary")]
+    stats = db_helper.statement_stats()
+    assert (stats["prepares"], stats["executes"]) == (2, 3)
+    assert stats["cache_hit_ratio"] == pytest.approx(1 / 3)
+
+    # One pooled connection, with a statement per query and row type
+    [[(connection, _)]] = db_helper._idle.values()
+    assert list(db_helper._statement_caches[connection]) == [(query, True), (query, False)]
+
+
+def test_run_prepared_evicts_the_least_recently_used(replicated, monkeypatch):
+    monkeypatch.setattr(db_helper, "_statement_stats", {"prepares": 0, "executes": 0, "evictions": 0})
+    monkeypatch.setattr(db_helper, "MAX_PREPARED_STATEMENTS", 2)
+    queries = [f"SELECT {column} FROM expenses" for column in ("id", "notes", "amount")]
+
+    for query in queries[:2] + queries[:1] + queries[2:]:
+        db_helper.run_prepared(query, primary=True)
+    [[(connection, _)]] = db_helper._idle.values()
+    assert [query for query, _ in db_helper._statement_caches[connection]] == [queries[0], queries[2]]
+    assert db_helper.statement_stats()["evictions"] == 1
+
+    db_helper.run_prepared(queries[1], primary=True)
+    stats = db_helper.statement_stats()
+    assert (stats["prepares"], stats["executes"], stats["evictions"]) == (4, 5, 2)
+
+
+def test_failed_execute_is_counted(replicated, monkeypatch):
+    monkeypatch.setattr(db_helper, "_statement_stats", {"prepares": 0, "executes": 0, "evictions": 0})
+    with pytest.raises(Exception):
+        db_helper.run_prepared("SELECT no_such_column FROM expenses", primary=True)
+    stats = db_helper.statement_stats()
+    assert (stats["prepares"], stats["executes"], stats["cache_hit_ratio"]) == (1, 1, 0)
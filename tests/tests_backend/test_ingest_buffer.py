@@ -0,0 +1,99 @@
+import threading
+import pytest
+import db_helper
+import ingest_buffer
+
+
+@pytest.fixture
+def buffer(tmp_path, monkeypatch):
+    """An empty write-behind buffer with its journal in a temporary directory, without the flusher thread."""
+    monkeypatch.setenv("INGEST_JOURNAL", str(tmp_path / "journal.jsonl"))
+    _restart(monkeypatch)
+    return tmp_path / "journal.jsonl"
+
+
+def _restart(monkeypatch):
+    # The in-memory state of a freshly started process
+    monkeypatch.setattr(ingest_buffer, "_lock", threading.Condition())
+    monkeypatch.setattr(ingest_buffer, "_commit_lock", threading.Lock())
+    monkeypatch.setattr(ingest_buffer, "_pending", [])
+    monkeypatch.setattr(ingest_buffer, "_pending_dates", {})
+    monkeypatch.setattr(ingest_buffer, "_next_sequence", 1)
+    monkeypatch.setattr(ingest_buffer, "_flushed_sequence", 0)
+    monkeypatch.setattr(ingest_buffer, "_flushed_total", 0)
+
+
+def _expense(notes, amount=10):
+    return {"expense_date": "2024-08-24", "amount": amount, "category": "food", "notes": notes}
+
+
+def _notes():
+    return [expense['notes'] for expense in db_helper.fetch_expenses_for_date("2024-08-24")]
+
+
+class Crash(Exception):
+    pass
+
+
+def _flush_and_crash():
+    # The group and its checkpoint commit, then the process dies before the journal is compacted
+    def crash():
+        raise Crash()
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(ingest_buffer, "_compact_journal", crash)
+        with pytest.raises(Crash):
+            ingest_buffer.flush()
+
+
+def test_reads_include_waiting_expenses(buffer):
+    before = _notes()
+    assert ingest_buffer.submit([_expense("Tea"), _expense("Cake")]) == 2
+
+    expenses = db_helper.fetch_expenses_for_date("2024-08-24")
+    assert [expense['notes'] for expense in expenses] == before + ["Tea", "Cake"]
+    assert expenses[-1]['id'] is None and expenses[-1]['category'] == "Food"
+
+    assert ingest_buffer.flush() == 2
+    assert not ingest_buffer.has_pending("2024-08-24")
+    expenses = db_helper.fetch_expenses_for_date("2024-08-24")
+    assert [expense['notes'] for expense in expenses] == before + ["Tea", "Cake"]
+    assert expenses[-1]['id'] is not None
+    assert buffer.read_text() == ""
+
+
+def test_recover_replays_the_journal_after_a_crash(buffer, monkeypatch):
+    before = _notes()
+    ingest_buffer.submit([_expense("Tea"), _expense("Cake")])
+    _flush_and_crash()
+    ingest_buffer.submit([_expense("Coffee")])
+    with open(buffer, "a") as journal:
+        journal.write('{"sequence": 4, "expense_da')  # torn by the crash, never acknowledged
+
+    _restart(monkeypatch)
+    assert ingest_buffer.recover() == 1
+    stats = ingest_buffer.stats()
+    assert (stats["pending"], stats["flushed_sequence"], stats["next_sequence"]) == (1, 2, 4)
+    assert _notes() == before + ["Tea", "Cake", "Coffee"]
+
+    assert ingest_buffer.flush() == 1
+    assert _notes() == before + ["Tea", "Cake", "Coffee"]
+
+
+def test_recover_is_idempotent(buffer, monkeypatch):
+    before = _notes()
+    ingest_buffer.submit([_expense("Tea"), _expense("Cake")])
+    _flush_and_crash()
+    ingest_buffer.submit([_expense("Coffee")])
+
+    # The journal still holds the committed entries, the checkpoint skips them. Recovering twice
+    # (e.g. after a crash during the first recovery) replays each entry once
+    for _ in range(2):
+        _restart(monkeypatch)
+        assert ingest_buffer.recover() == 1
+    assert ingest_buffer.flush() == 1
+
+    _restart(monkeypatch)
+    assert ingest_buffer.recover() == 0
+    assert ingest_buffer.flush() == 0
+    assert _notes() == before + ["Tea", "Cake", "Coffee"]
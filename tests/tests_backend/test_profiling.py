@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+import profiling
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    """Profiles are written to profiles/ of a temporary working directory; the admin token is 'secret'."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("PROFILE_DIR", raising=False)
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    monkeypatch.setenv("PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "_stats", {"profiled": 0, "skipped_busy": 0})
+    return tmp_path / "profiles"
+
+
+def test_requested(profiles, monkeypatch):
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.0)
+    # Sampling is off by default
+    assert not profiling.requested({})
+    assert profiling.requested({"X-Profile": "secret"})
+    assert not profiling.requested({"X-Profile": "guess"})
+
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "0.5")
+    assert profiling.requested({})
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "0")
+    monkeypatch.setenv("PROFILE_TOKEN", "")
+    assert not profiling.requested({"X-Profile": ""})
+
+
+def test_unprofiled_requests_write_nothing(client, profiles):
+    response = client.get("/categories", headers={"X-Profile": "guess"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert not profiles.exists()
+    assert profiling.stats()["profiled"] == 0
+
+
+def test_admin_header_profiles_a_request(client, profiles):
+    response = client.post("/analytics/expenses/monthly", json={"year": 2024, "category": "Food"},
+                           headers={"X-Profile": "secret"})
+
+    assert response.status_code == 200
+    name = response.headers["X-Profile-Id"]
+    assert sorted(os.listdir(profiles)) == [name + ".collapsed", name + ".json", name + ".pstats"]
+    with open(profiles / (name + ".json")) as f:
+        metadata = json.load(f)
+    assert (metadata["method"], metadata["route"], metadata["status_code"]) == (
+        "POST", "/analytics/expenses/monthly", 200
+    )
+    assert metadata["body"] == {"year": 2024, "category": "Food"}
+    # The sync endpoint ran in the threadpool and joined the profile
+    functions = profiling.pstats.Stats(str(profiles / (name + ".pstats"))).stats
+    assert any(function == "fetch_monthly_expenses" for _, _, function in functions)
+    assert profiling.stats()["profiled"] == 1
+
+
+def test_busy_profiler_skips_the_request(client, profiles):
+    # Another request is being profiled
+    assert profiling._busy.acquire(blocking=False)
+    try:
+        response = client.get("/categories", headers={"X-Profile": "secret"})
+    finally:
+        profiling._busy.release()
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert profiling.stats()["skipped_busy"] == 1 and profiling.stats()["profiled"] == 0
+    assert not profiles.exists()
@@ -0,0 +1,82 @@
+from datetime import date
+import pytest
+import db_helper
+import recurring
+
+
+def _rule(frequency, start_date, end_date=None, interval_days=None):
+    return {"frequency": frequency, "start_date": start_date, "end_date": end_date, "interval_days": interval_days}
+
+
+def _rent_dates():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("SELECT expense_date FROM expenses WHERE notes = %s ORDER BY expense_date", ("Rent",))
+        return [db_helper._to_date(row["expense_date"]) for row in cursor.fetchall()]
+
+
+def _last_materialized(rule_id):
+    [rule] = [rule for rule in recurring.fetch_rules() if rule["id"] == rule_id]
+    return db_helper._to_date(rule["last_materialized"]) if rule["last_materialized"] else None
+
+
+def test_monthly_occurrences_are_clamped_to_the_month_end():
+    dates = recurring.occurrence_dates(_rule("monthly", date(2024, 1, 31)), date(2024, 1, 1), date(2024, 5, 31))
+    assert dates == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30), date(2024, 5, 31)]
+
+    # Later months go back to the rule's day, whatever month the range starts in
+    dates = recurring.occurrence_dates(_rule("monthly", date(2023, 1, 31)), date(2023, 2, 15), date(2023, 3, 31))
+    assert dates == [date(2023, 2, 28), date(2023, 3, 31)]
+
+
+def test_weekly_and_custom_occurrences():
+    weekly = _rule("weekly", date(2024, 8, 1), end_date=date(2024, 8, 29))
+    assert recurring.occurrence_dates(weekly, date(2024, 8, 10), date(2024, 9, 30)) == [
+        date(2024, 8, 15), date(2024, 8, 22), date(2024, 8, 29)
+    ]
+    custom = _rule("custom", date(2024, 8, 1), interval_days=10)
+    assert recurring.occurrence_dates(custom, date(2024, 7, 1), date(2024, 8, 31)) == [
+        date(2024, 8, 1), date(2024, 8, 11), date(2024, 8, 21), date(2024, 8, 31)
+    ]
+    assert recurring.occurrence_dates(custom, date(2024, 9, 1), date(2024, 8, 31)) == []
+
+
+def test_rules():
+    rule_id = recurring.create_rule("housing", 900, "Rent", "monthly", "2030-01-31")
+    [rule] = recurring.fetch_rules()
+    assert (rule["id"], rule["category"], rule["frequency"]) == (rule_id, "Housing", "monthly")
+    assert rule["interval_days"] is None and rule["last_materialized"] is None
+
+    with pytest.raises(ValueError):
+        recurring.create_rule("Housing", 900, "Rent", "yearly", "2030-01-31")
+    with pytest.raises(ValueError):
+        recurring.create_rule("Housing", 900, "Rent", "custom", "2030-01-31")
+    with pytest.raises(ValueError):
+        recurring.create_rule("Housing", 0, "Rent", "monthly", "2030-01-31")
+    with pytest.raises(ValueError):
+        recurring.create_rule("Housing", 900, "Rent", "monthly", "2030-01-31", end_date="2029-12-31")
+
+    assert recurring.delete_rule(rule_id)
+    assert not recurring.delete_rule(rule_id)
+    assert recurring.fetch_rules() == []
+
+
+def test_materialize_is_idempotent():
+    rule_id = recurring.create_rule("Housing", 900, "Rent", "monthly", "2030-01-31")
+
+    assert recurring.materialize("2030-03-15") == 2
+    assert recurring.materialize("2030-03-15") == 0
+    assert recurring.materialize("2030-04-30") == 2
+    assert _rent_dates() == [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)]
+    assert _last_materialized(rule_id) == date(2030, 4, 30)
+
+
+def test_materialize_advances_past_existing_occurrences():
+    rule_id = recurring.create_rule("Housing", 900, "Rent", "weekly", "2030-01-07")
+    assert recurring.materialize("2030-01-31") == 4
+
+    # An earlier run created the occurrences but did not get to update the rule
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE recurring_rules SET last_materialized = NULL WHERE id = %s", (rule_id,))
+    assert recurring.materialize("2030-01-31") == 0
+    assert _last_materialized(rule_id) == date(2030, 1, 31)
+    assert len(_rent_dates()) == 4
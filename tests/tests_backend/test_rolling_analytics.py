@@ -0,0 +1,52 @@
+from datetime import date
+import pytest
+import db_helper
+import rolling_analytics
+
+
+def _food_7d(end_date):
+    return rolling_analytics.moving_totals(end_date, days=1, windows=[7], category="Food")[0]["7d"]
+
+
+def test_moving_totals():
+    series = rolling_analytics.moving_totals(date(2024, 8, 31), days=7, windows=[1, 7], category="food")
+
+    assert [day["date"] for day in series] == [date(2024, 8, d) for d in range(25, 32)]
+    assert series[0]["1d"] == 180
+    # Food of August 19th - 25th, then 25th - 31st
+    assert series[0]["7d"] == 150 + 200 + 180
+    assert series[-1]["7d"] == 180 + 1212
+
+
+def test_moving_totals_invalid(client):
+    with pytest.raises(ValueError):
+        rolling_analytics.moving_totals(date(2024, 8, 31), category="nonsense")
+    with pytest.raises(ValueError):
+        rolling_analytics.moving_totals(date(2024, 8, 31), windows=[0])
+
+    response = client.post("/analytics/rolling", json={"end_date": "2024-08-31", "category": "nonsense"})
+    assert response.status_code == 400
+
+
+def test_writes_update_the_totals():
+    before = _food_7d(date(2024, 8, 31))
+    db_helper.insert_expense("2024-08-31", 99, "Food", "Snacks")
+    assert _food_7d(date(2024, 8, 31)) == before + 99
+    db_helper.delete_expenses_for_date("2024-08-28")
+    assert _food_7d(date(2024, 8, 31)) == before + 99 - 1212
+
+
+def test_write_committed_before_the_load_is_counted_once(monkeypatch):
+    # The write commits, then the totals are loaded before its listener call arrives
+    rolling_analytics.invalidate()
+    notified = []
+    monkeypatch.setattr(db_helper, "_notify", notified.append)
+    db_helper.insert_expense("2024-08-31", 99, "Food", "Snacks")
+    loaded = _food_7d(date(2024, 8, 31))
+    rolling_analytics.record_changes(notified[0])
+    assert _food_7d(date(2024, 8, 31)) == loaded == 180 + 1212 + 99
+
+    # A write committed after the load is applied
+    db_helper.insert_expense("2024-08-30", 1, "Food", "Candy")
+    rolling_analytics.record_changes(notified[1])
+    assert _food_7d(date(2024, 8, 31)) == loaded + 1
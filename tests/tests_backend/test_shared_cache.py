@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import threading
+import pytest
+import categories
+import db_helper
+import shared_cache
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(db_helper.__file__))
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    # A fresh shared directory, as serve.py starts with
+    monkeypatch.setenv("SHARED_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(shared_cache, "_segment", None)
+    monkeypatch.setattr(shared_cache, "_seen_version", None)
+    monkeypatch.setattr(shared_cache, "_local", threading.local())
+    return str(tmp_path)
+
+
+def _other_worker(shared_dir, code):
+    subprocess.run([sys.executable, "-c", f"import shared_cache, time; {code}"], cwd=BACKEND_DIR, check=True,
+                   env={**os.environ, "SHARED_CACHE_DIR": shared_dir})
+
+
+def test_write_of_another_worker_invalidates_state(shared_dir):
+    shared_cache.sync()
+    categories.names()
+    assert categories._registry is not None
+
+    # This worker's own writes keep its state: its write listeners have applied them
+    shared_cache.record_write([])
+    assert categories._registry is not None
+
+    _other_worker(shared_dir, "shared_cache.record_write([])")
+    assert shared_cache.data_version() == 2
+    shared_cache.sync()
+    assert categories._registry is None
+
+
+def test_results_are_shared_until_a_write(shared_dir):
+    calls = []
+
+    @shared_cache.cached
+    def total(year):
+        calls.append(year)
+        return {"year": year, "total": 42}
+
+    assert total(2024) == total(2024) == {"year": 2024, "total": 42}
+    assert calls == [2024]
+
+    _other_worker(shared_dir, "shared_cache.record_write([])")
+    assert total(2024) == {"year": 2024, "total": 42}
+    assert calls == [2024, 2024]
+
+
+def test_read_stickiness_after_a_write_of_another_worker(shared_dir, monkeypatch):
+    monkeypatch.setenv("DB_REPLICAS", "replica.sqlite3")
+    monkeypatch.setenv("READ_STICKINESS_SECONDS", "60")
+    monkeypatch.setattr(db_helper, "_last_write", float("-inf"))  # no write of this worker
+    hosts = []
+    monkeypatch.setattr(db_helper, "_checkout", lambda host=None: hosts.append(host))
+
+    db_helper._checkout_for_read()
+    _other_worker(shared_dir, "shared_cache.note_write(time.monotonic())")
+    db_helper._checkout_for_read()
+    assert hosts == ["replica.sqlite3", None]
+
+
+def test_readers_keep_the_write_lock(shared_dir):
+    holding, release = threading.Event(), threading.Event()
+
+    def write(segment):
+        holding.set()
+        release.wait(5)
+
+    writer = threading.Thread(target=shared_cache._locked, args=(write, True))
+    writer.start()
+    holding.wait(5)
+    # A reader thread of the same worker shares the file descriptor and with it the file lock
+    reader = threading.Thread(target=shared_cache.data_version)
+    reader.start()
+    reader.join(0.2)
+
+    other = subprocess.run([sys.executable, "-c", (
+        "import fcntl, os, sys; fd = os.open(sys.argv[1], os.O_RDWR); fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)"
+    ), os.path.join(shared_dir, "data_version")], capture_output=True)
+    release.set()
+    writer.join()
+    reader.join()
+    assert other.returncode != 0, "another worker took the lock held by a write"
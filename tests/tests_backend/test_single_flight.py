@@ -0,0 +1,108 @@
+import threading
+import pytest
+import single_flight
+
+
+class _Query:
+    """A coalesced function whose executions block until released, counting how often it runs."""
+
+    def __init__(self, error=None):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+        self.error = error
+
+        @single_flight.coalesce
+        def query(year):
+            self.calls.append(year)
+            self.started.set()
+            self.release.wait(5)
+            if self.error:
+                raise self.error
+            return {"year": year, "calls": len(self.calls)}
+        self.query = query
+
+
+def _in_threads(count, target, *args):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target(*args)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def _wait_for_waiters(count):
+    # The waiters are counted as coalesced before they block on the running call
+    for _ in range(500):
+        if single_flight.stats()["coalesced"] >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("callers did not join the running call")
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(single_flight, "_stats", {"calls": 0, "executed": 0, "coalesced": 0})
+
+
+def test_concurrent_callers_share_one_execution():
+    query = _Query()
+    leader, [first] = _in_threads(1, query.query, 2024)
+    query.started.wait(5)
+    waiters, results = _in_threads(4, query.query, 2024)
+    _wait_for_waiters(4)
+    query.release.set()
+    for thread in leader + waiters:
+        thread.join(5)
+
+    assert query.calls == [2024]
+    assert all(result is results[0] for result in results) and results[0] == {"year": 2024, "calls": 1}
+    assert single_flight.stats() == {"calls": 5, "executed": 1, "coalesced": 4, "in_flight": 0}
+
+    # Once it has finished, nothing is kept
+    query.release.set()
+    assert query.query(2024) == {"year": 2024, "calls": 2}
+
+
+def test_callers_after_a_write_do_not_join_a_stale_call():
+    query = _Query()
+    leader, results = _in_threads(1, query.query, 2024)
+    query.started.wait(5)
+
+    # The running call may have read the data before the write; a caller after it runs its own query
+    single_flight.record_write([])
+    after, later_results = _in_threads(1, query.query, 2024)
+    for _ in range(500):
+        if len(query.calls) == 2:
+            break
+        threading.Event().wait(0.01)
+    query.release.set()
+    for thread in leader + after:
+        thread.join(5)
+
+    assert query.calls == [2024, 2024]
+    assert single_flight.stats()["coalesced"] == 0
+    assert results[0] is not later_results[0]
+
+
+def test_errors_reach_every_waiter():
+    error = RuntimeError("database went away")
+    query = _Query(error=error)
+    leader, leader_results = _in_threads(1, query.query, 2024)
+    query.started.wait(5)
+    waiters, results = _in_threads(3, query.query, 2024)
+    _wait_for_waiters(3)
+    query.release.set()
+    for thread in leader + waiters:
+        thread.join(5)
+
+    assert query.calls == [2024]
+    assert leader_results[0] is error
+    assert all(result is error for result in results)
+    assert single_flight.stats()["in_flight"] == 0
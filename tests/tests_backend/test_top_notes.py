@@ -0,0 +1,73 @@
+import random
+from datetime import date
+import pytest
+import top_notes
+
+
+@pytest.mark.parametrize("note, normalized", [
+    ("August Grocery shopping", "grocery shopping"),
+    ("  Grocery   SHOPPING ", "grocery shopping"),
+    ("march - rent", "rent"),
+    ("December: gym", "gym"),
+    ("May's birthday gift", "may's birthday gift"),
+    ("Mar rent", "mar rent"),
+    ("Dec decorations", "dec decorations"),
+    ("Maybe later", "maybe later"),
+    ("June", "june"),
+])
+def test_normalize(note, normalized):
+    assert top_notes.normalize(note) == normalized
+
+
+def test_space_saving_error_bound():
+    # A skewed stream of more distinct notes than the summary keeps
+    rng = random.Random(7)
+    stream = [(f"note {min(int(rng.paretovariate(1)), 200)}", rng.randint(1, 100)) for _ in range(5000)]
+    exact = {}
+    summary = top_notes._SpaceSaving(capacity=20, rank=1)
+    for note, amount in stream:
+        total, count = exact.get(note, (0, 0))
+        exact[note] = (total + amount, count + 1)
+        summary.add(note, amount, 1)
+
+    assert summary.evictions > 0 and len(summary.entries) == 20
+    for entry in summary.top(20):
+        # A count is never underestimated, and overestimated by at most max_error
+        true_count = exact[entry["note"]][1]
+        assert true_count <= entry["count"] <= true_count + entry["max_error"]
+    # Every note more frequent than the largest possible error is kept
+    largest_error = max(entry[2] for entry in summary.entries.values())
+    assert {note for note, (_, count) in exact.items() if count > largest_error} <= set(summary.entries)
+
+
+def test_top_notes_are_exact_within_capacity():
+    result = top_notes.top_notes(date(2024, 8, 1), date(2024, 8, 31), "Food", limit=3)
+
+    assert not result["approximate"]
+    assert [(entry["note"], entry["total"], entry["count"]) for entry in result["by_total"]] == [
+        ("family dinner", 1212, 1), ("grocery shopping", 1150, 2), ("festival feast", 900, 1)
+    ]
+    assert result["by_count"][0] == {"note": "grocery shopping", "total": 1150, "count": 2, "max_error": 0}
+
+
+def test_top_notes_approximate(monkeypatch):
+    exact = top_notes.top_notes(date(2023, 1, 1), date(2023, 12, 31), limit=5)
+    monkeypatch.setattr(top_notes, "MIN_CAPACITY", 10)
+    monkeypatch.setattr(top_notes, "CAPACITY_PER_RESULT", 2)
+    approximate = top_notes.top_notes(date(2023, 1, 1), date(2023, 12, 31), limit=5)
+
+    assert not exact["approximate"] and approximate["approximate"]
+    exact_totals = {entry["note"]: entry["total"] for entry in exact["by_total"]}
+    assert exact_totals.keys() & {entry["note"] for entry in approximate["by_total"]}
+    for entry in approximate["by_total"]:
+        if entry["note"] in exact_totals:
+            assert exact_totals[entry["note"]] <= entry["total"] <= exact_totals[entry["note"]] + entry["max_error"]
+
+
+def test_top_notes_invalid():
+    with pytest.raises(ValueError):
+        top_notes.top_notes(date(2024, 8, 31), date(2024, 8, 1))
+    with pytest.raises(ValueError):
+        top_notes.top_notes(date(2024, 8, 1), date(2024, 8, 31), limit=0)
+    with pytest.raises(ValueError):
+        top_notes.top_notes(date(2024, 8, 1), date(2024, 8, 31), "Sports")
@@ -0,0 +1,39 @@
+import threading
+import tracing
+
+
+def _get(client, url):
+    # In a thread, so a deadlocked request fails the test instead of hanging the suite
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=client.get(url)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), f"GET {url} did not return"
+    return result["response"]
+
+
+def test_traces_on_a_fresh_worker(client, monkeypatch):
+    # A worker that has not exported a span yet has no ring buffer
+    monkeypatch.setattr(tracing, "_buffer", None)
+
+    response = _get(client, "/traces")
+    assert response.status_code == 200
+    assert response.json() == []
+
+    monkeypatch.setattr(tracing, "_buffer", None)
+    assert _get(client, "/traces/" + "0" * 32).status_code == 404
+
+
+def test_request_trace_phases(client, monkeypatch):
+    monkeypatch.setenv("TRACING", "true")
+    monkeypatch.setattr(tracing, "_buffer", None)
+
+    response = client.get("/expenses/2024-08-24")
+    assert response.status_code == 200
+    trace_id = response.headers["X-Trace-Id"]
+
+    trace = _get(client, f"/traces/{trace_id}").json()
+    names = {span["name"] for span in trace["spans"]}
+    assert {"http", "endpoint", "db.execute"} <= names
+    assert trace["phases_ms"]["database"] > 0
+    assert sum(trace["phases_ms"].values()) <= max(span["duration_ms"] for span in trace["spans"]) + 1